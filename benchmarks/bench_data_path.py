@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for the data-path functions
+
+Times save_to_csv, load_latest_baseline, subtract_baseline,
+model_registry.check_health (basil and leaf models) and
+classifier.load_data on
+synthetic scan corpora, recording wall time and peak memory
+(tracemalloc). Results are written as JSON so two commits can be compared.
+
+Usage (from the project root):
+    python -m benchmarks.bench_data_path --scale realistic --output bench_before.json
+    python -m benchmarks.bench_data_path --scale realistic 100x --output bench_after.json
+    python -m benchmarks.bench_data_path --compare bench_before.json bench_after.json
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime, timedelta
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_PROJECT_DIR not in sys.path:
+    sys.path.insert(0, BASE_PROJECT_DIR)
+
+from plant_spectral_scanner.scripts.csv_utils import save_to_csv
+from plant_spectral_scanner.scripts.baseline_utils import load_latest_baseline, subtract_baseline
+
+WAVELENGTHS = [410, 435, 460, 485, 510, 535, 560, 585, 610, 645, 680, 705, 730, 760, 810, 890, 900, 940]
+CHANNELS = [f"channel_{i+1}_{wl}" for i, wl in enumerate(WAVELENGTHS)]
+COLOURS = ["Red", "Green", "Blue", "White"]
+POSITIONS = ["close_bulb", "middle_bulb", "far_bulb"]
+SENSORS = ["close_sensor", "middle_sensor", "far_sensor"]
+ROWS_PER_SCAN = len(COLOURS) * len(POSITIONS) * len(SENSORS)  # 36, as written by main.py
+
+# Corpus size in rows for each scale; 'realistic' is a few hundred scans, '100x' is 100 times that
+SCALES = {
+    "realistic": 10_000,
+    "100x": 1_000_000,
+}
+
+REGRESSION_THRESHOLD = 1.10  # new/old ratio above which --compare flags a regression
+
+
+def _random_channels(rng):
+    # Mimic recorded scans: mostly small values with a share of exact zeros
+    return {ch: (0.0 if rng.random() < 0.3 else rng.uniform(0, 60)) for ch in CHANNELS}
+
+
+def _random_step(rng):
+    return {sensor: _random_channels(rng) for sensor in SENSORS}
+
+
+def write_scan_corpus(folder, rows, rng, rows_per_file=ROWS_PER_SCAN):
+    """
+    Write 'rows' scan rows as CSV files of 'rows_per_file' rows, in main.py's scan layout.
+    """
+    os.makedirs(folder, exist_ok=True)
+    header = ["timestamp", "description", "bulb_colour", "bulb_position", "sensor_position"] + CHANNELS
+    start = datetime(2025, 8, 8, 11, 0, 0)
+    written = 0
+    file_index = 0
+    while written < rows:
+        count = min(rows_per_file, rows - written)
+        description = rng.choice(["basil_healthy_plant", "basil_dry_angle1", "basil_health_second"])
+        stamp = start + timedelta(seconds=file_index)
+        path = os.path.join(folder, f"{description}_scan_{stamp.strftime('%Y%m%d_%H%M%S')}_{file_index}.csv")
+        with open(path, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(header)
+            for i in range(count):
+                colour = COLOURS[(i // 9) % len(COLOURS)]
+                position = POSITIONS[(i // 3) % len(POSITIONS)]
+                sensor = SENSORS[i % len(SENSORS)]
+                row = [stamp.strftime("%Y-%m-%d %H:%M:%S"), description, colour, position, sensor]
+                row.extend(_random_channels(rng).values())
+                writer.writerow(row)
+        written += count
+        file_index += 1
+    return folder
+
+
+def write_baseline_files(folder, files, rng):
+    """
+    Write 'files' complete baseline CSVs (36 rows each) with increasing timestamps.
+    """
+    os.makedirs(folder, exist_ok=True)
+    header = ["timestamp", "bulb_colour", "bulb_position", "sensor_position"] + CHANNELS
+    start = datetime(2025, 7, 31, 12, 0, 0)
+    for index in range(files):
+        stamp = start + timedelta(minutes=index)
+        path = os.path.join(folder, f"baseline_{stamp.strftime('%Y%m%d_%H%M%S')}.csv")
+        with open(path, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(header)
+            for colour in COLOURS:
+                for position in POSITIONS:
+                    for sensor in SENSORS:
+                        row = [stamp.strftime("%Y-%m-%d %H:%M:%S"), colour, position, sensor]
+                        row.extend(_random_channels(rng).values())
+                        writer.writerow(row)
+    return folder
+
+
+def measure(func, repeats=3):
+    """
+    Run func() 'repeats' times; report min/median wall time and the highest tracemalloc peak.
+
+    One untimed warm-up call runs first so lazy imports and cold caches
+    are not counted.
+    """
+    func()
+    times = []
+    peak = 0
+    for _ in range(repeats):
+        tracemalloc.start()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    times.sort()
+    return {
+        "wall_min_s": round(times[0], 6),
+        "wall_median_s": round(times[len(times) // 2], 6),
+        "peak_mem_bytes": peak,
+        "repeats": repeats,
+    }
+
+
+def bench_save_to_csv(workdir, rows, rng):
+    data_root = os.path.join(workdir, "save_to_csv")
+    steps = [_random_step(rng) for _ in range(len(COLOURS) * len(POSITIONS))]
+    scans = max(rows // ROWS_PER_SCAN, 1)
+
+    def run():
+        shutil.rmtree(data_root, ignore_errors=True)
+        for scan in range(scans):
+            filename = f"bench_scan_{scan}.csv"
+            for index, data in enumerate(steps):
+                save_to_csv(data=data, mode="scan", description="bench", adjusted=True,
+                            colour=COLOURS[index // len(POSITIONS)], position=POSITIONS[index % len(POSITIONS)],
+                            filename=filename, data_root=data_root)
+    return run
+
+
+def bench_load_latest_baseline(workdir, rows, rng):
+    baseline_dir = write_baseline_files(os.path.join(workdir, "baseline"), max(rows // ROWS_PER_SCAN, 1), rng)
+
+    def run():
+        load_latest_baseline(baseline_dir)
+    return run
+
+
+def bench_subtract_baseline(workdir, rows, rng):
+    baseline = {
+        (colour.lower(), position): {sensor: _random_channels(rng) for sensor in SENSORS}
+        for colour in COLOURS for position in POSITIONS
+    }
+    steps = [_random_step(rng) for _ in range(len(COLOURS) * len(POSITIONS))]
+    calls = max(rows // len(SENSORS), 1)
+
+    def run():
+        for i in range(calls):
+            index = i % len(steps)
+            subtract_baseline(steps[index], baseline, COLOURS[index // len(POSITIONS)], POSITIONS[index % len(POSITIONS)])
+    return run
+
+
+def _bench_health(scan_type):
+    def setup(workdir, rows, rng):
+        from data_processing.model_registry import check_health
+        from plant_spectral_scanner.scripts.scan_session import model_path_for
+        model_path = model_path_for(scan_type)  # the model ScanSession.classify loads
+        if model_path is None:
+            raise FileNotFoundError(f"No {scan_type} model in data_processing/")
+        folder = write_scan_corpus(os.path.join(workdir, f"{scan_type}_health"), rows, rng, rows_per_file=rows)
+        scan_path = os.path.join(folder, os.listdir(folder)[0])
+
+        def run():
+            check_health(model_path, scan_path)
+        return run
+    return setup
+
+
+def bench_classifier_load_data(workdir, rows, rng):
+    from data_processing.classifier import load_data
+    folder = write_scan_corpus(os.path.join(workdir, "load_data"), rows, rng)
+
+    def run():
+        load_data(folder)
+    return run
+
+
+BENCHMARKS = {
+    "save_to_csv": bench_save_to_csv,
+    "load_latest_baseline": bench_load_latest_baseline,
+    "subtract_baseline": bench_subtract_baseline,
+    "check_health.basil": _bench_health("basil"),
+    "check_health.leaf": _bench_health("leaf"),
+    "classifier.load_data": bench_classifier_load_data,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(names, scales, repeats=3, seed=0):
+    results = []
+    for scale in scales:
+        rows = SCALES[scale]
+        for name in names:
+            rng = random.Random(seed)
+            with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+                entry = {"benchmark": name, "scale": scale, "rows": rows}
+                try:
+                    run = BENCHMARKS[name](workdir, rows, rng)
+                except ImportError as e:
+                    entry["skipped"] = f"missing dependency: {e}"
+                    print(f"[SKIPPED] {name} ({scale}): {e}")
+                    results.append(entry)
+                    continue
+                except FileNotFoundError as e:
+                    entry["skipped"] = str(e)
+                    print(f"[SKIPPED] {name} ({scale}): {e}")
+                    results.append(entry)
+                    continue
+                entry.update(measure(run, repeats))
+                print(f"[BENCH] {name:<22} {scale:<9} {entry['wall_median_s']:>10.4f}s "
+                      f"peak {entry['peak_mem_bytes'] / 1e6:>8.1f} MB")
+                results.append(entry)
+    return {
+        "commit": _git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(old_path, new_path, threshold=REGRESSION_THRESHOLD):
+    """
+    Print new/old ratios for every benchmark present in both files.
+
+    Returns:
+        int: number of regressions (time or memory above threshold)
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    old_results = {(r["benchmark"], r["scale"]): r for r in old["results"] if "skipped" not in r}
+    regressions = 0
+    print(f"{'benchmark':<22} {'scale':<9} {'time':>8} {'memory':>8}   ({old.get('commit')} -> {new.get('commit')})")
+    for result in new["results"]:
+        key = (result["benchmark"], result["scale"])
+        if "skipped" in result or key not in old_results:
+            continue
+        before = old_results[key]
+        time_ratio = result["wall_median_s"] / max(before["wall_median_s"], 1e-9)
+        mem_ratio = result["peak_mem_bytes"] / max(before["peak_mem_bytes"], 1)
+        flag = ""
+        if time_ratio > threshold or mem_ratio > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key[0]:<22} {key[1]:<9} {time_ratio:>7.2f}x {mem_ratio:>7.2f}x{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the data-path functions")
+    parser.add_argument("--scale", nargs="+", choices=list(SCALES), default=["realistic"])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    report = run_benchmarks(args.only, args.scale, args.repeats, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[SAVED] Results written to {args.output}")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch health classification over directories of scan CSVs
+
+Walks one or more directory trees, parses every scan in a process pool,
+turns each into a feature vector with the model's feature pipeline,
+stacks them and calls predict() once per batch.
+Writes a results table with one row per scan.
+
+Usage (from the project root):
+    python -m data_processing.batch_classify data/scans/basil_scans \
+        --model data_processing/basil_model.pkl --output basil_results.csv
+"""
+
+import os
+import csv
+import sys
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from data_processing.model_registry import get_registry, scan_rows
+from data_processing.feature_pipeline import pipeline_for
+
+BATCH_SIZE = 2048  # scans parsed and predicted together
+
+
+def iter_scan_files(roots: List[str]) -> Iterator[str]:
+    """
+    Yield every .csv under the given directories, in a stable order, without listing them all first.
+    """
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(".csv"):
+                    yield os.path.join(dirpath, filename)
+
+
+def model_version(model_path: str) -> str:
+    """
+    Short content hash of the model file, so results can be traced to the exact pickle.
+    """
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def _parse(path: str) -> Optional[np.ndarray]:
+    try:
+        return scan_rows(path)
+    except Exception:
+        return None
+
+
+def _features(pipeline, rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if rows is None:
+        return None
+    try:
+        return pipeline.transform(rows)
+    except ValueError:
+        return None  # no usable rows
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def classify_directories(roots: List[str], model_path: str, output_path: str,
+                         workers: int = None, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Classify every scan under 'roots' and write file,label,probability,model_version rows.
+
+    Returns:
+        int: number of scans classified
+    """
+    model = get_registry().get(model_path)
+    pipeline = pipeline_for(model)
+    version = model_version(model_path)
+    has_proba = hasattr(model, "predict_proba")
+    classified = 0
+    started = time.monotonic()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["file", "label", "probability", "model_version"])
+
+        for paths in _batches(iter_scan_files(roots), batch_size):
+            chunksize = max(len(paths) // ((workers or os.cpu_count() or 1) * 4), 1)
+            features = [_features(pipeline, rows) for rows in pool.map(_parse, paths, chunksize=chunksize)]
+
+            good = [i for i, f in enumerate(features) if f is not None]
+            for i in range(len(paths)):
+                if features[i] is None:
+                    print(f"[WARNING] Skipping unreadable scan: {paths[i]}")
+            if not good:
+                continue
+
+            X = np.vstack([features[i] for i in good])
+            predictions = model.predict(X)
+            probabilities = None
+            if has_proba:
+                proba = model.predict_proba(X)
+                class_index = {c: k for k, c in enumerate(model.classes_)}
+                probabilities = [proba[row, class_index[p]] for row, p in enumerate(predictions)]
+
+            for row, i in enumerate(good):
+                label = "Healthy" if predictions[row] == 1 else "Unhealthy"
+                probability = f"{probabilities[row]:.4f}" if probabilities is not None else ""
+                writer.writerow([paths[i], label, probability, version])
+            classified += len(good)
+
+    elapsed = time.monotonic() - started
+    print(f"[COMPLETE] Classified {classified} scans in {elapsed:.2f}s -> {output_path}")
+    return classified
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify every scan CSV under one or more directories")
+    parser.add_argument("roots", nargs="+", help="directories to search recursively for scan CSVs")
+    parser.add_argument("--model", required=True, help="pickled model, e.g. data_processing/basil_model.pkl")
+    parser.add_argument("--output", default="classification_results.csv")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    missing = [root for root in args.roots if not os.path.isdir(root)]
+    if missing:
+        print(f"[ERROR] Not a directory: {', '.join(missing)}")
+        sys.exit(1)
+
+    classify_directories(args.roots, args.model, args.output, args.workers, args.batch_size)
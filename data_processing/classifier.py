@@ -19,6 +19,19 @@ from sklearn.metrics import accuracy_score, confusion_matrix, classification_rep
 from sklearn.svm import SVC
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.ensemble import RandomForestClassifier
+try:
+    from data_processing.scan_cache import UNLABELLED, get_scan_cache, health_label
+    from data_processing.compiled_model import export_compiled
+    from data_processing.feature_pipeline import FeaturePipeline, split_rows
+    from data_processing.training_engine import cv_folds
+except ImportError:  # run as a script from data_processing/
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from scan_cache import UNLABELLED, get_scan_cache, health_label
+    from compiled_model import export_compiled
+    from feature_pipeline import FeaturePipeline, split_rows
+    from training_engine import cv_folds
+from plant_spectral_scanner.scripts.scan_index import ScanIndex
 
 # data loader for MVP
 def load_leaf_reflectance_data(csv_path="leaf_reflectance_classification_data.csv"):
@@ -82,7 +95,7 @@ def load_leaf_data2(csv_path="leaf_reflectance_classification_data.csv"):
     )
 
 #data loader for Final Report
-def load_data(folder_path="../data/scans/basil_scans"):
+def load_data(folder_path="../data/scans/basil_scans", use_cache=True, pipeline=None):
     # Find all CSV files in the directory
 
     all_files = [
@@ -107,26 +120,38 @@ def load_data(folder_path="../data/scans/basil_scans"):
     if not all_files:
         raise FileNotFoundError(f"No CSV files found in: {folder_path}")
 
-    # Load and combine all files
-    df_list = [pd.read_csv(file) for file in all_files]
-    df = pd.concat(df_list, ignore_index=True)
-
-    # Keep only reflectance feature columns
-    reflectance_cols = [col for col in df.columns if col.startswith("channel_")]
-    df = df.dropna(subset=reflectance_cols)
-
-    # Drop rows where all reflectance values are zero
-    df = df[~(df[reflectance_cols].sum(axis=1) == 0)]
-
-    # Extract labels from the 'description' field
-    df["Condition"] = df["description"].str.lower().apply(
-        lambda desc: "Healthy" if "health" in desc else "Unhealthy"
-    )
-
-    # Features and labels
-    X = df[reflectance_cols].values
-    label_encoder = LabelEncoder()
-    y = label_encoder.fit_transform(df["Condition"])
+    if use_cache:
+        # Parsed, filtered and labelled per file; only new or changed files are read again
+        scans = get_scan_cache().load_scans(all_files)
+    else:
+        scans = []
+        for file in all_files:
+            df = pd.read_csv(file)
+            reflectance_cols = [col for col in df.columns if col.startswith("channel_")]
+            # Extract labels from the 'description' field
+            scans.append((df[reflectance_cols].to_numpy(dtype=float), _row_labels(df["description"])))
+
+    # One sample per scan, through the same pipeline the rig applies (saved with the exported model)
+    return _scan_dataset(scans, pipeline, "Binary leaf reflectance classification dataset (Healthy vs Unhealthy)")
+
+HEALTH_CLASSES = ["Unhealthy", "Healthy"]  # target_names of the scan loaders: label 0, label 1
+
+def _row_labels(descriptions):
+    # Healthy=1 / Unhealthy=0 / UNLABELLED per row, the labelling online_learning and training_engine use too
+    labels = [health_label(desc) for desc in descriptions]
+    return np.array([UNLABELLED if label is None else label for label in labels], dtype=np.int8)
+
+def _scan_dataset(scans, pipeline=None, descr="", files=None):
+    # scans: (channel rows, per-row labels) per scan; unlabelled scans and scans without a usable row are dropped
+    pipeline = pipeline or FeaturePipeline()
+    usable = [labels[0] != UNLABELLED and len(pipeline.row_features(rows)) > 0 for rows, labels in scans]
+    scans = [scan for scan, ok in zip(scans, usable) if ok]
+    extra = {} if files is None else {"files": np.array([f for f, ok in zip(files, usable) if ok], dtype=object)}
+    if not scans:
+        raise FileNotFoundError("No scan has a complete channel row")
+    X = pipeline.transform_many([rows for rows, _ in scans])
+    # Healthy=1, as model_registry.check_health reads predictions (a LabelEncoder would sort Healthy to 0)
+    y = np.array([labels[0] for _, labels in scans], dtype=np.int64)
 
     # Standardize features
     scaler = StandardScaler()
@@ -135,11 +160,46 @@ def load_data(folder_path="../data/scans/basil_scans"):
     return Bunch(
         data=X_scaled,
         target=y,
-        target_names=label_encoder.classes_,
-        feature_names=reflectance_cols,
-        DESCR="Binary leaf reflectance classification dataset (Healthy vs Unhealthy)"
+        target_names=np.array(HEALTH_CLASSES),
+        feature_names=pipeline.feature_names,
+        scaler=scaler,
+        pipeline=pipeline,
+        DESCR=descr,
+        **extra
     )
 
+#data loader for the consolidated scan store (see plant_spectral_scanner/scripts/scan_store.py)
+def load_data_from_store(store_path="../data/store", folder="basil_scans", pipeline=None):
+    # One memory map for all channel values instead of one CSV parse per scan
+    channels_path = os.path.join(store_path, "channels.f32")
+    meta = pd.read_csv(os.path.join(store_path, "rows.csv"), keep_default_na=False)
+    values = np.memmap(channels_path, dtype=np.float32, mode="r").reshape(-1, 18)
+
+    meta = meta[(meta["folder"] == folder) & (meta["row"] < len(values))]
+    X = np.asarray(values[meta["row"].to_numpy()], dtype=np.float64)
+    labels = _row_labels(meta["description"])
+
+    # Rows grouped back into their scans, then the same per-scan features as load_data
+    _, blocks = split_rows(np.arange(len(X)), meta["file"].to_numpy())
+    scans = [(X[rows], labels[rows]) for rows in blocks]
+    return _scan_dataset(scans, pipeline, f"Binary reflectance classification dataset from the scan store ({folder})")
+
+#data loader for the SQLite scan index (see plant_spectral_scanner/scripts/scan_index.py)
+def load_data_from_index(scan_type="basil", data_root="../data", pipeline=None, **filters):
+    # Indexed lookup instead of a directory crawl, e.g. load_data_from_index("basil", colour="Red", date="2025-08-08")
+    rows = ScanIndex(data_root).query(scan_type=scan_type, **filters)
+    if not len(rows["values"]):
+        raise FileNotFoundError(f"No indexed {scan_type} rows match {filters}")
+    X = rows["values"].astype(np.float64)
+    labels = _row_labels(rows["description"])
+
+    # Rows grouped back into their scans, then the same per-scan features as load_data
+    files, blocks = split_rows(np.arange(len(X)), rows["file"])
+    scans = [(X[block], labels[block]) for block in blocks]
+    return _scan_dataset(scans, pipeline,
+                         f"Binary reflectance classification dataset from the scan index ({scan_type})",
+                         files=files)
+
 #comprehensive metrics: testing accuracy, precision, recall
 def print_classification_metrics(clf, X_train, y_train, X_test, y_test):
     y_train_pred = clf.predict(X_train)
@@ -151,36 +211,37 @@ def print_classification_metrics(clf, X_train, y_train, X_test, y_test):
     print("- Classification Report (Test):\n", classification_report(y_test, y_test_pred))
 
 #model tuning to find best parameter
-def tune_svc_classifier(X, y):
+def tune_svc_classifier(X, y, cv=5):
     print("Tuning SVC...")
     params = {
         'kernel': ['linear', 'rbf'],
         'C': [0.1, 1, 10],
         'gamma': ['scale', 'auto']
     }
-    clf = GridSearchCV(SVC(), params, cv=5, scoring='accuracy')
+    clf = GridSearchCV(SVC(), params, cv=cv, scoring='accuracy')
     clf.fit(X, y)
     print("Best SVC parameters:", clf.best_params_)
     return clf
 
-def tune_knn_classifier(X, y):
+def tune_knn_classifier(X, y, cv=5):
     print("Tuning KNN...")
+    fold_train = len(y) - -(-len(y) // cv)  # samples in the smallest training fold
     params = {
-        'n_neighbors': [1, 3, 5, 7],
+        'n_neighbors': [k for k in [1, 3, 5, 7] if k <= fold_train] or [1],
         'weights': ['uniform', 'distance']
     }
-    clf = GridSearchCV(KNeighborsClassifier(), params, cv=5, scoring='accuracy')
+    clf = GridSearchCV(KNeighborsClassifier(), params, cv=cv, scoring='accuracy')
     clf.fit(X, y)
     print("Best KNN parameters:", clf.best_params_)
     return clf
 
-def tune_rf_classifier(X, y):
+def tune_rf_classifier(X, y, cv=5):
     print("Tuning Random Forest...")
     params = {
         'n_estimators': [10, 50, 100],
         'max_depth': [None, 5, 10]
     }
-    clf = GridSearchCV(RandomForestClassifier(), params, cv=5, scoring='accuracy')
+    clf = GridSearchCV(RandomForestClassifier(), params, cv=cv, scoring='accuracy')
     clf.fit(X, y)
     print("Best RF parameters:", clf.best_params_)
     return clf
@@ -221,7 +282,7 @@ def evaluate_model_cv_and_test(model, X_train, y_train, X_test, y_test, k=5, nam
     train_acc = accuracy_score(y_train, y_train_pred)
     test_acc  = accuracy_score(y_test, y_test_pred)
     cm        = confusion_matrix(y_test, y_test_pred)
-    report    = classification_report(y_test, y_test_pred)
+    report    = classification_report(y_test, y_test_pred, zero_division=0)
 
     # ----- Pretty print -----
     print(f"\n=== {name} ===")
@@ -246,42 +307,252 @@ def evaluate_model_cv_and_test(model, X_train, y_train, X_test, y_test, k=5, nam
         "classification_report": report,
     }
 
-data = load_data()
+# === Reduced illumination plans ===
+# Which colour x position steps carry signal, and how much accuracy a scan keeps when only those are measured
 
-X_train, X_test, y_train, y_test = train_test_split(
-    data.data, data.target, test_size=0.2, random_state=42
-)
+PLAN_COLOURS = ["Red", "Green", "Blue", "White"]
+PLAN_POSITIONS = ["close_bulb", "middle_bulb", "far_bulb"]
+PLAN_SENSORS = ["close_sensor", "middle_sensor", "far_sensor"]
+STEP_TIME = 0.78  # seconds per illumination step in streaming mode (scan.step in the metrics files)
+PLAN_VERSION = 1
 
-clf_svc = tune_svc_classifier(X_train, y_train)
-clf_knn = tune_knn_classifier(X_train, y_train)
-clf_rf = tune_rf_classifier(X_train, y_train)
-
-# print("\n--- SVC ---")
-# print_classification_metrics(clf_svc, X_train, y_train, X_test, y_test)
-# evaluate_with_kfold(clf_svc, X_train, y_train)
+def load_scan_cells(folder_path="../data/scans/basil_scans"):
+    """
+    One (colour, position, sensor, channel) cube per scan CSV; cells that were not measured are NaN.
+    Labels are Healthy=1, as in training_engine.
+    """
+    files = sorted(glob.glob(os.path.join(folder_path, "*.csv")))
+    if not files:
+        raise FileNotFoundError(f"No CSV files found in: {folder_path}")
 
-# print("\n--- KNN ---")
-# print_classification_metrics(clf_knn, X_train, y_train, X_test, y_test)
-# evaluate_with_kfold(clf_knn, X_train, y_train)
+    colour_index = {c.lower(): i for i, c in enumerate(PLAN_COLOURS)}
+    position_index = {p: i for i, p in enumerate(PLAN_POSITIONS)}
+    sensor_index = {s: i for i, s in enumerate(PLAN_SENSORS)}
+
+    cubes, healthy, labelled = [], [], []
+    for path in files:
+        df = pd.read_csv(path)
+        label = health_label(" ".join(df["description"].astype(str)))
+        if label is None:
+            continue  # no condition in the description
+        labelled.append(path)
+        channels = [col for col in df.columns if col.startswith("channel_")]
+        ci = df["bulb_colour"].astype(str).str.lower().map(colour_index)
+        pi = df["bulb_position"].map(position_index)
+        si = df["sensor_position"].map(sensor_index)
+        ok = (ci.notna() & pi.notna() & si.notna()).to_numpy()
+
+        cube = np.full((len(PLAN_COLOURS), len(PLAN_POSITIONS), len(PLAN_SENSORS), len(channels)), np.nan)
+        cube[ci[ok].astype(int), pi[ok].astype(int), si[ok].astype(int)] = df.loc[ok, channels].to_numpy(dtype=float)
+        cubes.append(cube)
+        healthy.append(label)
+    if not cubes:
+        raise FileNotFoundError(f"No labelled scan in: {folder_path}")
 
-# print("\n--- Random Forest ---")
-# print_classification_metrics(clf_rf, X_train, y_train, X_test, y_test)
-# evaluate_with_kfold(clf_rf, X_train, y_train)
+    return Bunch(
+        cells=np.stack(cubes),
+        target=np.array(healthy, dtype=int),
+        files=labelled,
+        feature_names=channels,
+        DESCR="Per-scan colour x position x sensor x channel readings (Healthy=1)"
+    )
 
+def cell_importances(cells, y, n_estimators=500, random_state=42):
+    """
+    Random-forest importance of every (colour, position, sensor, channel) cell for telling
+    scans apart, plus the fraction of scans in which each cell read non-zero.
+    """
+    X = np.nan_to_num(cells).reshape(len(cells), -1)
+    rf = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state)
+    rf.fit(X, y)
+    importances = rf.feature_importances_.reshape(cells.shape[1:])
+    signal = (np.nan_to_num(cells) != 0).mean(axis=0)
+    return importances, signal
+
+def rank_steps(importances, signal):
+    """
+    (colour index, position index) steps, most important first; steps without importance
+    are ordered by how often they carry any signal at all.
+    """
+    step_importance = importances.sum(axis=(2, 3)).ravel()
+    step_signal = signal.mean(axis=(2, 3)).ravel()
+    order = np.lexsort((-step_signal, -step_importance))
+    return [divmod(int(i), len(PLAN_POSITIONS)) for i in order]
 
-svc_metrics = evaluate_model_cv_and_test(clf_svc, X_train, y_train, X_test, y_test, k=5, name="SVC")
-knn_metrics = evaluate_model_cv_and_test(clf_knn, X_train, y_train, X_test, y_test, k=5, name="KNN")
-rf_metrics  = evaluate_model_cv_and_test(clf_rf,  X_train, y_train, X_test, y_test, k=5, name="Random Forest")
+def _plan_rows(cube, steps):
+    return cube[tuple(zip(*steps))].reshape(-1, cube.shape[-1])
 
-# Save the pre-trained KNN model 
-import pickle
+def fit_plan_model(cells, y, steps, n_estimators=100, random_state=42, pipeline=None):
+    """
+    RF (behind a StandardScaler) on the pipeline features of each scan's 'steps' rows only.
+    """
+    pipeline = pipeline or FeaturePipeline()
+    rows = [_plan_rows(cube, steps) for cube in cells]
+    usable = np.array([len(pipeline.row_features(r)) > 0 for r in rows], dtype=bool)
+    X = pipeline.transform_many([r for r, ok in zip(rows, usable) if ok])
+    scaler = StandardScaler().fit(X)
+    rf = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state)
+    rf.fit(scaler.transform(X), np.asarray(y)[usable])
+    return rf, scaler
+
+def predict_plan_scan(rf, scaler, cube, steps, pipeline=None):
+    """
+    Classify one scan the way the rig does (model_registry.check_health): the pipeline features of its plan rows.
+    """
+    features = (pipeline or FeaturePipeline()).transform(_plan_rows(cube, steps))
+    return rf.predict(scaler.transform(features[None, :]))[0]
 
-# with open("RF_basil_model.pkl", "wb") as f:
-#     pickle.dump(clf_rf.best_estimator_, f)
+def evaluate_plan(cells, y, steps, **model_kwargs):
+    """
+    Leave-one-scan-out accuracy of a plan. Scans are held out whole, since rows of one scan are not independent.
+    """
+    correct = 0
+    for i in range(len(cells)):
+        train = np.arange(len(cells)) != i
+        rf, scaler = fit_plan_model(cells[train], y[train], steps, **model_kwargs)
+        try:
+            correct += predict_plan_scan(rf, scaler, cells[i], steps, model_kwargs.get("pipeline")) == y[i]
+        except ValueError:
+            pass  # nothing measured in these steps counts as a miss
+    return correct / len(cells)
+
+def optimise_plan(folder_path="../data/scans/basil_scans", tolerance=0.0, step_time=STEP_TIME):
+    """
+    Rank the steps by RF importance, score every top-k plan and pick the shortest one whose
+    leave-one-scan-out accuracy is within 'tolerance' of the full sweep.
+    """
+    data = load_scan_cells(folder_path)
+    importances, signal = cell_importances(data.cells, data.target)
+    ranked = rank_steps(importances, signal)
 
-### Usage of the saved model: ###
+    trade_off = []
+    for k in range(1, len(ranked) + 1):
+        accuracy = evaluate_plan(data.cells, data.target, ranked[:k])
+        trade_off.append({"steps": k, "scan_time": round(k * step_time, 2), "accuracy": round(float(accuracy), 3)})
+    full_accuracy = trade_off[-1]["accuracy"]
+    chosen = next(row for row in trade_off if row["accuracy"] >= full_accuracy - tolerance)
 
-# with open("knn_leaf_model.pkl", "rb") as f:
-#     knn_model = pickle.load(f)
+    return {
+        "steps": ranked[:chosen["steps"]],
+        "ranked": ranked,
+        "accuracy": chosen["accuracy"],
+        "full_accuracy": full_accuracy,
+        "scan_time": chosen["scan_time"],
+        "full_scan_time": trade_off[-1]["scan_time"],
+        "trade_off": trade_off,
+        "step_importance": importances.sum(axis=(2, 3)),
+        "sensor_signal": signal.mean(axis=(0, 1, 3)),
+        "cells": data.cells,
+        "target": data.target,
+        "n_scans": len(data.cells),
+    }
 
-# pred = knn_model.predict(X_new_scaled)
+def print_plan_report(report):
+    print(f"\n=== Illumination plan ({report['n_scans']} scans) ===")
+    print("Step importance (colour x position):")
+    for ci, colour in enumerate(PLAN_COLOURS):
+        cells = "  ".join(f"{PLAN_POSITIONS[pi]}={report['step_importance'][ci, pi]:.3f}" for pi in range(len(PLAN_POSITIONS)))
+        print(f"  {colour:<6} {cells}")
+    print("Non-zero readings per sensor:",
+          ", ".join(f"{s}={v:.0%}" for s, v in zip(PLAN_SENSORS, report["sensor_signal"])))
+    print("Accuracy vs. scan time (leave-one-scan-out):")
+    for row in report["trade_off"]:
+        marker = "  <- chosen" if row["steps"] == len(report["steps"]) else ""
+        print(f"  {row['steps']:>2} steps  {row['scan_time']:>5.2f}s  accuracy {row['accuracy']:.3f}{marker}")
+    print("Plan:", ", ".join(f"{PLAN_COLOURS[ci]}/{PLAN_POSITIONS[pi]}" for ci, pi in report["steps"]))
+
+def export_plan(report, plan_path, scan_type="basil"):
+    """
+    Write the plan YAML for plant_spectral_scanner/scripts/illumination_plan.py and, next to it,
+    the compiled model trained on the plan's rows of every scan.
+    """
+    import yaml
+
+    pipeline = FeaturePipeline()
+    rf, scaler = fit_plan_model(report["cells"], report["target"], report["steps"], pipeline=pipeline)
+    model_path = os.path.splitext(plan_path)[0] + "_model.npz"
+    export_compiled(rf, model_path, scaler=scaler, features=pipeline)
+
+    plan = {
+        "version": PLAN_VERSION,
+        "scan_type": scan_type,
+        # Run in sweep order (colour by colour), like the rows of a full scan
+        "steps": [{"colour": PLAN_COLOURS[ci], "position": PLAN_POSITIONS[pi]} for ci, pi in sorted(report["steps"])],
+        "model": os.path.basename(model_path),
+        "accuracy": report["accuracy"],
+        "full_accuracy": report["full_accuracy"],
+        "scan_time": report["scan_time"],
+        "full_scan_time": report["full_scan_time"],
+        "trade_off": report["trade_off"],
+    }
+    with open(plan_path, "w") as f:
+        yaml.safe_dump(plan, f, sort_keys=False)
+    print(f"[PLAN] {len(report['steps'])} of {len(report['ranked'])} steps written to {plan_path} (model {model_path})")
+    return plan_path
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare the health classifiers, or export a reduced illumination plan")
+    parser.add_argument("--folder", default="../data/scans/basil_scans")
+    parser.add_argument("--plan", help="write a reduced illumination plan (YAML) and its model instead")
+    parser.add_argument("--scan-type", default="basil", help="scan type the plan is for")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="accuracy the plan may lose against the full sweep")
+    parser.add_argument("--step-time", type=float, default=STEP_TIME, help="seconds per illumination step")
+    parser.add_argument("--out", help="export the tuned RF (compiled .npz) here, e.g. basil_rf_model.npz")
+    args = parser.parse_args()
+
+    if args.plan:
+        report = optimise_plan(args.folder, args.tolerance, args.step_time)
+        print_plan_report(report)
+        export_plan(report, args.plan, args.scan_type)
+    else:
+        # One sample per scan, so a folder holds only a handful: stratify the split and
+        # use no more folds than the training split has scans of its smaller class
+        data = load_data(args.folder)
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            data.data, data.target, test_size=0.2, random_state=42, stratify=data.target
+        )
+        k = cv_folds(y_train)
+        print(f"{len(data.target)} scans ({np.bincount(data.target, minlength=2)[1]} healthy), "
+              f"{len(y_train)} for training, {k}-fold CV")
+
+        clf_svc = tune_svc_classifier(X_train, y_train, cv=k)
+        clf_knn = tune_knn_classifier(X_train, y_train, cv=k)
+        clf_rf = tune_rf_classifier(X_train, y_train, cv=k)
+
+        # print("\n--- SVC ---")
+        # print_classification_metrics(clf_svc, X_train, y_train, X_test, y_test)
+        # evaluate_with_kfold(clf_svc, X_train, y_train)
+
+        # print("\n--- KNN ---")
+        # print_classification_metrics(clf_knn, X_train, y_train, X_test, y_test)
+        # evaluate_with_kfold(clf_knn, X_train, y_train)
+
+        # print("\n--- Random Forest ---")
+        # print_classification_metrics(clf_rf, X_train, y_train, X_test, y_test)
+        # evaluate_with_kfold(clf_rf, X_train, y_train)
+
+
+        svc_metrics = evaluate_model_cv_and_test(clf_svc, X_train, y_train, X_test, y_test, k=k, name="SVC")
+        knn_metrics = evaluate_model_cv_and_test(clf_knn, X_train, y_train, X_test, y_test, k=k, name="KNN")
+        rf_metrics  = evaluate_model_cv_and_test(clf_rf,  X_train, y_train, X_test, y_test, k=k, name="Random Forest")
+
+        # Export the tuned RF as a NumPy-only model (with the scaler and feature pipeline load_data used) for the rig
+        if args.out:
+            export_compiled(clf_rf.best_estimator_, args.out, scaler=data.scaler, features=data.pipeline)
+            print(f"[EXPORTED] Random Forest model -> {args.out}")
+
+        # Save the pre-trained KNN model 
+        import pickle
+
+        # with open("RF_basil_model.pkl", "wb") as f:
+        #     pickle.dump(clf_rf.best_estimator_, f)
+
+        ### Usage of the saved model: ###
+
+        # with open("knn_leaf_model.pkl", "rb") as f:
+        #     knn_model = pickle.load(f)
+
+        # pred = knn_model.predict(X_new_scaled)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Array-only export of the trained health classifiers
+
+compile_model() flattens a fitted SVC, KNeighborsClassifier,
+RandomForestClassifier or linear model (optionally behind a
+StandardScaler, as a Pipeline or passed separately) into plain NumPy
+arrays saved as one .npz:
+    SVC           support vectors, dual coefficients, intercepts, kernel
+    KNN           the reference matrix and its labels
+    RandomForest  every tree's node arrays, concatenated
+    Linear        coefficients and intercepts (SGDClassifier, LogisticRegression)
+CompiledModel predicts from that file with NumPy alone, so the rig can
+classify a scan without importing scikit-learn or pandas, and the file
+does not depend on the scikit-learn version that trained it. The
+FeaturePipeline the model was trained behind (see feature_pipeline.py)
+is saved in the same file and comes back as model.feature_pipeline.
+
+Compile an existing pickle (from the project root):
+    python -m data_processing.compiled_model data_processing/basil_model.pkl
+"""
+
+import os
+import json
+import pickle
+import argparse
+from typing import Dict
+
+import numpy as np
+
+from data_processing.feature_pipeline import FeaturePipeline
+
+FORMAT_VERSION = 1
+LINEAR_KINDS = ("SGDClassifier", "LogisticRegression")
+
+
+# === Export (needs the fitted scikit-learn objects, but never imports sklearn itself) ===
+
+def _split_pipeline(model, scaler=None):
+    steps = getattr(model, "steps", None)
+    if steps:
+        for _, step in steps[:-1]:
+            if hasattr(step, "mean_") and hasattr(step, "scale_"):
+                scaler = step
+            elif step is not None and step != "passthrough":
+                raise ValueError(f"Cannot compile pipeline step {type(step).__name__}")
+        model = steps[-1][1]
+    return model, scaler
+
+
+def compile_model(model, scaler=None, features: FeaturePipeline = None) -> Dict[str, np.ndarray]:
+    """
+    Flatten a fitted classifier into named arrays.
+
+    Args:
+        model: fitted SVC, KNeighborsClassifier, RandomForestClassifier, SGDClassifier
+               or LogisticRegression, or a Pipeline of StandardScaler + one of those
+        scaler: fitted StandardScaler applied before the model, if not in a Pipeline
+        features: pipeline that turns a scan's rows into the model's input
+                  (default: the one set on the model, if any)
+    """
+    if features is None:
+        features = getattr(model, "feature_pipeline", None)
+    model, scaler = _split_pipeline(model, scaler)
+    kind = type(model).__name__
+    meta = {"format": FORMAT_VERSION, "kind": kind}
+    arrays = {"classes": np.asarray(model.classes_)}
+
+    if scaler is not None:
+        n = len(scaler.mean_) if scaler.mean_ is not None else len(scaler.scale_)
+        arrays["scaler_mean"] = np.zeros(n) if scaler.mean_ is None else np.asarray(scaler.mean_, np.float64)
+        arrays["scaler_scale"] = np.ones(n) if scaler.scale_ is None else np.asarray(scaler.scale_, np.float64)
+
+    if kind == "SVC":
+        if callable(model.kernel) or model.kernel == "precomputed":
+            raise ValueError("Only linear, rbf, poly and sigmoid kernels can be compiled")
+        meta.update(kernel=model.kernel, gamma=float(model._gamma), coef0=float(model.coef0),
+                    degree=int(model.degree))
+        arrays["support_vectors"] = np.asarray(model.support_vectors_, np.float64)
+        arrays["dual_coef"] = np.asarray(model.dual_coef_, np.float64)
+        arrays["intercept"] = np.asarray(model.intercept_, np.float64)
+        arrays["n_support"] = np.asarray(model.n_support_, np.int64)
+
+    elif kind == "KNeighborsClassifier":
+        metric = model.effective_metric_
+        p = (model.effective_metric_params_ or {}).get("p", model.p)
+        if metric == "euclidean":
+            p = 2
+        elif metric == "manhattan":
+            p = 1
+        elif metric != "minkowski":
+            raise ValueError(f"Cannot compile KNN metric {metric}")
+        if callable(model.weights):
+            raise ValueError("Cannot compile callable KNN weights")
+        meta.update(n_neighbors=int(model.n_neighbors), weights=model.weights, p=float(p))
+        arrays["reference"] = np.asarray(model._fit_X, np.float64)
+        arrays["reference_labels"] = np.asarray(model._y, np.int64)
+
+    elif kind == "RandomForestClassifier":
+        left, right, feature, threshold, value, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            leaf = tree.children_left == -1
+            roots.append(offset)
+            left.append(np.where(leaf, -1, tree.children_left + offset))
+            right.append(np.where(leaf, -1, tree.children_right + offset))
+            feature.append(tree.feature)
+            threshold.append(tree.threshold)
+            # Class fractions per node (older scikit-learn stores counts, newer stores fractions)
+            counts = tree.value[:, 0, :]
+            value.append(counts / np.maximum(counts.sum(axis=1, keepdims=True), 1e-300))
+            offset += tree.node_count
+        arrays["tree_roots"] = np.asarray(roots, np.int64)
+        arrays["children_left"] = np.concatenate(left).astype(np.int64)
+        arrays["children_right"] = np.concatenate(right).astype(np.int64)
+        arrays["feature"] = np.concatenate(feature).astype(np.int64)
+        arrays["threshold"] = np.concatenate(threshold).astype(np.float64)
+        arrays["value"] = np.concatenate(value).astype(np.float64)
+
+    elif kind in LINEAR_KINDS:
+        arrays["coef"] = np.asarray(model.coef_, np.float64)
+        arrays["intercept"] = np.asarray(model.intercept_, np.float64)
+
+    else:
+        raise ValueError(f"Cannot compile a {kind}")
+
+    if features is not None:
+        arrays.update(features.to_arrays())
+    arrays["meta"] = np.array(json.dumps(meta))
+    return arrays
+
+
+def export_compiled(model, path: str, scaler=None, features: FeaturePipeline = None) -> str:
+    """
+    Compile 'model' (and its feature pipeline) and write it to 'path' (.npz). Returns the path.
+    """
+    arrays = compile_model(model, scaler, features)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+# === NumPy-only prediction ===
+
+class CompiledModel:
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.meta = json.loads(str(arrays["meta"]))
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format {self.meta.get('format')}")
+        self.kind = self.meta["kind"]
+        self.arrays = arrays
+        self.classes_ = arrays["classes"]
+        self.feature_pipeline = FeaturePipeline.from_arrays(arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def _scale(self, X: np.ndarray) -> np.ndarray:
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if "scaler_mean" in self.arrays:
+            X = (X - self.arrays["scaler_mean"]) / self.arrays["scaler_scale"]
+        return X
+
+    def predict(self, X) -> np.ndarray:
+        X = self._scale(X)
+        if self.kind == "SVC":
+            return self._predict_svc(X)
+        if self.kind == "KNeighborsClassifier":
+            return self.classes_[np.argmax(self._knn_votes(X), axis=1)]
+        if self.kind in LINEAR_KINDS:
+            return self._predict_linear(X)
+        return self.classes_[np.argmax(self._forest_proba(X), axis=1)]
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._scale(X)
+        if self.kind == "KNeighborsClassifier":
+            votes = self._knn_votes(X)
+            return votes / votes.sum(axis=1, keepdims=True)
+        if self.kind == "RandomForestClassifier":
+            return self._forest_proba(X)
+        raise AttributeError(f"Compiled {self.kind} models have no predict_proba")
+
+    # --- SVC ---
+
+    def _kernel(self, X: np.ndarray) -> np.ndarray:
+        sv = self.arrays["support_vectors"]
+        kernel, gamma = self.meta["kernel"], self.meta["gamma"]
+        if kernel == "linear":
+            return X @ sv.T
+        if kernel == "rbf":
+            sq = (X ** 2).sum(axis=1)[:, None] + (sv ** 2).sum(axis=1)[None, :] - 2 * X @ sv.T
+            return np.exp(-gamma * np.maximum(sq, 0))
+        if kernel == "poly":
+            return (gamma * X @ sv.T + self.meta["coef0"]) ** self.meta["degree"]
+        return np.tanh(gamma * X @ sv.T + self.meta["coef0"])
+
+    def _predict_svc(self, X: np.ndarray) -> np.ndarray:
+        K = self._kernel(X)
+        dual_coef, intercept = self.arrays["dual_coef"], self.arrays["intercept"]
+        n_classes = len(self.classes_)
+        if n_classes == 2:
+            # scikit-learn flips the signs for two classes, so positive means classes_[1]
+            decision = K @ dual_coef[0] + intercept[0]
+            return self.classes_[(decision > 0).astype(int)]
+
+        # One-vs-one voting in libsvm's pair order
+        starts = np.concatenate([[0], np.cumsum(self.arrays["n_support"])])
+        votes = np.zeros((len(X), n_classes), dtype=np.int64)
+        pair = 0
+        for i in range(n_classes):
+            for j in range(i + 1, n_classes):
+                si = slice(starts[i], starts[i + 1])
+                sj = slice(starts[j], starts[j + 1])
+                decision = K[:, si] @ dual_coef[j - 1, si] + K[:, sj] @ dual_coef[i, sj] + intercept[pair]
+                votes[:, i] += decision > 0
+                votes[:, j] += decision <= 0
+                pair += 1
+        return self.classes_[np.argmax(votes, axis=1)]
+
+    # --- Linear ---
+
+    def _predict_linear(self, X: np.ndarray) -> np.ndarray:
+        decision = X @ self.arrays["coef"].T + self.arrays["intercept"]
+        if decision.shape[1] == 1:
+            return self.classes_[(decision[:, 0] > 0).astype(int)]
+        return self.classes_[np.argmax(decision, axis=1)]
+
+    # --- KNN ---
+
+    def _knn_votes(self, X: np.ndarray) -> np.ndarray:
+        reference, labels = self.arrays["reference"], self.arrays["reference_labels"]
+        k, p = self.meta["n_neighbors"], self.meta["p"]
+        if p == 2:
+            sq = (X ** 2).sum(axis=1)[:, None] + (reference ** 2).sum(axis=1)[None, :] - 2 * X @ reference.T
+            distances = np.sqrt(np.maximum(sq, 0))
+        else:
+            distances = (np.abs(X[:, None, :] - reference[None, :, :]) ** p).sum(axis=2) ** (1 / p)
+
+        nearest = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        if self.meta["weights"] == "distance":
+            with np.errstate(divide="ignore"):
+                weights = 1.0 / nearest_distances
+            # Exact matches take all the weight, as in scikit-learn
+            exact = np.isinf(weights)
+            weights = np.where(exact.any(axis=1, keepdims=True), exact.astype(float), weights)
+        else:
+            weights = np.ones_like(nearest_distances)
+
+        votes = np.zeros((len(X), len(self.classes_)))
+        np.add.at(votes, (np.arange(len(X))[:, None], labels[nearest]), weights)
+        return votes
+
+    # --- Random forest ---
+
+    def _forest_proba(self, X: np.ndarray) -> np.ndarray:
+        a = self.arrays
+        left, right, feature, threshold = a["children_left"], a["children_right"], a["feature"], a["threshold"]
+        X = X.astype(np.float32)  # trees compare float32 inputs, like scikit-learn
+        roots = a["tree_roots"]
+
+        # Walk every (sample, tree) pair down at once
+        node = np.broadcast_to(roots, (len(X), len(roots))).copy()
+        rows = np.arange(len(X))[:, None]
+        active = left[node] != -1
+        while active.any():
+            go_left = X[np.broadcast_to(rows, node.shape)[active], feature[node[active]]] <= threshold[node[active]]
+            node[active] = np.where(go_left, left[node[active]], right[node[active]])
+            active = left[node] != -1
+        return a["value"][node].mean(axis=1)
+
+
+def load_model(path: str):
+    """
+    Load a model for prediction: compiled .npz files with NumPy only, anything else by unpickling.
+    """
+    if path.endswith(".npz"):
+        return CompiledModel.load(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile pickled classifiers into NumPy-only .npz models")
+    parser.add_argument("models", nargs="+", help="pickled SVC / KNN / RandomForest / linear models or pipelines")
+    parser.add_argument("--scaler", help="pickled StandardScaler the models were trained behind")
+    args = parser.parse_args()
+
+    scaler = None
+    if args.scaler:
+        with open(args.scaler, "rb") as f:
+            scaler = pickle.load(f)
+    for model_path in args.models:
+        with open(model_path, "rb") as f:
+            model = pickle.load(f)
+        output = os.path.splitext(model_path)[0] + ".npz"
+        export_compiled(model, output, scaler)
+        print(f"[COMPILED] {model_path} -> {output} ({os.path.getsize(output) / 1024:.0f} KiB)")
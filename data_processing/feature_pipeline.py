@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Spectral feature pipeline shared by training and inference
+
+Turns the channel rows of one scan (one row per colour x position x
+sensor reading, shape (n, 18)) into the feature vector the health models
+are trained and run on, with NumPy only:
+    correct    subtract an optional baseline and the per-channel dark
+               level, clamp at zero
+    filter     drop incomplete rows (skipped sensors) and rows with no signal
+    normalise  divide each row by its total, so every illumination step
+               contributes its spectral shape rather than its brightness
+    indices    normalised differences (a - b) / (a + b) of wavelength pairs,
+               e.g. 810/680 nm (NDVI), computed before normalising
+    aggregate  mean (or median) over the scan's rows
+The settings are saved inside the model file (features_* arrays in a
+compiled .npz, the feature_pipeline attribute of a pickle), so the rig
+computes exactly the features the model was trained on. Models saved
+before the pipeline existed get LEGACY_PIPELINE, the plain row mean
+they were always fed.
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+WAVELENGTHS = [410, 435, 460, 485, 510, 535, 560, 585, 610, 645, 680, 705, 730, 760, 810, 890, 900, 940]
+CHANNELS = [f"channel_{i+1}_{wl}" for i, wl in enumerate(WAVELENGTHS)]
+
+# (a, b) wavelength pairs in nm: NDVI, red-edge NDVI and green NDVI
+VEGETATION_INDICES = ((810, 680), (760, 705), (810, 560))
+AGGREGATIONS = ("mean", "median")
+
+
+def dark_level(rows) -> np.ndarray:
+    """
+    Per-channel dark level from the rows of a scan taken with every bulb off.
+    """
+    rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+    rows = rows[np.isfinite(rows).all(axis=1)]
+    if not len(rows):
+        raise ValueError("Dark scan has no complete channel rows")
+    return rows.mean(axis=0)
+
+
+def split_rows(values: np.ndarray, keys: Sequence) -> Tuple[List, List[np.ndarray]]:
+    """
+    Group the rows of 'values' by 'keys' (e.g. the file of every row), in order of first appearance.
+
+    Returns:
+        (distinct keys, one row block per key)
+    """
+    keys = np.asarray(keys)
+    distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    return [distinct[i] for i in order], [values[inverse == i] for i in order]
+
+
+class FeaturePipeline:
+    def __init__(self, dark=None, normalise: bool = True,
+                 indices: Iterable[Tuple[int, int]] = VEGETATION_INDICES,
+                 aggregate: str = "mean", drop_zero: bool = True):
+        """
+        Args:
+            dark: per-channel dark level (18 values, see dark_level); zeros if omitted
+            normalise: divide every row by its channel total
+            indices: (a, b) wavelength pairs added as (a - b) / (a + b)
+            aggregate: 'mean' or 'median' over the scan's rows
+            drop_zero: leave out rows whose corrected channels are all zero
+        """
+        if aggregate not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{aggregate}', expected one of {', '.join(AGGREGATIONS)}")
+        self.dark = np.zeros(len(CHANNELS)) if dark is None else np.asarray(dark, dtype=np.float64)
+        if self.dark.shape != (len(CHANNELS),):
+            raise ValueError(f"dark has shape {self.dark.shape}, expected ({len(CHANNELS)},)")
+        self.normalise = bool(normalise)
+        self.indices = [(int(a), int(b)) for a, b in indices]
+        self.aggregate = aggregate
+        self.drop_zero = bool(drop_zero)
+        self._a = np.array([WAVELENGTHS.index(a) for a, _ in self.indices], dtype=np.int64)
+        self._b = np.array([WAVELENGTHS.index(b) for _, b in self.indices], dtype=np.int64)
+
+    @property
+    def feature_names(self) -> List[str]:
+        prefix = "share_" if self.normalise else ""
+        return [prefix + ch for ch in CHANNELS] + [f"nd_{a}_{b}" for a, b in self.indices]
+
+    @property
+    def n_features(self) -> int:
+        return len(CHANNELS) + len(self.indices)
+
+    def row_features(self, rows, baseline=None) -> np.ndarray:
+        """
+        Correct, filter, normalise and add the indices to every row.
+
+        Args:
+            rows: (n, 18) channel rows; NaN marks a missing reading
+            baseline: rows to subtract first, same shape (for readings not yet baseline-adjusted)
+
+        Returns:
+            (kept rows, n_features) array
+        """
+        X = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        if baseline is not None:
+            X = X - np.nan_to_num(np.asarray(baseline, dtype=np.float64))
+        X = np.maximum(X - self.dark, 0)  # NaN stays NaN
+
+        keep = np.isfinite(X).all(axis=1)
+        total = X.sum(axis=1)
+        if self.drop_zero:
+            keep &= total > 0
+        X, total = X[keep], total[keep]
+
+        a, b = X[:, self._a], X[:, self._b]
+        sums = a + b
+        indices = np.divide(a - b, sums, out=np.zeros_like(sums), where=sums > 0)
+        if self.normalise:
+            X = np.divide(X, total[:, None], out=np.zeros_like(X), where=total[:, None] > 0)
+        return np.hstack([X, indices])
+
+    def transform(self, rows, baseline=None) -> np.ndarray:
+        """
+        Feature vector of one scan, shape (n_features,).
+
+        Raises:
+            ValueError: if no row survives the filter
+        """
+        features = self.row_features(rows, baseline)
+        if not len(features):
+            raise ValueError("Scan has no complete channel rows")
+        if self.aggregate == "median":
+            return np.median(features, axis=0)
+        return features.mean(axis=0)
+
+    def transform_many(self, scans: Iterable) -> np.ndarray:
+        """
+        Feature vectors of several scans (each an (n, 18) row block), shape (scans, n_features).
+        """
+        return np.array([self.transform(rows) for rows in scans]).reshape(-1, self.n_features)
+
+    # === Serialisation (next to the model's own arrays) ===
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        meta = {"normalise": self.normalise, "indices": self.indices,
+                "aggregate": self.aggregate, "drop_zero": self.drop_zero}
+        return {"features_meta": np.array(json.dumps(meta)), "features_dark": self.dark}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> Optional["FeaturePipeline"]:
+        """
+        The pipeline saved by to_arrays(), or None if 'arrays' has none.
+        """
+        if "features_meta" not in arrays:
+            return None
+        meta = json.loads(str(arrays["features_meta"]))
+        return cls(dark=arrays["features_dark"], **meta)
+
+    def __repr__(self):
+        return (f"FeaturePipeline(normalise={self.normalise}, indices={self.indices}, "
+                f"aggregate='{self.aggregate}', drop_zero={self.drop_zero})")
+
+
+# What models trained before the pipeline were fed: the mean of the scan's complete rows
+LEGACY_PIPELINE = FeaturePipeline(normalise=False, indices=(), drop_zero=False)
+
+
+def pipeline_for(model) -> FeaturePipeline:
+    """
+    The pipeline saved with a loaded model (compiled or pickled), else LEGACY_PIPELINE.
+    """
+    pipeline = getattr(model, "feature_pipeline", None)
+    return pipeline if pipeline is not None else LEGACY_PIPELINE
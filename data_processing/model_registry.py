@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resident model registry for post-scan health checks
+
+Models are loaded once and kept in memory, reloaded when the file's
+mtime changes and evicted least-recently-used beyond a fixed count.
+Scans can be classified straight from the in-memory readings collected
+during acquisition, without writing and re-reading the CSV. A scan's rows
+go through the feature pipeline saved with its model (see
+feature_pipeline.py), so the rig builds the features the model was
+trained on.
+
+The registry can also run as a small local inference service that
+micro-batches requests from several rigs into one predict() call:
+    python -m data_processing.model_registry --port 8765
+"""
+
+import os
+import csv
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+
+from data_processing.compiled_model import load_model
+from data_processing.feature_pipeline import CHANNELS, FeaturePipeline, LEGACY_PIPELINE, pipeline_for
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_MODELS = 4             # models kept resident before the least recently used is dropped
+SERVICE_PORT = 8765
+BATCH_WAIT = 0.005         # seconds the service waits to fill a batch after the first request
+MAX_BATCH = 64
+
+
+def scan_rows(scan: Union[str, Iterable]) -> np.ndarray:
+    """
+    The channel rows of a scan, shape (n, 18); incomplete rows are NaN.
+
+    Args:
+        scan: path to a scan CSV, an (n, 18) array of channel rows, or the
+              readings as a list of sensor -> channel -> value dicts (one per
+              illumination step)
+    """
+    if isinstance(scan, np.ndarray):
+        return np.atleast_2d(scan).astype(np.float64)
+    if isinstance(scan, str):
+        with open(scan, "r") as csvfile:
+            rows = [[float(row[ch]) for ch in CHANNELS if row.get(ch) not in (None, "")]
+                    for row in csv.DictReader(csvfile)]
+    else:
+        rows = [[channels[ch] for ch in CHANNELS if ch in channels]
+                for step in scan for channels in step.values()]
+    # Rows of a skipped sensor are written as NaN; short ones are made so
+    rows = [row if len(row) == len(CHANNELS) else [np.nan] * len(CHANNELS) for row in rows]
+    return np.asarray(rows, dtype=np.float64).reshape(-1, len(CHANNELS))
+
+
+def scan_features(scan: Union[str, Iterable], pipeline: FeaturePipeline = None) -> np.ndarray:
+    """
+    A scan's feature vector (see scan_rows for the accepted forms).
+
+    Args:
+        pipeline: the model's feature pipeline (see feature_pipeline.pipeline_for);
+                  by default the mean of the complete rows, as models without one expect
+
+    Raises:
+        ValueError: if the scan has no usable rows
+    """
+    return (pipeline or LEGACY_PIPELINE).transform(scan_rows(scan))
+
+
+class ModelRegistry:
+    def __init__(self, max_models: int = MAX_MODELS):
+        """
+        Keeps loaded models in memory, keyed by absolute path. Compiled
+        .npz models (see compiled_model.py) load with NumPy only; anything
+        else is unpickled.
+        """
+        self.max_models = max_models
+        self._models = OrderedDict()  # path -> (mtime, model)
+        self._lock = threading.Lock()
+
+    def get(self, model_path: str):
+        """
+        Return the model at 'model_path', loading it only if it is not
+        resident or the file changed since it was loaded.
+        """
+        path = os.path.abspath(model_path)
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            entry = self._models.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._models.move_to_end(path)
+                return entry[1]
+
+        model = load_model(path)
+
+        with self._lock:
+            self._models[path] = (mtime, model)
+            self._models.move_to_end(path)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return model
+
+    def predict(self, model_path: str, features) -> np.ndarray:
+        """
+        Predict a batch of feature vectors (shape (n, n_features)) with one call.
+        """
+        X = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        return self.get(model_path).predict(X)
+
+    def features(self, model_path: str, scan) -> np.ndarray:
+        """
+        The feature vector of 'scan' through the pipeline saved with the model at 'model_path'.
+        """
+        return scan_features(scan, pipeline_for(self.get(model_path)))
+
+    def evict(self, model_path: str = None):
+        """
+        Drop one model (or all of them) from memory.
+        """
+        with self._lock:
+            if model_path is None:
+                self._models.clear()
+            else:
+                self._models.pop(os.path.abspath(model_path), None)
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+
+_registry = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    The process-wide registry used by main.py.
+    """
+    return _registry
+
+
+def check_health(model_path: str, scan) -> str:
+    """
+    Classify one scan (CSV path or in-memory readings) as Healthy/Unhealthy.
+    """
+    registry = get_registry()
+    prediction = registry.predict(model_path, registry.features(model_path, scan))
+    return "Healthy" if prediction[0] == 1 else "Unhealthy"
+
+
+class InferenceService:
+    def __init__(self, registry: ModelRegistry = None, models_dir: str = MODELS_DIR,
+                 batch_wait: float = BATCH_WAIT, max_batch: int = MAX_BATCH):
+        """
+        Collects requests from all connections and answers them in
+        per-model batches.
+
+        Protocol: one JSON object per line, e.g.
+            {"model": "basil_model.npz", "rows": [[18 floats], ...]}
+        (the scan's channel rows, put through the model's feature pipeline
+        here) or {"model": ..., "features": [...]} with a ready feature vector,
+        answered with
+            {"prediction": 1, "label": "Healthy"} or {"error": "..."}
+        """
+        self.registry = registry or get_registry()
+        self.models_dir = models_dir
+        self.batch_wait = batch_wait
+        self.max_batch = max_batch
+        self._requests = queue.Queue()
+        self._stop = threading.Event()
+        self._batcher = threading.Thread(target=self._run_batches, name="inference-batcher", daemon=True)
+        self._batcher.start()
+
+    def model_path(self, model_name: str) -> str:
+        # Only plain file names inside models_dir are accepted
+        return os.path.join(self.models_dir, os.path.basename(model_name))
+
+    def submit(self, model_name: str, features) -> Future:
+        future = Future()
+        self._requests.put((model_name, features, future))
+        return future
+
+    def stop(self):
+        self._stop.set()
+        self._batcher.join(timeout=1)
+
+    def _run_batches(self):
+        while not self._stop.is_set():
+            try:
+                first = self._requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._predict_batch(batch)
+
+    def _predict_batch(self, batch):
+        by_model: Dict[str, list] = {}
+        for model_name, features, future in batch:
+            by_model.setdefault(model_name, []).append((features, future))
+
+        for model_name, items in by_model.items():
+            model_path = self.model_path(model_name)
+            try:
+                predictions = self.registry.predict(model_path, [features for features, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), prediction in zip(items, predictions):
+                future.set_result(prediction.item() if hasattr(prediction, "item") else prediction)
+
+    def serve(self, host: str = "127.0.0.1", port: int = SERVICE_PORT):
+        """
+        Accept JSON-lines requests on a local TCP port until interrupted.
+        """
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                        if "rows" in request:
+                            features = service.registry.features(service.model_path(request["model"]),
+                                                                 np.asarray(request["rows"], dtype=np.float64))
+                        else:
+                            features = request["features"]
+                        prediction = service.submit(request["model"], features).result()
+                        reply = {"prediction": prediction,
+                                 "label": "Healthy" if prediction == 1 else "Unhealthy"}
+                    except Exception as e:
+                        reply = {"error": str(e)}
+                    self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        with Server((host, port), Handler) as server:
+            print(f"[READY] Inference service listening on {host}:{port}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.stop()
+
+
+class InferenceClient:
+    def __init__(self, host: str = "127.0.0.1", port: int = SERVICE_PORT, timeout: float = 5.0):
+        """
+        Keeps one connection to an InferenceService open.
+        """
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._sock.makefile("rwb")
+
+    def check_health(self, model_name: str, scan) -> str:
+        # The service applies the model's feature pipeline; NaN marks incomplete rows
+        request = {"model": model_name, "rows": scan_rows(scan).tolist()}
+        self._file.write((json.dumps(request) + "\n").encode("utf-8"))
+        self._file.flush()
+        reply = json.loads(self._file.readline())
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["label"]
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local micro-batching inference service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT)
+    args = parser.parse_args()
+
+    InferenceService(models_dir=args.models_dir, batch_wait=args.batch_wait).serve(args.host, args.port)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental health models, updated as labelled scans are saved
+
+An OnlineLearner per scan type turns each new scan into one feature
+vector (its FeaturePipeline, see feature_pipeline.py) and folds it into
+its models without rereading the archive:
+    scaler  running mean / variance (StandardScaler.partial_fit)
+    sgd     logistic-loss SGDClassifier, updated with partial_fit
+    knn     a reference set of scan feature vectors that new scans are
+            appended to, scaled with the running statistics when the
+            model is built
+Every HOLDOUT_EVERY-th scan (picked by a hash of its filename, so the
+choice never changes) is held out for validation instead of trained on.
+Every few updates both models are scored on the held-out scans the way
+the rig classifies them (one prediction per scan, from the features of
+the pipeline saved with the model). Nothing is published until the
+held-out set has MIN_HOLDOUT_PER_CLASS scans of each class; after that
+the better one replaces the published model only if it scores strictly
+higher than the model already there. The swap is atomic (export_compiled
+writes a temporary file and renames it), and ModelRegistry reloads the
+file when its mtime changes, so a running rig picks it up at the next
+scan.
+
+Models are published next to the learner state in data/cache/online/
+(<type>_model.npz), so the models shipped in data_processing/ are left
+alone; --publish writes to data_processing/ instead, where the rig loads
+them from.
+
+Labels come from the scan's description (the filename before _scan_),
+through scan_cache.health_label like every other trainer. Descriptions
+naming no condition, e.g. test_scan, are skipped. Learner state is kept
+in data/cache/online/, so a restart resumes where it stopped.
+
+Usage (from the project root):
+    python -m data_processing.online_learning --types basil leaf
+    python -m data_processing.online_learning --types basil --publish
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from data_processing.scan_cache import health_label, parse_scan
+from data_processing.compiled_model import export_compiled, load_model
+from data_processing.feature_pipeline import FeaturePipeline, pipeline_for
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCANS_DIR = os.path.join(BASE_PROJECT_DIR, "data", "scans")
+DEFAULT_STATE_DIR = os.path.join(BASE_PROJECT_DIR, "data", "cache", "online")
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RANDOM_STATE = 42
+HOLDOUT_EVERY = 5          # one scan in this many is held out for validation
+VALIDATE_EVERY = 3         # training scans between validations
+MAX_REFERENCE = 20000      # KNN reference scans kept; the oldest are dropped beyond this
+KNN_NEIGHBORS = 5
+POLL_INTERVAL = 1.0        # seconds between folder listings
+SETTLE_AGE = 0.5           # seconds a CSV must be unmodified before it is read
+MIN_HOLDOUT_PER_CLASS = 1  # held-out scans of each class needed before anything is published
+
+
+def scan_label(path: str) -> Optional[int]:
+    """
+    Healthy=1 / Unhealthy=0 from a scan's filename, or None if it carries no label.
+    """
+    return health_label(os.path.basename(path).rsplit("_scan_", 1)[0])
+
+
+def is_holdout(path: str, every: int = HOLDOUT_EVERY) -> bool:
+    digest = hashlib.sha1(os.path.basename(path).encode("utf-8")).digest()
+    return every > 0 and digest[0] % every == 0
+
+
+class OnlineLearner:
+    def __init__(self, model_path: str, holdout_every: int = HOLDOUT_EVERY,
+                 validate_every: int = VALIDATE_EVERY, max_reference: int = MAX_REFERENCE,
+                 n_neighbors: int = KNN_NEIGHBORS, min_gain: float = 0.0,
+                 min_holdout_per_class: int = MIN_HOLDOUT_PER_CLASS):
+        """
+        Args:
+            model_path: compiled model (.npz) that validated updates are published to
+            min_gain: held-out accuracy a new model must beat the published one by (strictly)
+            min_holdout_per_class: held-out scans of each class required before publishing
+        """
+        self.model_path = model_path
+        self.holdout_every = holdout_every
+        self.validate_every = validate_every
+        self.max_reference = max_reference
+        self.n_neighbors = n_neighbors
+        self.min_gain = min_gain
+        self.min_holdout_per_class = min_holdout_per_class
+
+        self.pipeline = FeaturePipeline()
+        self.scaler = StandardScaler()
+        self.sgd = SGDClassifier(loss="log_loss", alpha=1e-3, random_state=RANDOM_STATE)
+        self.reference = np.empty((0, self.pipeline.n_features))
+        self.reference_labels = np.empty(0, dtype=np.int64)
+        self.holdout: List[tuple] = []  # (path, raw rows, label) per held-out scan
+        self.seen = set()               # absolute paths already learned or held out
+        self.pending = 0                # training scans since the last validation
+        self.published_accuracy = None
+
+    # === Updates ===
+
+    def add_scan(self, path: str) -> Optional[str]:
+        """
+        Learn from (or hold out) one scan CSV.
+
+        Returns:
+            'train', 'holdout', or None if the scan was skipped
+        """
+        path = os.path.abspath(path)
+        if path in self.seen:
+            return None
+        self.seen.add(path)
+
+        label = scan_label(path)
+        if label is None:
+            return None
+        rows, _ = parse_scan(path)
+        rows = rows.astype(np.float64)
+        try:
+            features = self.pipeline.transform(rows)
+        except ValueError:
+            return None
+
+        if is_holdout(path, self.holdout_every):
+            self.holdout.append((path, rows, label))
+            return "holdout"
+        self.partial_fit(features[None, :], np.array([label], dtype=np.int64))
+        self.pending += 1
+        return "train"
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray):
+        """
+        Fold scan feature vectors into the running scaler, the SGD model and the KNN reference set.
+        """
+        self.scaler.partial_fit(X)
+        self.sgd.partial_fit(self.scaler.transform(X), y, classes=np.array([0, 1]))
+        self.reference = np.vstack([self.reference, X])[-self.max_reference:]
+        self.reference_labels = np.concatenate([self.reference_labels, y])[-self.max_reference:]
+
+    # === Validation and publishing ===
+
+    def models(self) -> Dict[str, object]:
+        """
+        The current candidates: 'sgd', and 'knn' fitted on the scaled reference set.
+        """
+        if not len(self.reference):
+            return {}
+        candidates = {}
+        if len(np.unique(self.reference_labels)) == 2:
+            candidates["sgd"] = self.sgd
+        knn = KNeighborsClassifier(n_neighbors=min(self.n_neighbors, len(self.reference)), weights="distance")
+        candidates["knn"] = knn.fit(self.scaler.transform(self.reference), self.reference_labels)
+        return candidates
+
+    def score(self, predict, pipeline: FeaturePipeline = None) -> Optional[float]:
+        """
+        Held-out accuracy of 'predict' (scan features -> labels), one prediction per scan.
+
+        Args:
+            pipeline: the features 'predict' expects (default: the learner's own)
+        """
+        if not self.holdout:
+            return None
+        X = (pipeline or self.pipeline).transform_many([rows for _, rows, _ in self.holdout])
+        y = np.array([label for _, _, label in self.holdout])
+        return float((np.asarray(predict(X)) == y).mean())
+
+    def holdout_counts(self) -> np.ndarray:
+        """
+        Held-out scans per class: [Unhealthy, Healthy].
+        """
+        return np.bincount([label for _, _, label in self.holdout], minlength=2)
+
+    def validate(self) -> Dict:
+        """
+        Score every candidate and the published model on the held-out scans,
+        and publish the best candidate if it beats the published one.
+
+        Nothing is published while either class has fewer than
+        min_holdout_per_class held-out scans.
+
+        Returns:
+            dict: scores (name -> accuracy), published (candidate name or None), accuracy
+        """
+        self.pending = 0
+        candidates = self.models()
+        scores = {name: self.score(lambda X, m=model: m.predict(self.scaler.transform(X)))
+                  for name, model in candidates.items()}
+        if not candidates:
+            return {"scores": scores, "published": None, "accuracy": None}
+
+        current = None
+        if os.path.exists(self.model_path):
+            try:
+                model = load_model(self.model_path)
+                current = self.score(model.predict, pipeline_for(model))
+            except Exception as e:
+                print(f"[WARNING] Could not score the published model {self.model_path}: {e}")
+        scores["published"] = current
+
+        if self.holdout_counts().min() < self.min_holdout_per_class:
+            # Too few held-out scans to tell the models apart, or a class never held out
+            return {"scores": scores, "published": None, "accuracy": current}
+        best = max(candidates, key=scores.get)
+        if current is not None and not scores[best] > current + self.min_gain:
+            return {"scores": scores, "published": None, "accuracy": current}
+
+        export_compiled(candidates[best], self.model_path, scaler=self.scaler, features=self.pipeline)
+        self.published_accuracy = scores[best]
+        return {"scores": scores, "published": best, "accuracy": scores[best]}
+
+    # === State ===
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> "OnlineLearner":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def _format_scores(scores: Dict) -> str:
+    return ", ".join(f"{name} {'n/a' if value is None else f'{value:.2f}'}" for name, value in scores.items())
+
+
+class ScanWatcher:
+    def __init__(self, scan_types: List[str], scans_dir: str = DEFAULT_SCANS_DIR,
+                 models_dir: str = None, state_dir: str = DEFAULT_STATE_DIR,
+                 poll_interval: float = POLL_INTERVAL, **learner_kwargs):
+        """
+        One OnlineLearner per scan type, fed from scans/<type>_scans/ and
+        publishing to <models_dir>/<type>_model.npz.
+
+        Args:
+            models_dir: where models are published (default: state_dir; MODELS_DIR is the one the rig loads)
+        """
+        models_dir = models_dir or state_dir
+        self.scans_dir = scans_dir
+        self.state_dir = state_dir
+        self.poll_interval = poll_interval
+        self.learners: Dict[str, OnlineLearner] = {}
+        for scan_type in scan_types:
+            state_path = self._state_path(scan_type)
+            learner = OnlineLearner.load(state_path) if os.path.exists(state_path) else None
+            if learner is not None and not hasattr(learner, "min_gain"):
+                # Saved before per-scan features and the publishing checks: relearn with the new models
+                print(f"[ONLINE] {scan_type}: state predates the current learner, relearning from scratch")
+                learner = None
+            model_path = os.path.join(models_dir, f"{scan_type}_model.npz")
+            if learner is not None:
+                for key, value in learner_kwargs.items():
+                    setattr(learner, key, value)
+                learner.model_path = model_path
+                print(f"[ONLINE] {scan_type}: resumed with {len(learner.seen)} scan(s) seen")
+            else:
+                learner = OnlineLearner(model_path, **learner_kwargs)
+            self.learners[scan_type] = learner
+
+    def _state_path(self, scan_type: str) -> str:
+        return os.path.join(self.state_dir, f"{scan_type}_learner.pkl")
+
+    def poll(self, validate: bool = True) -> int:
+        """
+        Learn from every new, settled CSV once; validate where enough scans arrived.
+
+        Returns:
+            number of scans trained on or held out
+        """
+        added = 0
+        now = time.time()
+        for scan_type, learner in self.learners.items():
+            folder = os.path.join(self.scans_dir, f"{scan_type}_scans")
+            if not os.path.isdir(folder):
+                continue
+            changed = False
+            for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+                if not entry.name.endswith(".csv") or os.path.abspath(entry.path) in learner.seen:
+                    continue
+                # The writer may still be appending to a very fresh file
+                if now - entry.stat().st_mtime < SETTLE_AGE:
+                    continue
+                started = time.monotonic()
+                use = learner.add_scan(entry.path)
+                changed = True
+                if use:
+                    added += 1
+                    print(f"[ONLINE] {scan_type}: {use} {entry.name} ({time.monotonic() - started:.3f}s)")
+                if validate and learner.pending >= learner.validate_every:
+                    self._validate(scan_type, learner)
+            if changed:
+                learner.save(self._state_path(scan_type))
+        return added
+
+    def validate_all(self):
+        for scan_type, learner in self.learners.items():
+            if learner.pending:
+                self._validate(scan_type, learner)
+                learner.save(self._state_path(scan_type))
+
+    def _validate(self, scan_type: str, learner: OnlineLearner):
+        result = learner.validate()
+        unhealthy, healthy = learner.holdout_counts()
+        print(f"[VALIDATE] {scan_type}: {_format_scores(result['scores'])} "
+              f"on {healthy} healthy / {unhealthy} unhealthy held-out scan(s)")
+        if result["published"]:
+            print(f"[SWAP] {scan_type}: {result['published']} published to {learner.model_path}")
+
+    def run(self):
+        """
+        Catch up on the scans already on disk, then poll until interrupted.
+        """
+        self.poll(validate=False)
+        self.validate_all()
+        print(f"[READY] Watching {self.scans_dir} every {self.poll_interval:.1f}s")
+        try:
+            while True:
+                time.sleep(self.poll_interval)
+                self.poll()
+        except KeyboardInterrupt:
+            self.validate_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the health models incrementally as labelled scans are saved")
+    parser.add_argument("--types", nargs="+", default=["basil", "leaf"], help="scan types to learn")
+    parser.add_argument("--scans-dir", default=DEFAULT_SCANS_DIR, help="folder holding <type>_scans/")
+    parser.add_argument("--models-dir", help="where <type>_model.npz is published (default: the state dir)")
+    parser.add_argument("--publish", action="store_true",
+                        help=f"publish to {MODELS_DIR}, replacing the models the rig loads")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR)
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="seconds between folder checks")
+    parser.add_argument("--validate-every", type=int, default=VALIDATE_EVERY,
+                        help="training scans between held-out validations")
+    parser.add_argument("--min-gain", type=float, default=0.0,
+                        help="held-out accuracy a new model must gain over the published one (strictly more)")
+    parser.add_argument("--min-holdout", type=int, default=MIN_HOLDOUT_PER_CLASS,
+                        help="held-out scans of each class required before publishing")
+    parser.add_argument("--once", action="store_true", help="process the scans on disk, validate and exit")
+    args = parser.parse_args()
+
+    models_dir = args.models_dir or (MODELS_DIR if args.publish else None)
+    watcher = ScanWatcher(args.types, scans_dir=args.scans_dir, models_dir=models_dir,
+                          state_dir=args.state_dir, poll_interval=args.poll,
+                          validate_every=args.validate_every, min_gain=args.min_gain,
+                          min_holdout_per_class=args.min_holdout)
+    if args.once:
+        watcher.poll(validate=False)
+        watcher.validate_all()
+    else:
+        watcher.run()
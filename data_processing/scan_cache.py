@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental parse cache for the training loaders
+
+Every scan CSV is parsed once into a float32 block of channel rows and a
+per-row health label (see health_label), keyed by the file's path, size
+and mtime. Parsed blocks are kept together in one pack file
+(data/cache/parsed_scans.npz), so reloading an archive costs one stat per
+file plus one read of the pack; only new or changed files are parsed
+again, in parallel.
+"""
+
+import os
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+WAVELENGTHS = [410, 435, 460, 485, 510, 535, 560, 585, 610, 645, 680, 705, 730, 760, 810, 890, 900, 940]
+CHANNELS = [f"channel_{i+1}_{wl}" for i, wl in enumerate(WAVELENGTHS)]
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(BASE_PROJECT_DIR, "data", "cache", "parsed_scans.npz")
+PARALLEL_MIN_FILES = 8  # below this many changed files a process pool costs more than it saves
+CACHE_VERSION = 2       # bumped when parse_scan changes, so older pack entries are parsed again
+UNHEALTHY_WORDS = ("unhealthy", "dry", "wilt", "overwater", "over_water", "sick", "dead", "rot")
+UNLABELLED = -1         # label of rows whose description names no condition
+
+
+def health_label(description: str) -> Optional[int]:
+    """
+    Healthy=1 / Unhealthy=0 from a scan description, or None if it carries no label.
+
+    'unhealthy' or a word like 'dry' means Unhealthy and is checked first
+    (so 'unhealthy' is not read as 'health'); 'health' means Healthy.
+    Every trainer labels scans through this function.
+    """
+    description = str(description).lower()
+    if any(word in description for word in UNHEALTHY_WORDS):
+        return 0
+    if "health" in description:
+        return 1
+    return None
+
+
+def file_key(path: str) -> str:
+    """
+    Cache key for the current version of a file: hash of its absolute path, size and mtime.
+    """
+    st = os.stat(path)
+    identity = f"{CACHE_VERSION}:{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+def parse_scan(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse one scan CSV the way classifier.load_data filters it.
+
+    Rows with a missing channel or with all channels zero are dropped.
+    Each row is labelled from its description with health_label.
+
+    Returns:
+        (float32 array of shape (n, 18), int8 labels of shape (n,): 1, 0 or UNLABELLED)
+    """
+    df = pd.read_csv(path)
+    if any(ch not in df.columns for ch in CHANNELS):
+        return np.empty((0, len(CHANNELS)), np.float32), np.empty(0, np.int8)
+
+    values = df[CHANNELS].to_numpy(dtype=np.float64)
+    keep = ~np.isnan(values).any(axis=1)
+    keep &= values.sum(axis=1) != 0
+
+    descriptions = df["description"].fillna("") if "description" in df.columns else [""] * len(df)
+    labels = np.array([UNLABELLED if label is None else label for label in map(health_label, descriptions)],
+                      dtype=np.int8)
+    return values[keep].astype(np.float32), labels[keep]
+
+
+class ScanParseCache:
+    def __init__(self, cache_path: str = DEFAULT_CACHE_PATH, workers: int = None):
+        self.cache_path = cache_path
+        self.workers = workers
+        self.channels = list(CHANNELS)
+        self._entries: Dict[str, Tuple[str, np.ndarray, np.ndarray]] = None  # key -> (path, values, labels)
+        self._lock = threading.Lock()
+
+    def load(self, paths: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Channel rows and labels for 'paths', concatenated in the given order.
+
+        Returns:
+            (float32 array of shape (n, 18), int8 array of shape (n,), see parse_scan)
+        """
+        blocks = self.load_scans(paths)
+        if not blocks:
+            return np.empty((0, len(CHANNELS)), np.float32), np.empty(0, np.int8)
+        return (np.concatenate([values for values, _ in blocks]),
+                np.concatenate([labels for _, labels in blocks]))
+
+    def load_scans(self, paths: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Channel rows and labels of each of 'paths', one block per file
+        (for per-scan features, see feature_pipeline.py).
+        """
+        keys = [file_key(path) for path in paths]
+        with self._lock:
+            self._read_pack()
+            missing = [(path, key) for path, key in zip(paths, keys) if key not in self._entries]
+            if missing:
+                parsed = self._parse([path for path, _ in missing])
+                for (path, key), (values, labels) in zip(missing, parsed):
+                    self._entries[key] = (os.path.abspath(path), values, labels)
+                self._write_pack()
+            blocks = [self._entries[key] for key in keys]
+
+        print(f"[CACHE] {len(paths) - len(missing)} scan(s) from cache, {len(missing)} parsed")
+        return [(values, labels) for _, values, labels in blocks]
+
+    def _parse(self, paths: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if len(paths) < PARALLEL_MIN_FILES or self.workers == 1:
+            return [parse_scan(path) for path in paths]
+        workers = self.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(parse_scan, paths, chunksize=max(len(paths) // (workers * 4), 1)))
+
+    def _read_pack(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as pack:
+                if "labels" not in pack.files:
+                    return  # written before CACHE_VERSION 2; every file is parsed again
+                values, labels, offsets = pack["values"], pack["labels"], pack["offsets"]
+                for i, (key, path) in enumerate(zip(pack["keys"].tolist(), pack["paths"].tolist())):
+                    start, stop = offsets[i], offsets[i + 1]
+                    self._entries[key] = (path, values[start:stop], labels[start:stop])
+        except Exception as e:
+            print(f"[WARNING] Ignoring unreadable parse cache {self.cache_path}: {e}")
+            self._entries = {}
+
+    def _write_pack(self):
+        # Drop entries whose file has since changed or disappeared
+        current = {}
+        for key, entry in self._entries.items():
+            try:
+                if file_key(entry[0]) == key:
+                    current[key] = entry
+            except OSError:
+                pass
+        self._entries = current
+
+        keys = list(current)
+        sizes = [len(current[key][1]) for key in keys]
+        offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]).astype(np.int64)
+        values = np.concatenate([current[key][1] for key in keys]) if keys else np.empty((0, len(CHANNELS)), np.float32)
+        labels = np.concatenate([current[key][2] for key in keys]) if keys else np.empty(0, np.int8)
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + ".tmp.npz"
+        np.savez(tmp_path, values=values, labels=labels, offsets=offsets,
+                 keys=np.array(keys, dtype=str), paths=np.array([current[key][0] for key in keys], dtype=str))
+        os.replace(tmp_path, self.cache_path)
+
+
+_cache = None
+
+
+def get_scan_cache() -> ScanParseCache:
+    """
+    The process-wide parse cache used by classifier.load_data.
+    """
+    global _cache
+    if _cache is None:
+        _cache = ScanParseCache()
+    return _cache
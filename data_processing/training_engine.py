@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel, cached hyperparameter search for the health classifiers
+
+All model families (SVC, KNN, Random Forest) are scored on one shared set
+of stratified CV splits, with every (family, parameters, fold) fit run in
+parallel through joblib. Each fold score is cached on disk under the hash
+of the training data, so a rerun on unchanged data skips every fit that
+already ran. Search is either a full grid or successive halving, where
+candidates are first scored on a small share of each training fold and
+only the best third moves on to more data.
+
+Every scan is one sample: its rows go through a FeaturePipeline (dark
+correction, per-illumination normalisation, vegetation indices, scan
+mean; see feature_pipeline.py), the same one that is saved with the
+exported model and applied by check_health on the rig. Exported models
+are Pipelines of StandardScaler + classifier on those features. Labels
+are encoded Healthy=1, as check_health expects. An export path ending in
+.npz writes the compiled NumPy-only form (see compiled_model.py).
+
+Usage (from the project root):
+    python -m data_processing.training_engine data/scans/basil_scans \
+        --export data_processing/basil_model.npz
+"""
+
+import os
+import json
+import math
+import pickle
+import hashlib
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
+from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.ensemble import RandomForestClassifier
+
+from data_processing.scan_cache import UNLABELLED, get_scan_cache
+from data_processing.compiled_model import export_compiled
+from data_processing.feature_pipeline import FeaturePipeline, dark_level
+from data_processing.model_registry import scan_rows
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(BASE_PROJECT_DIR, "data", "cache", "training")
+
+RANDOM_STATE = 42
+N_SPLITS = 5
+HALVING_FACTOR = 3
+MIN_RESOURCES = 30  # training scans per fold in the first halving round
+
+# Same search spaces as classifier.tune_*_classifier
+FAMILIES = {
+    "svc": (lambda: SVC(), {
+        "kernel": ["linear", "rbf"],
+        "C": [0.1, 1, 10],
+        "gamma": ["scale", "auto"],
+    }),
+    "knn": (lambda: KNeighborsClassifier(), {
+        "n_neighbors": [1, 3, 5, 7],
+        "weights": ["uniform", "distance"],
+    }),
+    "rf": (lambda: RandomForestClassifier(random_state=RANDOM_STATE), {
+        "n_estimators": [10, 50, 100],
+        "max_depth": [None, 5, 10],
+    }),
+}
+FAMILY_NAMES = {"svc": "SVC", "knn": "KNN", "rf": "Random Forest"}
+
+
+def make_model(family: str, params: dict) -> Pipeline:
+    factory, _ = FAMILIES[family]
+    return Pipeline([("scaler", StandardScaler()), ("clf", factory().set_params(**params))])
+
+
+def dataset_hash(X: np.ndarray, y: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    for array in (np.ascontiguousarray(X, dtype=np.float64), np.ascontiguousarray(y, dtype=np.int64)):
+        digest.update(str(array.shape).encode("utf-8"))
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def load_training_data(folder_path: str, pipeline: FeaturePipeline = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One feature vector and label (Healthy=1) per scan CSV in a folder, via the parse cache.
+
+    Args:
+        pipeline: turns each scan's rows into its features (default: FeaturePipeline())
+    """
+    pipeline = pipeline or FeaturePipeline()
+    files = sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".csv"))
+    if not files:
+        raise FileNotFoundError(f"No CSV files found in: {folder_path}")
+    # Unlabelled scans and scans without a usable row (e.g. every sensor skipped) are left out
+    scans = [(values, labels) for values, labels in get_scan_cache().load_scans(files)
+             if labels[0] != UNLABELLED and len(pipeline.row_features(values))]
+    X = pipeline.transform_many([values for values, _ in scans])
+    y = np.array([labels[0] for _, labels in scans], dtype=np.int64)
+    return X, y
+
+
+def cv_folds(y: np.ndarray, n_splits: int = N_SPLITS) -> int:
+    """
+    Stratified folds for a per-scan dataset: at most 'n_splits', but no more
+    than the smaller class has scans (every fold must hold both), and at least 2.
+    """
+    return int(max(2, min(n_splits, np.bincount(y).min())))
+
+
+def shared_splits(y: np.ndarray, n_splits: int = N_SPLITS,
+                  random_state: int = RANDOM_STATE) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    One set of stratified folds for every family. Each fold's training
+    indices are ordered so any prefix keeps the class balance, which is
+    what the halving rounds subsample.
+    """
+    rng = np.random.RandomState(random_state)
+    splits = []
+    skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    for train, test in skf.split(np.zeros(len(y)), y):
+        order = rng.permutation(train)
+        labels = y[order]
+        position = np.empty(len(order))
+        for label in np.unique(labels):
+            mask = labels == label
+            position[mask] = (np.arange(mask.sum()) + 0.5) / mask.sum()
+        splits.append((order[np.argsort(position, kind="stable")], test))
+    return splits
+
+
+class FoldCache:
+    def __init__(self, cache_dir: str, data_hash: str):
+        """
+        Fold scores for one dataset, stored as JSON next to the refitted models.
+        """
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, f"folds_{data_hash}.json") if cache_dir else None
+        self.data_hash = data_hash
+        self.scores: Dict[str, float] = {}
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.scores = json.load(f)
+
+    @staticmethod
+    def key(family: str, params: dict, fold: int, resource: int) -> str:
+        return json.dumps([family, params, fold, resource], sort_keys=True, default=str)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.scores, f)
+        os.replace(tmp_path, self.path)
+
+    def model_path(self, family: str, params: dict) -> str:
+        name = hashlib.sha256(self.key(family, params, -1, -1).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"model_{self.data_hash}_{name}.pkl") if self.cache_dir else None
+
+
+def _score_fold(X, y, family, params, train, test, resource) -> float:
+    train = train[:resource] if resource else train
+    model = make_model(family, params).fit(X[train], y[train])
+    return accuracy_score(y[test], model.predict(X[test]))
+
+
+class SearchEngine:
+    def __init__(self, families: List[str] = None, search: str = "grid", n_jobs: int = -1,
+                 cache_dir: str = DEFAULT_CACHE_DIR, n_splits: int = N_SPLITS,
+                 factor: int = HALVING_FACTOR, min_resources: int = MIN_RESOURCES):
+        self.families = list(families or FAMILIES)
+        self.search = search
+        self.n_jobs = n_jobs
+        self.cache_dir = cache_dir
+        self.n_splits = n_splits
+        self.factor = factor
+        self.min_resources = min_resources
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> Dict[str, dict]:
+        """
+        Search every family on (X, y) and refit each family's best candidate on all of it.
+
+        Returns:
+            family -> {'best_params', 'cv_scores', 'cv_mean', 'cv_std', 'model', 'evaluated'}
+        """
+        cache = FoldCache(self.cache_dir, dataset_hash(X, y))
+        splits = shared_splits(y, cv_folds(y, self.n_splits))
+        n_train = min(len(train) for train, _ in splits)
+
+        # Per family: remaining candidates, and the resource schedule for its rounds
+        state = {}
+        for family in self.families:
+            # Scans are few: a KNN cannot ask for more neighbours than a fold trains on
+            candidates = [params for params in ParameterGrid(FAMILIES[family][1])
+                          if params.get("n_neighbors", 1) <= n_train]
+            if self.search == "halving" and len(candidates) > 1:
+                rounds = math.ceil(math.log(len(candidates), self.factor))
+                first = max(self.min_resources, n_train // self.factor ** rounds)
+                schedule = [r for r in (first * self.factor ** i for i in range(rounds)) if r < n_train] + [n_train]
+            else:
+                schedule = [n_train]
+            state[family] = {"candidates": candidates, "schedule": schedule, "round": 0, "evaluated": 0}
+
+        fits = 0
+        while any(s["round"] < len(s["schedule"]) for s in state.values()):
+            # One parallel batch per round, across every family still searching
+            tasks = []
+            for family, s in state.items():
+                if s["round"] >= len(s["schedule"]):
+                    continue
+                resource = s["schedule"][s["round"]]
+                resource = None if resource >= n_train else resource
+                s["resource"] = resource
+                for params in s["candidates"]:
+                    for fold in range(len(splits)):
+                        key = cache.key(family, params, fold, resource)
+                        if key not in cache.scores:
+                            tasks.append((key, family, params, fold, resource))
+
+            if tasks:
+                scores = Parallel(n_jobs=self.n_jobs)(
+                    delayed(_score_fold)(X, y, family, params, *splits[fold], resource)
+                    for _, family, params, fold, resource in tasks
+                )
+                cache.scores.update((key, float(score)) for (key, *_), score in zip(tasks, scores))
+                cache.save()
+                fits += len(tasks)
+
+            for family, s in state.items():
+                if s["round"] >= len(s["schedule"]):
+                    continue
+                means = [np.mean([cache.scores[cache.key(family, params, fold, s["resource"])]
+                                  for fold in range(len(splits))]) for params in s["candidates"]]
+                s["evaluated"] += len(s["candidates"])
+                s["round"] += 1
+                if s["round"] < len(s["schedule"]):
+                    keep = max(math.ceil(len(s["candidates"]) / self.factor), 1)
+                    order = np.argsort(means, kind="stable")[::-1][:keep]
+                    s["candidates"] = [s["candidates"][i] for i in sorted(order)]
+                else:
+                    s["means"] = means
+
+        print(f"[TRAINING] {fits} new fold fits, the rest from cache ({cache.path})")
+
+        results = {}
+        for family, s in state.items():
+            best = int(np.argmax(s["means"]))
+            params = s["candidates"][best]
+            cv_scores = np.array([cache.scores[cache.key(family, params, fold, None)] for fold in range(len(splits))])
+            results[family] = {
+                "best_params": params,
+                "cv_scores": cv_scores,
+                "cv_mean": cv_scores.mean(),
+                "cv_std": cv_scores.std(),
+                "model": self._refit(cache, family, params, X, y),
+                "evaluated": s["evaluated"],
+            }
+        return results
+
+    @staticmethod
+    def _refit(cache: FoldCache, family: str, params: dict, X, y) -> Pipeline:
+        path = cache.model_path(family, params)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        model = make_model(family, params).fit(X, y)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                pickle.dump(model, f)
+        return model
+
+
+def train_and_export(folder_path: str, export_path: str = None, family: str = "best",
+                     search: str = "grid", n_jobs: int = -1, cache_dir: str = DEFAULT_CACHE_DIR,
+                     test_size: float = 0.2, pipeline: FeaturePipeline = None) -> Dict[str, dict]:
+    """
+    Search all families on a train split, report held-out metrics and pickle one model.
+
+    Args:
+        family: family to export ('svc', 'knn', 'rf'), or 'best' for the highest CV mean
+        pipeline: feature pipeline, saved with the exported model (default: FeaturePipeline())
+
+    Returns:
+        family -> search result with 'train_acc', 'test_acc', 'confusion_matrix', 'classification_report' added
+    """
+    pipeline = pipeline or FeaturePipeline()
+    X, y = load_training_data(folder_path, pipeline)
+    print(f"[TRAINING] {len(X)} scans, {pipeline.n_features} features each ({pipeline})")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=RANDOM_STATE,
+                                                        stratify=y)
+
+    results = SearchEngine(search=search, n_jobs=n_jobs, cache_dir=cache_dir).fit(X_train, y_train)
+    for name, result in results.items():
+        model = result["model"]
+        y_test_pred = model.predict(X_test)
+        result["train_acc"] = accuracy_score(y_train, model.predict(X_train))
+        result["test_acc"] = accuracy_score(y_test, y_test_pred)
+        result["confusion_matrix"] = confusion_matrix(y_test, y_test_pred)
+        result["classification_report"] = classification_report(y_test, y_test_pred, zero_division=0)
+
+        print(f"\n=== {FAMILY_NAMES[name]} ===")
+        print("Best params:", result["best_params"], f"({result['evaluated']} candidate evaluations)")
+        print(f"K-Fold ({len(result['cv_scores'])}) CV Accuracies:", np.round(result["cv_scores"], 3))
+        print(f"K-Fold Mean Accuracy: {result['cv_mean']:.3f}  (± {result['cv_std']:.3f})")
+        print(f"Train Accuracy: {result['train_acc']:.3f}")
+        print(f"Test  Accuracy: {result['test_acc']:.3f}")
+        print("Confusion Matrix (Test):\n", result["confusion_matrix"])
+
+    if export_path:
+        chosen = max(results, key=lambda name: results[name]["cv_mean"]) if family == "best" else family
+        results[chosen]["model"].feature_pipeline = pipeline
+        if export_path.endswith(".npz"):
+            export_compiled(results[chosen]["model"], export_path, features=pipeline)
+        else:
+            with open(export_path, "wb") as f:
+                pickle.dump(results[chosen]["model"], f)
+        print(f"\n[EXPORTED] {FAMILY_NAMES[chosen]} model -> {export_path}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search, evaluate and export the health classifiers")
+    parser.add_argument("folder", help="folder of scan CSVs, e.g. data/scans/basil_scans")
+    parser.add_argument("--export", help="where to save the chosen model (.npz compiled or .pkl), e.g. data_processing/basil_model.npz")
+    parser.add_argument("--family", default="best", choices=["best"] + list(FAMILIES))
+    parser.add_argument("--search", default="grid", choices=["halving", "grid"])
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel fits (default: all cores)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write fold results")
+    parser.add_argument("--dark", help="scan CSV recorded with every bulb off, subtracted as the dark level")
+    parser.add_argument("--no-normalise", action="store_true", help="keep absolute channel values")
+    args = parser.parse_args()
+
+    pipeline = FeaturePipeline(dark=dark_level(scan_rows(args.dark)) if args.dark else None,
+                               normalise=not args.no_normalise)
+    train_and_export(args.folder, args.export, args.family, args.search, args.jobs,
+                     None if args.no_cache else args.cache_dir, pipeline=pipeline)
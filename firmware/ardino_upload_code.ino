@@ -12,6 +12,16 @@ String sensorID = "MiddleSensor"; // /dev/cu.usbmodem112301
 // String sensorID = "FarSensor"; // /dev/cu.usbmodem112201
 bool sensorFound = false;
 
+// Binary frames for READ_BIN / READ_RAW (see plant_spectral_scanner/utils/binary_protocol.py):
+// 0xA5 0x5A | seq uint16 | type uint8 | count uint8 | payload | crc16 uint16, all little-endian
+const int PROTOCOL_VERSION = 3;  // 2: READ_BIN/READ_RAW/SET_BAUD, 3: + STREAM_ON/STREAM_OFF
+const uint8_t FRAME_SYNC_1 = 0xA5;
+const uint8_t FRAME_SYNC_2 = 0x5A;
+const uint8_t FRAME_FLOAT32 = 1;
+const uint8_t FRAME_UINT16 = 2;
+uint16_t frameSeq = 0;
+bool streaming = false;  // continuous measurement, one READ_BIN frame per integration
+
 void setup() {
   // CRITICAL: Match Python script's expected baud rate
   Serial.begin(9600);  // Changed back to 9600 to match Python script
@@ -46,6 +56,12 @@ void loop() {
     command.trim();
     processCommand(command);
   }
+  if (streaming) {
+    if (sensor.dataAvailable()) {
+      sendCalibratedFrame();
+    }
+    return;  // no delay, so frames leave as soon as each integration completes
+  }
   delay(10);
 }
 
@@ -112,6 +128,52 @@ void processCommand(String command) {
     Serial.println("SENSOR_ERROR");
   }
 }
+  else if (command == "GET_PROTO") {
+    Serial.print("PROTO:");
+    Serial.println(PROTOCOL_VERSION);
+  }
+  else if (command.startsWith("SET_BAUD ")) {
+    long rate = command.substring(9).toInt();
+    if (rate == 9600 || rate == 57600 || rate == 115200 || rate == 230400) {
+      Serial.print("BAUD_OK:");
+      Serial.println(rate);
+      Serial.flush();  // let the reply leave at the old rate before switching
+      Serial.end();
+      Serial.begin(rate);
+    } else {
+      Serial.println("BAUD_ERROR:Unsupported");
+    }
+  }
+  else if (command == "READ_BIN") {
+    if (sensorFound) {
+      readSpectralDataBinary();  // float32 frame
+    } else {
+      Serial.println("SENSOR_ERROR");
+    }
+  }
+  else if (command == "STREAM_ON") {
+    if (sensorFound) {
+      sensor.setMeasurementMode(AS7265X_MEASUREMENT_MODE_6CHAN_CONTINUOUS);
+      streaming = true;
+      Serial.println("STREAM_ON_OK");
+    } else {
+      Serial.println("SENSOR_ERROR");
+    }
+  }
+  else if (command == "STREAM_OFF") {
+    streaming = false;
+    if (sensorFound) {
+      sensor.setMeasurementMode(AS7265X_MEASUREMENT_MODE_4CHAN);
+    }
+    Serial.println("STREAM_OFF_OK");
+  }
+  else if (command == "READ_RAW") {
+    if (sensorFound) {
+      readSpectralDataRaw();  // uint16 frame of raw counts
+    } else {
+      Serial.println("SENSOR_ERROR");
+    }
+  }
 
 }
 
@@ -166,3 +228,69 @@ void readSpectralDataCompact() {
   Serial.println(); // newline after last value
 }
 
+uint16_t crc16Update(uint16_t crc, uint8_t data) {
+  // CRC-16/CCITT-FALSE, poly 0x1021
+  crc ^= (uint16_t)data << 8;
+  for (int i = 0; i < 8; i++) {
+    crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+  }
+  return crc;
+}
+
+void sendFrame(uint8_t type, const uint8_t* payload, uint8_t count, uint8_t itemSize) {
+  uint8_t header[4] = { lowByte(frameSeq), highByte(frameSeq), type, count };
+  uint16_t crc = 0xFFFF;
+  for (int i = 0; i < 4; i++) {
+    crc = crc16Update(crc, header[i]);
+  }
+  for (int i = 0; i < count * itemSize; i++) {
+    crc = crc16Update(crc, payload[i]);
+  }
+
+  Serial.write(FRAME_SYNC_1);
+  Serial.write(FRAME_SYNC_2);
+  Serial.write(header, 4);
+  Serial.write(payload, count * itemSize);  // floats/uint16 are already little-endian on the board
+  Serial.write(lowByte(crc));
+  Serial.write(highByte(crc));
+  frameSeq++;
+}
+
+void readSpectralDataBinary() {
+  sensor.takeMeasurements();
+  sendCalibratedFrame();
+}
+
+void sendCalibratedFrame() {
+  float values[18] = {
+    sensor.getCalibratedA(), sensor.getCalibratedB(),
+    sensor.getCalibratedC(), sensor.getCalibratedD(),
+    sensor.getCalibratedE(), sensor.getCalibratedF(),
+    sensor.getCalibratedG(), sensor.getCalibratedH(),
+    sensor.getCalibratedR(), sensor.getCalibratedI(),
+    sensor.getCalibratedS(), sensor.getCalibratedJ(),
+    sensor.getCalibratedT(), sensor.getCalibratedU(),
+    sensor.getCalibratedV(), sensor.getCalibratedW(),
+    sensor.getCalibratedK(), sensor.getCalibratedL()
+  };
+
+  sendFrame(FRAME_FLOAT32, (const uint8_t*)values, 18, sizeof(float));
+}
+
+void readSpectralDataRaw() {
+  sensor.takeMeasurements();
+
+  uint16_t values[18] = {
+    sensor.getA(), sensor.getB(),
+    sensor.getC(), sensor.getD(),
+    sensor.getE(), sensor.getF(),
+    sensor.getG(), sensor.getH(),
+    sensor.getR(), sensor.getI(),
+    sensor.getS(), sensor.getJ(),
+    sensor.getT(), sensor.getU(),
+    sensor.getV(), sensor.getW(),
+    sensor.getK(), sensor.getL()
+  };
+
+  sendFrame(FRAME_UINT16, (const uint8_t*)values, 18, sizeof(uint16_t));
+}
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipelined acquisition scheduler for the colour x position illumination sweep
+
+Instead of sleeping a fixed time after every bulb change, the sensors are
+polled until two consecutive spectra agree within a tolerance. When the
+sensors are streaming, the last few frames since the light changed are
+averaged instead, once both halves of that window agree. Processing and
+saving of a step runs on a background worker while the bulbs move on to
+the next step.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from plant_spectral_scanner.utils.metrics import MetricsRecorder, get_metrics
+
+SETTLE_REL_TOLERANCE = 0.05   # consecutive readings may differ by 5% ...
+SETTLE_ABS_TOLERANCE = 0.5    # ... or by this many counts for near-zero channels
+MIN_SETTLE_TIME = 0.2         # seconds before a reading can count, covers bulb command latency
+SETTLE_TIMEOUT = 1.5          # seconds before giving up and using the latest reading
+STREAM_FRAMES = 4             # frames averaged per step when the sensors are streaming
+
+
+def spectra_settled(previous: dict, current: dict,
+                    rel_tol: float = SETTLE_REL_TOLERANCE,
+                    abs_tol: float = SETTLE_ABS_TOLERANCE) -> bool:
+    """
+    Check whether two sensor -> channel -> value readings agree within tolerance.
+
+    A sensor that returned no data in one of the readings counts as not
+    settled. One with no data in both (a sensor the controller is skipping)
+    is left out, as long as some other sensor has data.
+    """
+    if not previous or previous.keys() != current.keys():
+        return False
+    if not any(current.values()):
+        return False
+    for sensor, channels in current.items():
+        before = previous[sensor]
+        if not channels and not before:
+            continue
+        if not channels or not before:
+            return False
+        for channel, value in channels.items():
+            if channel not in before:
+                return False
+            if abs(value - before[channel]) > abs_tol + rel_tol * abs(before[channel]):
+                return False
+    return True
+
+
+def wait_for_stable_reading(sensor_controller, started: float = None,
+                            min_settle: float = MIN_SETTLE_TIME,
+                            timeout: float = SETTLE_TIMEOUT,
+                            rel_tol: float = SETTLE_REL_TOLERANCE,
+                            abs_tol: float = SETTLE_ABS_TOLERANCE) -> Tuple[dict, bool, float]:
+    """
+    Poll the sensors until the spectrum stops changing.
+
+    Args:
+        sensor_controller: connected SensorController
+        started: time.monotonic() when the light was changed (defaults to now)
+        min_settle: readings taken before this many seconds are discarded
+        timeout: seconds after 'started' to stop polling
+
+    Returns:
+        (latest reading, whether it settled, seconds since 'started')
+    """
+    if started is None:
+        started = time.monotonic()
+
+    remaining = min_settle - (time.monotonic() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+
+    previous = None
+    current = sensor_controller.read_all_sensors()
+    while True:
+        elapsed = time.monotonic() - started
+        if spectra_settled(previous, current, rel_tol, abs_tol):
+            return current, True, elapsed
+        if elapsed >= timeout:
+            return current, False, elapsed
+        previous, current = current, sensor_controller.read_all_sensors()
+
+
+def _window_halves(window):
+    """
+    Mean of the older and newer half of one sensor's frame window, as channel dicts.
+    """
+    half = len(window) // 2
+    older = window[:half].mean(axis=0)
+    newer = window[half:].mean(axis=0)
+    return dict(enumerate(older.tolist())), dict(enumerate(newer.tolist()))
+
+
+def wait_for_stable_stream(sensor_controller, started: float = None,
+                           min_settle: float = MIN_SETTLE_TIME,
+                           timeout: float = SETTLE_TIMEOUT,
+                           frames: int = STREAM_FRAMES,
+                           rel_tol: float = SETTLE_REL_TOLERANCE,
+                           abs_tol: float = SETTLE_ABS_TOLERANCE) -> Tuple[dict, bool, float]:
+    """
+    Average the streamed frames once the spectrum stops changing.
+
+    The newest 'frames' frames that arrived after 'min_settle' form the
+    window. It counts as settled when the mean of its older half agrees
+    with the mean of its newer half, i.e. the light is no longer ramping;
+    the reading is then the outlier-rejected mean of the whole window.
+
+    Args:
+        sensor_controller: SensorController with streaming enabled
+        started: time.monotonic() when the light was changed (defaults to now)
+
+    Returns:
+        (averaged reading, whether it settled, seconds since 'started')
+    """
+    if started is None:
+        started = time.monotonic()
+    settle_from = started + min_settle
+    frames = max(frames, 2)
+    needed = frames  # frames required since settle_from before the next check
+
+    while True:
+        sensor_controller.wait_for_frames(settle_from, needed, max(started + timeout - time.monotonic(), 0))
+        windows = sensor_controller.stream_frames(settle_from, frames)
+        elapsed = time.monotonic() - started
+
+        settled = bool(windows) and all(len(window) == frames for window in windows.values()) and all(
+            spectra_settled({0: older}, {0: newer}, rel_tol, abs_tol)
+            for older, newer in map(_window_halves, windows.values())
+        )
+        if settled or elapsed >= timeout:
+            # Every sensor gets an entry, in configured order; skipped ones come back empty
+            data = {name: sensor_controller.frames_to_reading(windows.get(name, []))
+                    for name in sensor_controller.sensors}
+            return data, settled, elapsed
+        # Still ramping: slide the window on by one frame
+        needed += 1
+
+
+class AcquisitionScheduler:
+    def __init__(self, sensor_controller, bulb_controller,
+                 min_settle: float = MIN_SETTLE_TIME,
+                 settle_timeout: float = SETTLE_TIMEOUT,
+                 rel_tol: float = SETTLE_REL_TOLERANCE,
+                 abs_tol: float = SETTLE_ABS_TOLERANCE,
+                 stream_frames: int = STREAM_FRAMES,
+                 metrics: MetricsRecorder = None):
+        """
+        Runs a list of illumination steps with adaptive settling and
+        overlapped processing.
+
+        If every sensor is streaming (SensorController.start_streaming), each
+        step averages 'stream_frames' frames instead of polling. Light
+        switch, settle, step and processing times go to 'metrics'.
+        """
+        self.sensor_controller = sensor_controller
+        self.bulb_controller = bulb_controller
+        self.min_settle = min_settle
+        self.settle_timeout = settle_timeout
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.stream_frames = stream_frames
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.last_timing = {}
+
+    def run(self, steps: List[Tuple[str, str, str]],
+            process_step: Callable[[str, str, dict], None]) -> Dict:
+        """
+        Measure every (colour, hex_code, position) step.
+
+        process_step(colour, position, data) is called once per step, in
+        order, on a single background worker, so it may keep state between
+        calls (e.g. the CSV filename). It overlaps with the bulb change and
+        settling of the next step.
+
+        Returns:
+            dict: timing summary ('wall_time', 'steps': [...])
+        """
+        scan_started = time.monotonic()
+        step_timings = []
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-process") as worker:
+            pending = []
+            try:
+                for colour, hex_code, position in steps:
+                    step_started = time.monotonic()
+                    self._switch_light(position, hex_code)
+                    switched = time.monotonic()
+                    self.metrics.observe("scan.switch", switched - step_started)
+
+                    if getattr(self.sensor_controller, "streaming", False):
+                        data, settled, settle_time = wait_for_stable_stream(
+                            self.sensor_controller,
+                            started=step_started,
+                            min_settle=self.min_settle,
+                            timeout=self.settle_timeout,
+                            frames=self.stream_frames,
+                            rel_tol=self.rel_tol,
+                            abs_tol=self.abs_tol,
+                        )
+                    else:
+                        data, settled, settle_time = wait_for_stable_reading(
+                            self.sensor_controller,
+                            started=step_started,
+                            min_settle=self.min_settle,
+                            timeout=self.settle_timeout,
+                            rel_tol=self.rel_tol,
+                            abs_tol=self.abs_tol,
+                        )
+                    # Time from the light command being acknowledged to a stable reading
+                    self.metrics.observe("scan.settle", time.monotonic() - switched)
+                    if not settled:
+                        print(f"[WARNING] {colour} / {position} did not settle within {self.settle_timeout:.2f}s, using latest reading.")
+
+                    pending.append(worker.submit(self._process, process_step, colour, position, data))
+                    step_time = time.monotonic() - step_started
+                    self.metrics.observe("scan.step", step_time)
+                    step_timings.append({
+                        "colour": colour,
+                        "position": position,
+                        "settled": settled,
+                        "settle_time": round(settle_time, 4),
+                        "step_time": round(step_time, 4),
+                    })
+            finally:
+                # Also when a step fails or the scan is interrupted, so no bulb is left on
+                self.bulb_controller.turn_off_all_lights()
+            for future in pending:
+                future.result()  # re-raise any processing error
+
+        wall_time = time.monotonic() - scan_started
+        self.last_timing = {"wall_time": round(wall_time, 4), "steps": step_timings}
+        print(f"[TIMING] {len(steps)} steps in {wall_time:.2f}s "
+              f"({wall_time / max(len(steps), 1):.2f}s per step)")
+        return self.last_timing
+
+    def _process(self, process_step, colour, position, data):
+        with self.metrics.timer("scan.process"):
+            process_step(colour, position, data)
+
+    def _switch_light(self, position: str, hex_code: str):
+        # Next bulb on and previous bulb off in one batch; unchanged bulbs get no command
+        self.bulb_controller.transition(position, hex_code)
@@ -1,44 +1,158 @@
 from glob import glob
-import csv
+from datetime import datetime
 import os
+import re
+import threading
 
-def load_latest_baseline() -> dict:
-    """
-    Load the most recent baseline CSV file from data/baseline/
+import numpy as np
 
-    Returns:
-        Dict: (colour, position) -> sensor -> channel -> value
+from plant_spectral_scanner.scripts.scan_frame import ScanFrame
+from plant_spectral_scanner.utils.metrics import MetricsRecorder, get_metrics
+
+DEFAULT_BASELINE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "baseline"
+)
+
+# baseline_20250808_155354.csv or, for a tagged rig, baseline_<rig>_20250808_155354.csv
+BASELINE_NAME = re.compile(r"^baseline_(?:(?P<rig>.+)_)?(?P<stamp>\d{8}_\d{6})\.csv$")
+
+
+class BaselineIndex:
+    def __init__(self, baseline_dir: str = DEFAULT_BASELINE_DIR):
+        """
+        Keeps parsed baselines in memory and picks the right one for a scan.
+
+        Each CSV gets a binary sidecar (<name>.npz) holding the parsed
+        arrays, so a baseline is only ever parsed from CSV once. In-memory
+        and sidecar copies are both invalidated by the CSV's mtime.
+        """
+        self.baseline_dir = baseline_dir
+        self._frames = {}  # path -> (csv mtime, ScanFrame)
+        self._lock = threading.Lock()
+
+    def entries(self):
+        """
+        Returns:
+            list of (datetime, rig or None, path) for every baseline CSV
+        """
+        entries = []
+        for path in glob(os.path.join(self.baseline_dir, "baseline_*.csv")):
+            match = BASELINE_NAME.match(os.path.basename(path))
+            if match:
+                when = datetime.strptime(match.group("stamp"), "%Y%m%d_%H%M%S")
+                rig = match.group("rig")
+            else:
+                when = datetime.fromtimestamp(os.path.getmtime(path))
+                rig = None
+            entries.append((when, rig, path))
+        return entries
+
+    def select_path(self, when: datetime = None, rig: str = None):
+        """
+        Path of the baseline closest in time to 'when' (default: now).
+
+        With 'rig', baselines tagged for that rig are preferred and
+        untagged ones are used only if the rig has none.
+        """
+        entries = self.entries()
+        if rig is not None:
+            tagged = [entry for entry in entries if entry[1] == rig]
+            entries = tagged or [entry for entry in entries if entry[1] is None]
+        if not entries:
+            return None
+        when = when or datetime.now()
+        return min(entries, key=lambda entry: (abs((entry[0] - when).total_seconds()), -entry[0].timestamp()))[2]
+
+    def load(self, path: str) -> ScanFrame:
+        """
+        Parsed baseline for 'path': from memory, else the .npz sidecar, else the CSV.
+        """
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._frames.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        sidecar = os.path.splitext(path)[0] + ".npz"
+        frame = None
+        if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= mtime:
+            try:
+                frame = _load_sidecar(sidecar)
+            except Exception as e:
+                print(f"[WARNING] Ignoring unreadable baseline cache {os.path.basename(sidecar)}: {e}")
+        if frame is None:
+            frame = ScanFrame.from_csv(path)
+            try:
+                _save_sidecar(frame, sidecar)
+            except OSError as e:
+                print(f"[WARNING] Could not write baseline cache {os.path.basename(sidecar)}: {e}")
+
+        with self._lock:
+            self._frames[path] = (mtime, frame)
+        return frame
+
+    def select(self, when: datetime = None, rig: str = None):
+        """
+        Returns:
+            (path, ScanFrame) of the chosen baseline, or (None, None) if there is none
+        """
+        path = self.select_path(when, rig)
+        if path is None:
+            return None, None
+        return path, self.load(path)
+
+
+def _save_sidecar(frame: ScanFrame, sidecar: str):
+    tmp_path = sidecar + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, values=frame.values, colours=np.array(frame.colours), positions=np.array(frame.positions),
+                 sensors=np.array(frame.sensors), channels=np.array(frame.channels))
+    os.replace(tmp_path, sidecar)
+
+
+def _load_sidecar(sidecar: str) -> ScanFrame:
+    with np.load(sidecar, allow_pickle=False) as data:
+        return ScanFrame(data["values"], data["colours"].tolist(), data["positions"].tolist(),
+                         data["sensors"].tolist(), data["channels"].tolist())
+
+
+_indexes = {}
+
+
+def get_baseline_index(baseline_dir: str = DEFAULT_BASELINE_DIR) -> BaselineIndex:
     """
-    baseline_files = sorted(glob("data/baseline/baseline_*.csv"), reverse=True)
-    if not baseline_files:
-        print("[ERROR] No baseline found. Please create a baseline first.")
-        return None
+    Shared index per folder, so every scan in a session reuses the parsed baselines.
+    """
+    key = os.path.abspath(baseline_dir)
+    if key not in _indexes:
+        _indexes[key] = BaselineIndex(key)
+    return _indexes[key]
 
-    latest_file = baseline_files[0]
-    baseline_data = {}
 
-    with open(latest_file, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            colour = row.get("bulb_colour", "").lower()
-            position = row.get("bulb_position", "").lower()
-            sensor = row["sensor_position"]
+def load_latest_baseline(baseline_dir: str = DEFAULT_BASELINE_DIR, rig: str = None,
+                         when: datetime = None) -> ScanFrame:
+    """
+    Load the baseline for a scan from data/baseline/: the one closest in
+    time to 'when' (default now, i.e. the newest), preferring baselines
+    tagged for 'rig'.
 
-            key = (colour, position)
-            if key not in baseline_data:
-                baseline_data[key] = {}
+    Args:
+        baseline_dir: folder holding the baseline_*.csv files
 
-            channels = {
-                k: float(v) for k, v in row.items()
-                if k.startswith("channel_")
-            }
-            baseline_data[key][sensor] = channels
+    Returns:
+        ScanFrame: indexable as frame[(colour, position)] -> sensor -> channel -> value
+    """
+    path, baseline_data = get_baseline_index(baseline_dir).select(when, rig)
+    if baseline_data is None:
+        print("[ERROR] No baseline found. Please create a baseline first.")
+        return None
 
-    print(f"[INFO] Loaded baseline from: {os.path.basename(latest_file)}")
+    print(f"[INFO] Loaded baseline from: {os.path.basename(path)}")
     return baseline_data
 
 
-def subtract_baseline(scan_data: dict, baseline_data: dict, colour: str, position: str) -> dict:
+def subtract_baseline(scan_data: dict, baseline_data: dict, colour: str, position: str,
+                      metrics: MetricsRecorder = None) -> dict:
     """
     Subtract baseline from scan data for a specific colour and position.
 
@@ -47,10 +161,18 @@ def subtract_baseline(scan_data: dict, baseline_data: dict, colour: str, positio
         baseline_data: (colour, position) -> sensor -> channel -> value
         colour: the colour of the light used in the scan
         position: the position of the light (e.g. close, middle, far)
+        metrics: recorder for the time taken (defaults to the process-wide one)
 
     Returns:
         Dict: sensor -> adjusted channel values
     """
+    with (metrics if metrics is not None else get_metrics()).timer("baseline.subtract"):
+        if isinstance(baseline_data, ScanFrame):
+            return _subtract_frame_baseline(scan_data, baseline_data, colour, position)
+        return _subtract_dict_baseline(scan_data, baseline_data, colour, position)
+
+
+def _subtract_dict_baseline(scan_data: dict, baseline_data: dict, colour: str, position: str) -> dict:
     adjusted_data = {}
     key = (colour.lower(), position.lower())
 
@@ -69,3 +191,27 @@ def subtract_baseline(scan_data: dict, baseline_data: dict, colour: str, positio
             adjusted_data[sensor][channel] = adjusted_value
 
     return adjusted_data
+
+
+def _subtract_frame_baseline(scan_data: dict, baseline: ScanFrame, colour: str, position: str) -> dict:
+    """
+    Vectorized subtract_baseline against a ScanFrame baseline: one array
+    subtraction and clamp for all sensors of the step.
+    """
+    if (colour, position) not in baseline:
+        print(f"[WARNING] No baseline found for ({colour}, {position}). Using zeros.")
+        base = np.zeros((len(baseline.sensors), len(baseline.channels)), dtype=np.float32)
+    else:
+        base = np.nan_to_num(baseline.step(colour, position), nan=0.0)
+
+    adjusted = np.maximum(baseline.step_array(scan_data) - base, 0)
+
+    adjusted_data = {}
+    for sensor, channels in scan_data.items():
+        if sensor in baseline.sensors and len(channels) == len(baseline.channels):
+            values = adjusted[baseline.sensors.index(sensor)].tolist()
+            adjusted_data[sensor] = dict(zip(channels.keys(), values))
+        else:
+            # Unknown sensor or partial reading: nothing to subtract it against
+            adjusted_data[sensor] = {channel: max(value, 0) for channel, value in channels.items()}
+    return adjusted_data
@@ -2,10 +2,65 @@ import os
 import csv
 from datetime import datetime
 
+from plant_spectral_scanner.utils.metrics import MetricsRecorder, get_metrics
+from plant_spectral_scanner.scripts.scan_index import index_rows
+
+wavelengths = [410, 435, 460, 485, 510, 535, 560, 585, 610, 645, 680, 705, 730, 760, 810, 890, 900, 940]
+
+VALUE_FORMAT = "{:.4f}"  # the firmware reports 4 decimals, so anything beyond that is float noise
+
+
+def _data_dir(mode: str, extra_subfolder: str = None, data_root: str = None) -> str:
+    if data_root is None:
+        # Get the base directory: parent of plant_spectral_scanner/
+        base_project_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        data_root = os.path.join(base_project_dir, "data")
+
+    folder_name = "scans" if mode == "scan" else "baseline"
+    if extra_subfolder:
+        folder_name = extra_subfolder
+    return os.path.join(data_root, folder_name)
+
+
+def _new_filename(mode: str, description: str = "", adjusted: bool = False, rig: str = None) -> str:
+    timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+    rig_tag = f"{rig}_" if rig else ""
+    return f"{description + '_' if adjusted else ''}{mode}_{rig_tag}{timestamp_str}.csv"
+
+
+def _header(mode: str) -> list:
+    header = ["timestamp"]
+    if mode == "scan":
+        header.append("description")
+    header.extend(["bulb_colour", "bulb_position", "sensor_position"])
+    header.extend([f"channel_{i+1}_{wl}" for i, wl in enumerate(wavelengths)])
+    return header
+
+
+def _records(data: dict, colour: str, position: str, timestamp: str) -> list:
+    # (timestamp, colour, position, sensor, channel values) per row, as the store and the index take them
+    return [(timestamp, colour, position, sensor, list(channels.values())) for sensor, channels in data.items()]
+
+
+def _rows(data: dict, mode: str, description: str, colour: str, position: str, timestamp: str) -> list:
+    rows = []
+    for sensor, channels in data.items():
+        row = [timestamp]
+        if mode == "scan":
+            row.append(description)
+        row.extend([colour, position, sensor])
+        values = list(channels.values())
+        if len(values) != len(wavelengths):
+            # A sensor that was skipped or answered short: mark every channel missing rather than shift columns
+            values = [float("nan")] * len(wavelengths)
+        row.extend(VALUE_FORMAT.format(value) for value in values)
+        rows.append(row)
+    return rows
 
 
 def save_to_csv(data: dict, mode: str, description: str = "", adjusted: bool = False,
-                colour: str = "", position: str = "", filename: str = "", extra_subfolder: str = None) -> str:
+                colour: str = "", position: str = "", filename: str = "", extra_subfolder: str = None,
+                data_root: str = None) -> str:
     """
     Save sensor data to a CSV file. If filename is provided, appends to existing file.
 
@@ -17,50 +72,106 @@ def save_to_csv(data: dict, mode: str, description: str = "", adjusted: bool = F
         colour: Light colour used (e.g. red, green, blue, white)
         position: Light source position (e.g. close, middle, far)
         filename: Optional filename to write to (for grouping multiple scan entries)
+        data_root: Folder holding baseline/ and scans/ (defaults to the project's data/ folder)
+
+    The rows are also added to the data folder's SQLite index (see scan_index.py).
 
     Returns:
         The full filepath where the data was saved
     """
+    metrics = get_metrics()
+    with metrics.timer("csv.save"):
+        data_dir = _data_dir(mode, extra_subfolder, data_root)
+        os.makedirs(data_dir, exist_ok=True)
 
-    wavelengths = [410, 435, 460, 485, 510, 535, 560, 585, 610, 645, 680, 705, 730, 760, 810, 890, 900, 940]
+        # Generate filename only once per full scan session
+        if not filename:
+            filename = _new_filename(mode, description, adjusted)
 
-    # Get the base directory: parent of plant_spectral_scanner/
-    base_project_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        filepath = os.path.join(data_dir, filename)
+        file_exists = os.path.exists(filepath)
 
-    folder_name = "scans" if mode == "scan" else "baseline"
-    if extra_subfolder:
-        folder_name = extra_subfolder
-    data_dir = os.path.join(base_project_dir, "data", folder_name)
-    os.makedirs(data_dir, exist_ok=True)
-
-    # Generate filename only once per full scan session
-    if not filename:
-        timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{description + '_' if adjusted else ''}{mode}_{timestamp_str}.csv"
-
-    filepath = os.path.join(data_dir, filename)
-    file_exists = os.path.exists(filepath)
-
-    with open(filepath, mode='a', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-
-        # Write header only once
-        if not file_exists:
-            header = ["timestamp"]
-            if mode == "scan":
-                header.append("description")
-            header.extend(["bulb_colour", "bulb_position", "sensor_position"])
-            header.extend([f"channel_{i+1}_{wl}" for i, wl in enumerate(wavelengths)])
-            writer.writerow(header)
-
-        timestamp_now = datetime.now()
-        # Write each sensor's row
-        for sensor, channels in data.items():
-            row = [timestamp_now.strftime('%Y-%m-%d %H:%M:%S')]
-            if mode == "scan":
-                row.append(description)
-            row.extend([colour, position, sensor])
-            row.extend(channels.values())
-            writer.writerow(row)
-
-    return filename
\ No newline at end of file
+        with open(filepath, mode='a', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+
+            # Write header only once
+            if not file_exists:
+                writer.writerow(_header(mode))
+
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            writer.writerows(_rows(data, mode, description, colour, position, timestamp))
+
+    with metrics.timer("index.add"):
+        index_rows(data_root, filepath, description, _records(data, colour, position, timestamp), not file_exists)
+
+    return filename
+
+
+class ScanWriter:
+    def __init__(self, mode: str, description: str = "", adjusted: bool = False,
+                 extra_subfolder: str = None, data_root: str = None, store=None, rig: str = None,
+                 metrics: MetricsRecorder = None):
+        """
+        Buffers a whole scan (or baseline) session and writes it in one go.
+
+        Produces the same CSV layout and filename as repeated save_to_csv
+        calls, but opens the file once. If a ScanStore is given the rows
+        are appended to it on flush as well, and they always go to the
+        data folder's SQLite index (see scan_index.py). A 'rig' name is added to the
+        filename (e.g. baseline_<rig>_<timestamp>.csv) so the baseline
+        index can match baselines to the rig that recorded them. Flush
+        times go to 'metrics' (defaults to the process-wide recorder).
+        """
+        self.mode = mode
+        self.description = description
+        self.adjusted = adjusted
+        self.data_dir = _data_dir(mode, extra_subfolder, data_root)
+        self.data_root = data_root
+        self.store = store
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.filename = _new_filename(mode, description, adjusted, rig)
+        self._rows = []
+        self._records = []  # (timestamp, colour, position, sensor, channel values) for the store and index
+
+    def add(self, data: dict, colour: str = "", position: str = ""):
+        """
+        Buffer one illumination step: sensor -> channel -> value
+        """
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._rows.extend(_rows(data, self.mode, self.description, colour, position, timestamp))
+        self._records.extend(_records(data, colour, position, timestamp))
+
+    def flush(self) -> str:
+        """
+        Write everything buffered so far. Returns the filename, or None if nothing was added.
+        """
+        if not self._rows:
+            return None
+
+        metrics = self.metrics
+        with metrics.timer("csv.flush"):
+            os.makedirs(self.data_dir, exist_ok=True)
+            filepath = os.path.join(self.data_dir, self.filename)
+            file_exists = os.path.exists(filepath)
+            with open(filepath, mode='a', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                if not file_exists:
+                    writer.writerow(_header(self.mode))
+                writer.writerows(self._rows)
+
+        if self.store is not None and self._records:
+            with metrics.timer("store.append"):
+                self.store.append(self.filename, os.path.basename(self.data_dir), self.description, self._records)
+
+        with metrics.timer("index.add"):
+            index_rows(self.data_root, filepath, self.description, self._records, not file_exists)
+
+        self._rows = []
+        self._records = []
+        return self.filename
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Illumination plans: which colour x position steps a scan measures
+
+The full sweep is every colour at every bulb position (12 steps). A
+reduced plan, exported by data_processing/classifier.py --plan, keeps
+only the steps that carry signal for one scan type, e.g.
+
+    version: 1
+    scan_type: basil
+    steps:
+    - {colour: White, position: close_bulb}
+    - {colour: Red, position: close_bulb}
+    model: basil_plan_model.npz     # trained on the rows of these steps only
+    accuracy: 0.9                   # leave-one-scan-out, plan vs. full sweep
+    full_accuracy: 0.9
+
+A relative 'model' path is taken relative to the plan file.
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+import yaml
+
+PLAN_VERSION = 1
+
+COLOURS = {
+    "Red": "#FF0000",
+    "Green": "#00FF00",
+    "Blue": "#0000FF",
+    "White": "#FFFFFF"
+}
+BULB_POSITIONS = ["close_bulb", "middle_bulb", "far_bulb"]
+
+
+def full_sweep() -> List[Tuple[str, str, str]]:
+    """
+    Every (colour, hex_code, position) step, colour by colour.
+    """
+    return [(colour, hex_code, position)
+            for colour, hex_code in COLOURS.items()
+            for position in BULB_POSITIONS]
+
+
+def load_plan(path: str) -> Dict:
+    """
+    Read a plan file.
+
+    Returns:
+        dict with 'steps' as (colour, hex_code, position) tuples in run order,
+        'model' as an absolute path or None, and the file's other fields
+
+    Raises:
+        ValueError: for an unknown version, colour or position, or an empty plan
+    """
+    with open(path, "r") as f:
+        plan = yaml.safe_load(f) or {}
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"{path}: unsupported plan version {plan.get('version')}")
+
+    colours = {colour.lower(): colour for colour in COLOURS}
+    steps = []
+    for step in plan.get("steps") or []:
+        colour = colours.get(str(step.get("colour", "")).lower())
+        position = step.get("position")
+        if colour is None or position not in BULB_POSITIONS:
+            raise ValueError(f"{path}: unknown step {step}")
+        steps.append((colour, step.get("hex") or COLOURS[colour], position))
+    if not steps:
+        raise ValueError(f"{path}: plan has no steps")
+
+    plan["steps"] = steps
+    model = plan.get("model")
+    if model and not os.path.isabs(model):
+        model = os.path.join(os.path.dirname(os.path.abspath(path)), model)
+    plan["model"] = model
+    return plan
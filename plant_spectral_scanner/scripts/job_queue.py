@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unattended job queue: run a manifest of plants through one ScanSession
+
+The manifest lists jobs in the order they run, as a CSV
+    type,description,classify
+    baseline,,
+    basil,basil_healthy_plant1,yes
+    leaf,figleaf_dry_angle1,no
+or as a YAML list of mappings with the same keys. 'type' is 'basil',
+'leaf' or 'baseline'; 'classify' defaults to yes for scans. Connections
+stay open for the whole queue and every scan reuses the session's
+baseline. A failed job is recorded and the queue moves on. Each result
+is appended to the results CSV as soon as its job finishes.
+
+Usage (from the project root):
+    python -m plant_spectral_scanner.scripts.job_queue jobs.csv --results results.csv
+"""
+
+import os
+import csv
+import time
+import argparse
+from typing import Dict, List
+
+import yaml
+
+from plant_spectral_scanner.scripts.scan_session import SCAN_TYPES, START_DELAY, ScanSession
+
+JOB_TYPES = SCAN_TYPES + ("baseline",)
+RESULT_COLUMNS = ["job", "type", "description", "status", "filename", "health",
+                  "settled_steps", "wall_time", "error"]
+TRUE_VALUES = {"1", "y", "yes", "true"}
+FALSE_VALUES = {"0", "n", "no", "false"}
+
+
+def _flag(value, default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"Expected yes/no, got '{value}'")
+
+
+def load_manifest(path: str) -> List[Dict]:
+    """
+    Read and check a job manifest (.csv, or .yaml / .yml).
+
+    Returns:
+        list of {'type', 'description', 'classify'} in run order
+
+    Raises:
+        ValueError: naming the first bad job, before anything is measured
+    """
+    if path.endswith((".yaml", ".yml")):
+        with open(path, "r") as f:
+            entries = yaml.safe_load(f) or []
+        if isinstance(entries, dict):
+            entries = entries.get("jobs", [])
+    else:
+        with open(path, "r", newline="") as f:
+            entries = list(csv.DictReader(f))
+
+    jobs = []
+    for number, entry in enumerate(entries, start=1):
+        job_type = str(entry.get("type") or "").strip().lower()
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Job {number}: unknown type '{job_type}', expected one of {', '.join(JOB_TYPES)}")
+        try:
+            classify = _flag(entry.get("classify"), default=job_type != "baseline")
+        except ValueError as e:
+            raise ValueError(f"Job {number}: classify: {e}")
+        jobs.append({
+            "type": job_type,
+            "description": str(entry.get("description") or "").strip(),
+            "classify": classify and job_type != "baseline",
+        })
+    return jobs
+
+
+def run_jobs(session: ScanSession, jobs: List[Dict], results_path: str = None,
+             pause: float = 0.0, name: str = None) -> List[Dict]:
+    """
+    Run every job on an open session, in order.
+
+    Args:
+        results_path: CSV that each result row is appended to as it finishes
+        pause: seconds to wait between jobs (e.g. for a turntable or conveyor)
+        name: rig name added to the log lines, when several queues run at once
+
+    Returns:
+        list of result rows (see RESULT_COLUMNS)
+    """
+    tag = f"{name} " if name else ""
+    results = []
+    for number, job in enumerate(jobs, start=1):
+        if number > 1 and pause > 0:
+            time.sleep(pause)
+        print(f"[JOB {tag}{number}/{len(jobs)}] {job['type']} {job['description']}".rstrip())
+
+        row = {"job": number, "type": job["type"], "description": job["description"]}
+        started = time.monotonic()
+        try:
+            if job["type"] == "baseline":
+                result = session.baseline()
+            else:
+                result = session.scan(job["type"], job["description"], classify=job["classify"])
+            row["filename"] = result["filename"]
+            row["health"] = result.get("health", "")
+            row["settled_steps"] = sum(step["settled"] for step in result["timing"]["steps"])
+            row["status"] = "ok" if result["filename"] else "empty"
+            if row["health"]:
+                print(f"[RESULT] {job['description'] or job['type']}: {row['health']}")
+        except Exception as e:
+            print(f"[ERROR] Job {tag}{number} failed: {e}")
+            row["status"] = "failed"
+            row["error"] = str(e)
+        row["wall_time"] = round(time.monotonic() - started, 3)
+
+        results.append(row)
+        if results_path:
+            _append_result(results_path, row)
+
+    failed = sum(row["status"] != "ok" for row in results)
+    print(f"[COMPLETE] {tag}{len(results) - failed} of {len(results)} job(s) succeeded")
+    return results
+
+
+def _append_result(path: str, row: Dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    file_exists = os.path.exists(path)
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, restval="")
+        if not file_exists:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a manifest of baselines and scans unattended")
+    parser.add_argument("manifest", help="CSV or YAML list of jobs (type, description, classify)")
+    parser.add_argument("--results", help="CSV to append one result row per job to")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to wait between jobs")
+    parser.add_argument("--start-delay", type=float, default=START_DELAY,
+                        help="seconds to wait before each job starts measuring")
+    parser.add_argument("--sensor-config", help="sensor port YAML (default: plant_spectral_scanner/config/sensor_ports.yaml)")
+    parser.add_argument("--bulb-config", help="bulb YAML (default: plant_spectral_scanner/config/bulbs.yaml)")
+    parser.add_argument("--data-root", help="folder holding baseline/, scans/ and store/ (default: data/)")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream frames from binary-protocol sensors instead of polling")
+    parser.add_argument("--plan", action="append", default=[], metavar="TYPE=PATH",
+                        help="illumination plan for a scan type, e.g. basil=data_processing/basil_plan.yaml")
+    parser.add_argument("--live", metavar="ADDRESS",
+                        help="publish every reading on this Unix socket path or host:port (see utils/live_feed.py)")
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    plans = dict(plan.split("=", 1) for plan in args.plan)
+    session = ScanSession(sensor_config=args.sensor_config, bulb_config=args.bulb_config,
+                          data_root=args.data_root, stream=args.stream,
+                          start_delay=args.start_delay, plans=plans, live=args.live)
+    with session:
+        run_jobs(session, jobs, args.results, args.pause)
+    session.metrics.print_summary()
+    metrics_path = session.metrics.dump()
+    if metrics_path:
+        print(f"[METRICS] Written to '{metrics_path}' (+ .prom)")
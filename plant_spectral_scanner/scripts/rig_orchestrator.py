@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run several scanning rigs from one process
+
+Each rig has its own sensor and bulb YAML, its own job manifest and its
+own data folder (data/rigs/<name>/ unless set), described in one file:
+
+    rigs:
+      - name: bench_a
+        sensor_config: plant_spectral_scanner/config/bench_a/sensor_ports.yaml
+        bulb_config: plant_spectral_scanner/config/bench_a/bulbs.yaml
+        manifest: jobs/bench_a.csv
+        plans: {basil: data_processing/basil_plan.yaml}   # optional
+        live: /tmp/bench_a.sock                           # optional, see utils/live_feed.py
+      - name: bench_b
+        ...
+
+Every rig gets a ScanSession and runs its job queue on a worker thread
+of its own. The acquisition loops spend their time waiting on serial
+ports and UDP replies, so rigs overlap instead of queueing behind each
+other. Metrics are recorded per rig (labelled rig=<name>) and written
+both per rig and combined at the end.
+
+Usage (from the project root):
+    python -m plant_spectral_scanner.scripts.rig_orchestrator rigs.yaml
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import yaml
+
+from plant_spectral_scanner.utils.metrics import DEFAULT_METRICS_DIR, MetricsRecorder
+from plant_spectral_scanner.scripts.scan_session import START_DELAY, ScanSession
+from plant_spectral_scanner.scripts.job_queue import load_manifest, run_jobs
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_RIGS_ROOT = os.path.join(BASE_PROJECT_DIR, "data", "rigs")
+RESULTS_FILENAME = "job_results.csv"  # written inside each rig's data folder
+
+
+def load_rigs(path: str, rigs_root: str = DEFAULT_RIGS_ROOT) -> List[Dict]:
+    """
+    Read and check the rig list.
+
+    Returns:
+        list of {'name', 'sensor_config', 'bulb_config', 'data_root', 'manifest', 'plans', 'live'}
+
+    Raises:
+        ValueError: if a rig is missing a field or two rigs share a name, config or data folder
+    """
+    with open(path, "r") as f:
+        config = yaml.safe_load(f) or {}
+
+    rigs = []
+    for number, entry in enumerate(config.get("rigs", []), start=1):
+        name = str(entry.get("name") or "").strip()
+        if not name:
+            raise ValueError(f"Rig {number} has no name")
+        for key in ("sensor_config", "bulb_config"):
+            if not entry.get(key):
+                raise ValueError(f"Rig '{name}' has no {key}")
+        rigs.append({
+            "name": name,
+            "sensor_config": entry["sensor_config"],
+            "bulb_config": entry["bulb_config"],
+            "data_root": os.path.abspath(entry.get("data_root") or os.path.join(rigs_root, name)),
+            "manifest": entry.get("manifest"),
+            "plans": entry.get("plans") or {},
+            "live": entry.get("live"),
+        })
+
+    for key in ("name", "sensor_config", "bulb_config", "data_root", "live"):
+        values = [rig[key] for rig in rigs]
+        duplicates = sorted({value for value in values if value and values.count(value) > 1})
+        if duplicates:
+            raise ValueError(f"Rigs share {key}: {', '.join(duplicates)}")
+    return rigs
+
+
+class RigOrchestrator:
+    def __init__(self, rigs: List[Dict], stream: bool = False, start_delay: float = START_DELAY,
+                 **session_kwargs):
+        """
+        One ScanSession per rig (see load_rigs), each with its own
+        MetricsRecorder. Sensors are opened from the configured ports
+        only: rigs on one host share the serial ports, so probing them
+        all would hand one rig's sensors to another.
+        """
+        self.rigs = {rig["name"]: rig for rig in rigs}
+        self.sessions: Dict[str, ScanSession] = {
+            name: ScanSession(
+                sensor_config=rig["sensor_config"],
+                bulb_config=rig["bulb_config"],
+                data_root=rig["data_root"],
+                rig=name,
+                plans=rig.get("plans"),
+                live=rig.get("live"),
+                discover=False,
+                stream=stream,
+                start_delay=start_delay,
+                metrics=MetricsRecorder(labels={"rig": name}),
+                **session_kwargs
+            )
+            for name, rig in self.rigs.items()
+        }
+        self._pool = ThreadPoolExecutor(max_workers=max(len(self.rigs), 1), thread_name_prefix="rig")
+
+    def open(self) -> "RigOrchestrator":
+        """
+        Connect every rig in parallel. A rig that fails to connect is dropped with an error.
+        """
+        futures = {name: self._pool.submit(session.open) for name, session in self.sessions.items()}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[ERROR] Rig {name} could not connect: {e}")
+                self.sessions.pop(name).close()
+        return self
+
+    def close(self):
+        for name, session in self.sessions.items():
+            try:
+                session.close()
+            except Exception as e:
+                print(f"[ERROR] Rig {name} did not close cleanly: {e}")
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, jobs: Dict[str, List[Dict]], pause: float = 0.0) -> Dict[str, List[Dict]]:
+        """
+        Run each rig's job list on its own worker, all rigs at once.
+
+        Args:
+            jobs: rig name -> jobs (see job_queue.load_manifest); rigs not listed stay idle
+
+        Returns:
+            rig name -> result rows, also appended to <data_root>/job_results.csv
+        """
+        for name in jobs:
+            if name not in self.sessions:
+                print(f"[WARNING] Rig {name} is not connected, skipping its jobs.")
+
+        started = time.monotonic()
+        futures = {
+            name: self._pool.submit(run_jobs, self.sessions[name], rig_jobs,
+                                    os.path.join(self.rigs[name]["data_root"], RESULTS_FILENAME),
+                                    pause, name)
+            for name, rig_jobs in jobs.items() if name in self.sessions and rig_jobs
+        }
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Rig {name} stopped: {e}")
+                results[name] = []
+
+        wall_time = time.monotonic() - started
+        done = sum(row["status"] == "ok" for rows in results.values() for row in rows)
+        print(f"[TIMING] {done} job(s) on {len(futures)} rig(s) in {wall_time:.2f}s "
+              f"({done * 3600 / max(wall_time, 1e-9):.0f} jobs per hour)")
+        return results
+
+    def metrics(self) -> MetricsRecorder:
+        """
+        Every rig's stage histograms merged into one recorder.
+        """
+        return MetricsRecorder.combine([session.metrics for session in self.sessions.values()])
+
+    def dump_metrics(self, folder: str = DEFAULT_METRICS_DIR) -> str:
+        """
+        Write metrics_<rig>_<timestamp> files per rig and metrics_all_<timestamp> for the station.
+        """
+        for name, session in self.sessions.items():
+            session.metrics.dump(folder, prefix=f"metrics_{name}")
+        return self.metrics().dump(folder, prefix="metrics_all")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the job manifests of several rigs concurrently")
+    parser.add_argument("rigs", help="YAML file listing the rigs (name, sensor_config, bulb_config, manifest)")
+    parser.add_argument("--rigs-root", default=DEFAULT_RIGS_ROOT,
+                        help="parent of each rig's data folder when the rig does not set data_root")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to wait between jobs on each rig")
+    parser.add_argument("--start-delay", type=float, default=START_DELAY,
+                        help="seconds to wait before each job starts measuring")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream frames from binary-protocol sensors instead of polling")
+    args = parser.parse_args()
+
+    rigs = load_rigs(args.rigs, args.rigs_root)
+    # Check every manifest before connecting anything
+    jobs = {rig["name"]: load_manifest(rig["manifest"]) for rig in rigs if rig["manifest"]}
+
+    orchestrator = RigOrchestrator(rigs, stream=args.stream, start_delay=args.start_delay)
+    with orchestrator:
+        orchestrator.run(jobs, args.pause)
+    combined = orchestrator.metrics()
+    combined.print_summary()
+    metrics_path = orchestrator.dump_metrics()
+    if metrics_path:
+        print(f"[METRICS] Written to '{metrics_path}' (+ per-rig files)")
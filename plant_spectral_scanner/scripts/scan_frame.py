@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Array-backed representation of one full scan or baseline
+
+A ScanFrame holds every reading of a colour x position sweep as a single
+float32 array of shape (colour, position, sensor, channel), with label
+axes for each dimension. Cells that were not measured are NaN.
+"""
+
+import csv
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+WAVELENGTHS = [410, 435, 460, 485, 510, 535, 560, 585, 610, 645, 680, 705, 730, 760, 810, 890, 900, 940]
+CHANNELS = [f"channel_{i+1}_{wl}" for i, wl in enumerate(WAVELENGTHS)]
+
+COLOURS = ["Red", "Green", "Blue", "White"]
+POSITIONS = ["close_bulb", "middle_bulb", "far_bulb"]
+SENSORS = ["close_sensor", "middle_sensor", "far_sensor"]
+
+
+def _extend_labels(defaults: Sequence[str], seen: Iterable[str], case_sensitive: bool = True) -> List[str]:
+    labels = list(defaults)
+    known = {label if case_sensitive else label.lower() for label in labels}
+    for label in seen:
+        key = label if case_sensitive else label.lower()
+        if key not in known:
+            labels.append(label)
+            known.add(key)
+    return labels
+
+
+class ScanFrame:
+    def __init__(self, values: np.ndarray = None, colours: Sequence[str] = COLOURS,
+                 positions: Sequence[str] = POSITIONS, sensors: Sequence[str] = SENSORS,
+                 channels: Sequence[str] = CHANNELS):
+        """
+        Args:
+            values: float32 array of shape (colours, positions, sensors, channels);
+                    all NaN (nothing measured yet) if omitted
+        """
+        self.colours = list(colours)
+        self.positions = list(positions)
+        self.sensors = list(sensors)
+        self.channels = list(channels)
+        shape = (len(self.colours), len(self.positions), len(self.sensors), len(self.channels))
+        if values is None:
+            values = np.full(shape, np.nan, dtype=np.float32)
+        self.values = np.asarray(values, dtype=np.float32)
+        if self.values.shape != shape:
+            raise ValueError(f"values has shape {self.values.shape}, expected {shape}")
+
+        # Colour/position lookups are case-insensitive, as the CSVs mix 'Red' and 'red'
+        self._colour_index = {c.lower(): i for i, c in enumerate(self.colours)}
+        self._position_index = {p.lower(): i for i, p in enumerate(self.positions)}
+        self._sensor_index = {s: i for i, s in enumerate(self.sensors)}
+
+    def _key(self, colour: str, position: str):
+        return self._colour_index[colour.lower()], self._position_index[position.lower()]
+
+    def __contains__(self, key) -> bool:
+        """
+        (colour, position) in frame: True if that step has any measured value.
+        """
+        colour, position = key
+        try:
+            c, p = self._key(colour, position)
+        except KeyError:
+            return False
+        return bool(np.isfinite(self.values[c, p]).any())
+
+    def __getitem__(self, key) -> Dict[str, Dict[str, float]]:
+        """
+        frame[(colour, position)] -> sensor -> channel -> value, like the old baseline dicts.
+        """
+        return self.step_dict(*key)
+
+    def step(self, colour: str, position: str) -> np.ndarray:
+        """
+        View of one step's readings, shape (sensors, channels).
+        """
+        c, p = self._key(colour, position)
+        return self.values[c, p]
+
+    def step_dict(self, colour: str, position: str) -> Dict[str, Dict[str, float]]:
+        step = self.step(colour, position)
+        return {
+            sensor: dict(zip(self.channels, step[i].tolist()))
+            for i, sensor in enumerate(self.sensors)
+            if np.isfinite(step[i]).any()
+        }
+
+    def set_step(self, colour: str, position: str, data):
+        """
+        Store one step, given as sensor -> channel -> value or as a (sensors, channels) array.
+        Sensors that returned no data stay NaN.
+        """
+        c, p = self._key(colour, position)
+        if isinstance(data, np.ndarray):
+            self.values[c, p] = data
+            return
+        self.values[c, p] = np.nan
+        for sensor, channels in data.items():
+            if sensor not in self._sensor_index or not channels:
+                continue
+            self.values[c, p, self._sensor_index[sensor], :len(channels)] = list(channels.values())[:len(self.channels)]
+
+    def step_array(self, data: Dict[str, Dict[str, float]]) -> np.ndarray:
+        """
+        Convert one sensor -> channel -> value reading into a (sensors, channels) array.
+        """
+        array = np.full((len(self.sensors), len(self.channels)), np.nan, dtype=np.float32)
+        for sensor, channels in data.items():
+            if sensor in self._sensor_index and channels:
+                array[self._sensor_index[sensor], :len(channels)] = list(channels.values())[:len(self.channels)]
+        return array
+
+    def subtract(self, baseline: "ScanFrame") -> "ScanFrame":
+        """
+        Baseline-subtract the whole frame and clamp at zero in one operation.
+        Steps missing from the baseline are treated as zero, like subtract_baseline.
+        """
+        base = np.nan_to_num(baseline.aligned_to(self).values, nan=0.0)
+        return ScanFrame(np.maximum(self.values - base, 0), self.colours, self.positions, self.sensors, self.channels)
+
+    def aligned_to(self, other: "ScanFrame") -> "ScanFrame":
+        """
+        This frame re-indexed onto other's labels (missing labels become NaN).
+        """
+        if (self.colours, self.positions, self.sensors, self.channels) == \
+                (other.colours, other.positions, other.sensors, other.channels):
+            return self
+        out = ScanFrame(None, other.colours, other.positions, other.sensors, other.channels)
+        pairs = [
+            [(j, self._colour_index.get(c.lower())) for j, c in enumerate(other.colours)],
+            [(j, self._position_index.get(p.lower())) for j, p in enumerate(other.positions)],
+            [(j, self._sensor_index.get(s)) for j, s in enumerate(other.sensors)],
+            [(j, self.channels.index(ch) if ch in self.channels else None) for j, ch in enumerate(other.channels)],
+        ]
+        pairs = [[(j, i) for j, i in axis if i is not None] for axis in pairs]
+        if all(pairs):
+            target = np.ix_(*[[j for j, _ in axis] for axis in pairs])
+            source = np.ix_(*[[i for _, i in axis] for axis in pairs])
+            out.values[target] = self.values[source]
+        return out
+
+    def channel_rows(self) -> np.ndarray:
+        """
+        All measured rows as an (n, channels) array, in CSV row order.
+        """
+        rows = self.values.reshape(-1, len(self.channels))
+        return rows[np.isfinite(rows).all(axis=1)]
+
+    # === Conversion to and from the CSV / DataFrame layouts ===
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], colours: Sequence[str] = COLOURS,
+                  positions: Sequence[str] = POSITIONS, sensors: Sequence[str] = SENSORS) -> "ScanFrame":
+        """
+        Build a frame from CSV-style rows (bulb_colour, bulb_position, sensor_position, channel_*).
+        """
+        frame = cls(None, colours, positions, sensors)
+        keys = []
+        values = []
+        for row in rows:
+            keys.append((row["bulb_colour"], row["bulb_position"], row["sensor_position"]))
+            values.append([row.get(ch) if row.get(ch) not in (None, "") else "nan" for ch in frame.channels])
+        frame._fill(keys, values)
+        return frame
+
+    @classmethod
+    def from_csv(cls, path: str, **labels) -> "ScanFrame":
+        """
+        Parse a scan/baseline CSV. Colours, positions or sensors not in the
+        default labels are appended to them rather than dropped.
+        """
+        with open(path, "r", newline="") as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader)
+            colour_col = header.index("bulb_colour")
+            position_col = header.index("bulb_position")
+            sensor_col = header.index("sensor_position")
+            channel_cols = [header.index(ch) for ch in CHANNELS]
+            keys = []
+            values = []
+            for row in reader:
+                if not row:
+                    continue
+                keys.append((row[colour_col], row[position_col], row[sensor_col]))
+                values.append([row[i] if i < len(row) and row[i] != "" else "nan" for i in channel_cols])
+        labels.setdefault("colours", _extend_labels(COLOURS, (k[0] for k in keys), case_sensitive=False))
+        labels.setdefault("positions", _extend_labels(POSITIONS, (k[1] for k in keys), case_sensitive=False))
+        labels.setdefault("sensors", _extend_labels(SENSORS, (k[2] for k in keys)))
+        frame = cls(None, **labels)
+        frame._fill(keys, values)
+        return frame
+
+    @classmethod
+    def from_dataframe(cls, df, **labels) -> "ScanFrame":
+        frame = cls(None, **labels)
+        keys = list(zip(df["bulb_colour"], df["bulb_position"], df["sensor_position"]))
+        frame._fill(keys, df[frame.channels].to_numpy(dtype=np.float32))
+        return frame
+
+    def _fill(self, keys: List[tuple], values):
+        # One vectorized string -> float32 conversion for all rows, then a scatter into place
+        values = np.asarray(values).astype(np.float32) if len(keys) else np.empty((0, len(self.channels)), np.float32)
+        index = []
+        keep = []
+        for i, (colour, position, sensor) in enumerate(keys):
+            c = self._colour_index.get(colour.lower())
+            p = self._position_index.get(position.lower())
+            s = self._sensor_index.get(sensor)
+            if None not in (c, p, s):
+                index.append((c, p, s))
+                keep.append(i)
+        if index:
+            c, p, s = np.array(index).T
+            self.values[c, p, s] = values[keep]
+
+    def to_rows(self) -> List[dict]:
+        """
+        Measured cells as CSV-style dicts, ordered colour -> position -> sensor like main.py writes them.
+        """
+        rows = []
+        for c, colour in enumerate(self.colours):
+            for p, position in enumerate(self.positions):
+                for s, sensor in enumerate(self.sensors):
+                    cell = self.values[c, p, s]
+                    if not np.isfinite(cell).any():
+                        continue
+                    row = {"bulb_colour": colour, "bulb_position": position, "sensor_position": sensor}
+                    row.update(zip(self.channels, cell.tolist()))
+                    rows.append(row)
+        return rows
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.to_rows(), columns=["bulb_colour", "bulb_position", "sensor_position"] + self.channels)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite index over every stored scan and baseline row
+
+One database per data folder (data/scan_index.sqlite) records, for each
+CSV row: its file, row offset in the file, timestamp, description, scan
+type (from the folder: basil_scans -> basil, baseline -> baseline),
+colour, bulb position, sensor and the 18 channel values as a float32
+blob. Lookups on type, date, colour, position and sensor are indexed, so
+"all basil scans from 2025-08-08 under Red light at close_bulb" is one
+query returning arrays, without opening a CSV.
+
+save_to_csv and ScanWriter add their rows as they write them. CSVs saved
+before the index existed, or copied in by hand, are added with:
+    python -m plant_spectral_scanner.scripts.scan_index --backfill
+and queried from the command line with e.g.:
+    python -m plant_spectral_scanner.scripts.scan_index --type basil --date 2025-08-08 --colour Red --position close_bulb
+"""
+
+import os
+import csv
+import time
+import sqlite3
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CHANNEL_COUNT = 18
+INDEX_FILENAME = "scan_index.sqlite"
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DATA_ROOT = os.path.join(BASE_PROJECT_DIR, "data")
+SKIP_FOLDERS = {"store", "cache", "rigs"}  # not scan CSVs, or (rigs) indexed under their own data root
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,          -- relative to the data folder
+    folder TEXT NOT NULL,
+    scan_type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,    -- file size and mtime when last indexed
+    mtime_ns INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rows (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    row_offset INTEGER NOT NULL,        -- data row in the CSV, 0 = first row after the header
+    timestamp TEXT NOT NULL,
+    date TEXT NOT NULL,
+    colour TEXT NOT NULL COLLATE NOCASE,
+    position TEXT NOT NULL COLLATE NOCASE,
+    sensor TEXT NOT NULL COLLATE NOCASE,
+    channels BLOB NOT NULL,             -- 18 float32 values, NaN where missing
+    PRIMARY KEY (file_id, row_offset)
+);
+CREATE INDEX IF NOT EXISTS files_scan_type ON files(scan_type);
+CREATE INDEX IF NOT EXISTS rows_date ON rows(date);
+CREATE INDEX IF NOT EXISTS rows_step ON rows(colour, position, sensor);
+"""
+
+
+def scan_type_of(folder: str) -> str:
+    """
+    'basil_scans' -> 'basil', 'baseline' -> 'baseline', anything else unchanged.
+    """
+    return folder[:-len("_scans")] if folder.endswith("_scans") else folder
+
+
+class ScanIndex:
+    def __init__(self, data_root: str = DEFAULT_DATA_ROOT, path: str = None):
+        """
+        Opens (and creates) the index of the CSVs under 'data_root'. Safe to
+        share between threads; other processes can read while one writes.
+        """
+        self.data_root = os.path.abspath(data_root)
+        self.path = path or os.path.join(self.data_root, INDEX_FILENAME)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Under WAL, NORMAL fsyncs at checkpoints instead of on every commit (one per
+        # save_to_csv step); a power cut may lose the last commits, never corrupt the file
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # === Writing ===
+
+    def add(self, filepath: str, description: str, records: List[Tuple], new_file: bool):
+        """
+        Index rows just appended to 'filepath', continuing its row offsets.
+
+        Args:
+            records: (timestamp, colour, position, sensor, channel values) per row
+            new_file: the write created the file, so these are its first rows
+        """
+        if not records:
+            return
+        relpath = self._relpath(filepath)
+        with self._lock:
+            # One lookup for the file's id and the number of rows already indexed
+            known = self._db.execute("SELECT id, (SELECT COUNT(*) FROM rows WHERE file_id = files.id) "
+                                     "FROM files WHERE path = ?", (relpath,)).fetchone()
+            if new_file or known is not None:
+                with self._db:
+                    if new_file:
+                        if known is not None:
+                            self._db.execute("DELETE FROM files WHERE id = ?", (known[0],))
+                        file_id, first = self._add_file(filepath, description), 0
+                    else:
+                        file_id, first = known
+                    self._insert_rows(file_id, first, records)
+                    self._mark_indexed(file_id, filepath)
+                return
+        # Appended to a CSV the index has never seen: take the whole file
+        self.index_csv(filepath, force=True)
+
+    def index_csv(self, filepath: str, force: bool = False) -> int:
+        """
+        (Re)index a whole CSV unless it is unchanged since it was last indexed.
+
+        Returns:
+            number of rows indexed (0 if the file was up to date)
+        """
+        st = os.stat(filepath)
+        relpath = self._relpath(filepath)
+        with self._lock:
+            known = self._db.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (relpath,)).fetchone()
+        if not force and known == (st.st_size, st.st_mtime_ns):
+            return 0
+
+        records = []
+        description = ""
+        with open(filepath, "r", newline="") as f:
+            reader = csv.DictReader(f)
+            channels = [name for name in (reader.fieldnames or []) if name.startswith("channel_")]
+            for row in reader:
+                description = row.get("description") or description
+                values = [float(row[name]) if row[name] not in ("", None) else np.nan for name in channels]
+                records.append((row.get("timestamp", ""), row.get("bulb_colour", ""), row.get("bulb_position", ""),
+                                row.get("sensor_position", ""), values))
+
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM files WHERE path = ?", (relpath,))
+            file_id = self._add_file(filepath, description)
+            self._insert_rows(file_id, 0, records)
+            self._mark_indexed(file_id, filepath)
+        return len(records)
+
+    def backfill(self, roots: List[str] = None) -> Tuple[int, int]:
+        """
+        Index every new or changed CSV under 'roots' (default: the whole data
+        folder) and drop files that no longer exist.
+
+        Returns:
+            (files indexed, rows indexed)
+        """
+        roots = roots or [self.data_root]
+        files = rows = 0
+        for root in roots:
+            for dirpath, dirnames, names in os.walk(root):
+                if os.path.abspath(dirpath) == self.data_root:
+                    dirnames[:] = [name for name in dirnames if name not in SKIP_FOLDERS]
+                for name in sorted(names):
+                    if name.endswith(".csv"):
+                        added = self.index_csv(os.path.join(dirpath, name))
+                        files += added > 0
+                        rows += added
+
+        with self._lock, self._db:
+            gone = [(path,) for (path,) in self._db.execute("SELECT path FROM files")
+                    if not os.path.exists(os.path.join(self.data_root, path))]
+            self._db.executemany("DELETE FROM files WHERE path = ?", gone)
+        return files, rows
+
+    def _relpath(self, filepath: str) -> str:
+        return os.path.relpath(os.path.abspath(filepath), self.data_root)
+
+    def _add_file(self, filepath: str, description: str) -> int:
+        relpath = self._relpath(filepath)
+        folder = os.path.basename(os.path.dirname(os.path.abspath(filepath)))
+        cursor = self._db.execute(
+            "INSERT INTO files (path, folder, scan_type, description) VALUES (?, ?, ?, ?)",
+            (relpath, folder, scan_type_of(folder), description or ""))
+        return cursor.lastrowid
+
+    def _insert_rows(self, file_id: int, first: int, records: List[Tuple]):
+        values = np.full((len(records), CHANNEL_COUNT), np.nan, dtype=np.float32)
+        for i, record in enumerate(records):
+            channel_values = list(record[4])[:CHANNEL_COUNT]
+            values[i, :len(channel_values)] = channel_values
+        self._db.executemany(
+            "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(file_id, first + i, timestamp, timestamp[:10], colour, position, sensor, values[i].tobytes())
+             for i, (timestamp, colour, position, sensor, _) in enumerate(records)])
+
+    def _mark_indexed(self, file_id: int, filepath: str):
+        # Lets backfill skip files that were indexed as they were written
+        st = os.stat(filepath)
+        self._db.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                         (st.st_size, st.st_mtime_ns, file_id))
+
+    # === Queries ===
+
+    def query(self, scan_type: str = None, date: str = None, colour: str = None, position: str = None,
+              sensor: str = None, description: str = None, since: str = None, until: str = None,
+              files: List[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Rows matching every given filter, in file and row order.
+
+        Args:
+            scan_type: 'basil', 'leaf', 'baseline', ...
+            date: 'YYYY-MM-DD'
+            colour / position / sensor: e.g. 'Red', 'close_bulb', 'close_sensor' (any case)
+            description: substring of the description, e.g. 'healthy'
+            since / until: timestamp bounds, inclusive ('YYYY-MM-DD[ HH:MM:SS]')
+            files: CSV paths (relative to the data folder, or absolute)
+
+        Returns:
+            dict: values (float32 array of shape (n, 18)), and per row: file (absolute path),
+            row (offset in the CSV), timestamp, description, scan_type, colour, position, sensor
+        """
+        conditions, params = [], []
+        for column, value in (("f.scan_type", scan_type), ("r.date", date), ("r.colour", colour),
+                              ("r.position", position), ("r.sensor", sensor)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if description is not None:
+            conditions.append("f.description LIKE ?")
+            params.append(f"%{description}%")
+        if since is not None:
+            conditions.append("r.timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("r.timestamp <= ?")
+            params.append(until if len(until) > 10 else until + " 23:59:59")
+        if files:
+            conditions.append(f"f.path IN ({', '.join('?' * len(files))})")
+            params.extend(self._relpath(path) if os.path.isabs(path) else path for path in files)
+
+        sql = ("SELECT f.path, r.row_offset, r.timestamp, f.description, f.scan_type, r.colour, r.position, "
+               "r.sensor, r.channels FROM rows r JOIN files f ON f.id = r.file_id")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY f.path, r.row_offset"
+        with self._lock:
+            result = self._db.execute(sql, params).fetchall()
+
+        columns = list(zip(*result)) if result else [()] * 9
+        values = np.frombuffer(b"".join(columns[8]), dtype=np.float32).reshape(-1, CHANNEL_COUNT)
+        return {
+            "values": values,
+            "file": np.array([os.path.join(self.data_root, path) for path in columns[0]], dtype=object),
+            "row": np.array(columns[1], dtype=np.int64),
+            "timestamp": np.array(columns[2], dtype=object),
+            "description": np.array(columns[3], dtype=object),
+            "scan_type": np.array(columns[4], dtype=object),
+            "colour": np.array(columns[5], dtype=object),
+            "position": np.array(columns[6], dtype=object),
+            "sensor": np.array(columns[7], dtype=object),
+        }
+
+    def files(self, scan_type: str = None, description: str = None) -> List[str]:
+        """
+        Absolute paths of the indexed CSVs of a scan type (and description substring).
+        """
+        sql, params = "SELECT path FROM files WHERE 1 = 1", []
+        if scan_type is not None:
+            sql += " AND scan_type = ?"
+            params.append(scan_type)
+        if description is not None:
+            sql += " AND description LIKE ?"
+            params.append(f"%{description}%")
+        with self._lock:
+            return [os.path.join(self.data_root, path) for (path,) in self._db.execute(sql + " ORDER BY path", params)]
+
+
+_indexes: Dict[str, ScanIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_scan_index(data_root: str = None) -> ScanIndex:
+    """
+    The shared index of a data folder (default: the project's data/), opened on first use.
+    """
+    data_root = os.path.abspath(data_root or DEFAULT_DATA_ROOT)
+    with _indexes_lock:
+        index = _indexes.get(data_root)
+        if index is None:
+            index = _indexes[data_root] = ScanIndex(data_root)
+        return index
+
+
+def index_rows(data_root: Optional[str], filepath: str, description: str, records: List[Tuple], new_file: bool):
+    """
+    Add freshly written rows to the data folder's index. A failure only
+    warns: the CSV is already saved and --backfill picks it up later.
+    """
+    try:
+        get_scan_index(data_root).add(filepath, description, records, new_file)
+    except Exception as e:
+        print(f"[WARNING] Could not index {os.path.basename(filepath)}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the scan/baseline CSVs in SQLite and query them")
+    parser.add_argument("--data-root", default=DEFAULT_DATA_ROOT, help="data folder the index covers")
+    parser.add_argument("--backfill", action="store_true", help="index every new or changed CSV first")
+    parser.add_argument("--type", dest="scan_type")
+    parser.add_argument("--date", help="YYYY-MM-DD")
+    parser.add_argument("--colour")
+    parser.add_argument("--position")
+    parser.add_argument("--sensor")
+    parser.add_argument("--description", help="substring of the description")
+    args = parser.parse_args()
+
+    index = ScanIndex(args.data_root)
+    if args.backfill:
+        started = time.perf_counter()
+        files, rows = index.backfill()
+        print(f"[COMPLETE] Indexed {rows} rows from {files} file(s) in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    result = index.query(scan_type=args.scan_type, date=args.date, colour=args.colour, position=args.position,
+                         sensor=args.sensor, description=args.description)
+    elapsed = time.perf_counter() - started
+    print(f"[QUERY] {len(result['values'])} rows from {len(set(result['file']))} file(s) in {elapsed * 1000:.1f} ms")
+    for path in sorted(set(result["file"])):
+        print(f"  {os.path.relpath(path, index.data_root)}")
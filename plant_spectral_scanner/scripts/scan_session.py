@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless scan session: baseline, scan and classify without prompts
+
+A ScanSession connects the sensors and bulbs once and keeps them open,
+so baselines and scans can run back to back from code:
+
+    with ScanSession() as session:
+        session.baseline()
+        result = session.scan("basil", "basil_healthy_plant1")
+        print(session.classify(result))
+
+Scans reuse one baseline for the whole session: the last one measured
+in it, or else the newest on disk, loaded on the first scan. A scan type
+with an illumination plan (see illumination_plan.py) measures only the
+plan's steps and is classified with the plan's model. With a 'live'
+address every reading is also published to local subscribers as it
+arrives (see utils/live_feed.py). main.py is
+the interactive front end to this class and job_queue.py runs a
+manifest of plants through it unattended.
+"""
+
+import os
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from plant_spectral_scanner.utils.sensor_controller import SensorController
+from plant_spectral_scanner.utils.bulb_controller import BulbController
+from plant_spectral_scanner.utils.metrics import MetricsRecorder, get_metrics
+from plant_spectral_scanner.utils.live_feed import LiveFeed
+from plant_spectral_scanner.scripts.csv_utils import ScanWriter
+from plant_spectral_scanner.scripts.scan_store import DEFAULT_STORE_DIR, ScanStore
+from plant_spectral_scanner.scripts.scan_frame import ScanFrame
+from plant_spectral_scanner.scripts.baseline_utils import (
+    DEFAULT_BASELINE_DIR, get_baseline_index, load_latest_baseline, subtract_baseline
+)
+from plant_spectral_scanner.scripts.illumination_plan import BULB_POSITIONS, COLOURS, full_sweep, load_plan
+from plant_spectral_scanner.scripts.acquisition_scheduler import (
+    MIN_SETTLE_TIME, SETTLE_REL_TOLERANCE, SETTLE_TIMEOUT, STREAM_FRAMES, AcquisitionScheduler
+)
+from data_processing.model_registry import check_health
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODELS_DIR = os.path.join(BASE_PROJECT_DIR, "data_processing")
+
+SCAN_TYPES = ("leaf", "basil")
+START_DELAY = 1.0  # seconds between starting a run and the first measurement
+
+
+def model_path_for(scan_type: str, models_dir: str = MODELS_DIR) -> Optional[str]:
+    """
+    Health model for 'scan_type': the compiled .npz (NumPy only) if present,
+    else the pickle (pulls in scikit-learn), else None.
+    """
+    for extension in (".npz", ".pkl"):
+        path = os.path.join(models_dir, f"{scan_type}_model{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class ScanSession:
+    def __init__(self, sensor_config: str = None, bulb_config: str = None,
+                 data_root: str = None, rig: str = None,
+                 discover: bool = True, stream: bool = False, stream_frames: int = STREAM_FRAMES,
+                 min_settle: float = MIN_SETTLE_TIME, settle_timeout: float = SETTLE_TIMEOUT,
+                 settle_tolerance: float = SETTLE_REL_TOLERANCE, start_delay: float = START_DELAY,
+                 models_dir: str = MODELS_DIR, plans: Dict[str, str] = None, live: str = None,
+                 metrics: MetricsRecorder = None):
+        """
+        Args:
+            sensor_config / bulb_config: YAML files (default: the controllers' own defaults)
+            data_root: folder holding baseline/, scans/ and store/ (default: the project's data/)
+            rig: name tagged onto baseline filenames, so each rig uses its own baselines
+            discover: probe every serial port for the sensors; with False only the
+                      ports in sensor_config are opened (needed when several rigs share a host)
+            stream: put binary-protocol sensors into streaming mode on open() (default: poll each reading)
+            start_delay: seconds to wait before each run starts measuring
+            plans: scan type -> illumination plan file; other scan types (and
+                   baselines) run the full sweep
+            live: Unix socket path or 'host:port' to publish every reading on while open
+        """
+        self.sensor_config = sensor_config
+        self.bulb_config = bulb_config
+        self.data_root = data_root
+        self.rig = rig
+        self.discover = discover
+        self.stream = stream
+        self.stream_frames = stream_frames
+        self.min_settle = min_settle
+        self.settle_timeout = settle_timeout
+        self.settle_tolerance = settle_tolerance
+        self.start_delay = start_delay
+        self.models_dir = models_dir
+        self.plans = {scan_type: load_plan(path) for scan_type, path in (plans or {}).items()}
+        self.live = live
+        self.metrics = metrics if metrics is not None else get_metrics()
+
+        if data_root is None:
+            self.baseline_dir = DEFAULT_BASELINE_DIR
+            self.store = ScanStore(DEFAULT_STORE_DIR)
+        else:
+            self.baseline_dir = os.path.join(data_root, "baseline")
+            self.store = ScanStore(os.path.join(data_root, "store"))
+
+        self.sensor_controller = None
+        self.bulb_controller = None
+        self.scheduler = None
+        self.live_feed = None
+        self.baseline_frame = None  # baseline reused by every scan of this session
+        self.baseline_file = None
+
+    # === Connections ===
+
+    def open(self) -> "ScanSession":
+        """
+        Connect sensors and bulbs and pre-load the baseline. Safe to call twice.
+        """
+        if self.scheduler is not None:
+            return self
+        sensor_kwargs = {"config_path": self.sensor_config} if self.sensor_config else {}
+        self.sensor_controller = SensorController(metrics=self.metrics, **sensor_kwargs)
+        self.sensor_controller.connect_sensors(discover=self.discover)
+        if self.stream:
+            self.sensor_controller.start_streaming()
+
+        bulb_kwargs = {"config_path": self.bulb_config} if self.bulb_config else {}
+        self.bulb_controller = BulbController(metrics=self.metrics, **bulb_kwargs)
+        self.scheduler = AcquisitionScheduler(
+            self.sensor_controller,
+            self.bulb_controller,
+            min_settle=self.min_settle,
+            settle_timeout=self.settle_timeout,
+            rel_tol=self.settle_tolerance,
+            stream_frames=self.stream_frames,
+            metrics=self.metrics
+        )
+        if self.live:
+            self.live_feed = LiveFeed(self.live, metrics=self.metrics).start()
+        # Parse (or load the cached) baseline now rather than at the first scan
+        get_baseline_index(self.baseline_dir).select(rig=self.rig)
+        return self
+
+    def close(self):
+        """
+        Turn the bulbs off and release every connection.
+        """
+        try:
+            if self.sensor_controller is not None:
+                self.sensor_controller.disconnect_sensors()
+            if self.bulb_controller is not None:
+                self.bulb_controller.turn_off_all_lights()
+                self.bulb_controller.close()
+            if self.live_feed is not None:
+                self.live_feed.close()
+        finally:
+            self.sensor_controller = self.bulb_controller = self.scheduler = self.live_feed = None
+        print("[DISCONNECTED] Sensors safely disconnected.")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # === Runs ===
+
+    def baseline(self) -> Dict:
+        """
+        Measure a new baseline and use it for the scans that follow.
+
+        Returns:
+            dict: mode, filename, frame (ScanFrame), timing (scheduler summary),
+            missing_sensors (sensors with NaN rows)
+        """
+        writer = ScanWriter("baseline", data_root=self.data_root, store=self.store, rig=self.rig,
+                            metrics=self.metrics)
+        frame = ScanFrame(colours=list(COLOURS), positions=BULB_POSITIONS)
+
+        def process_step(colour, position, data):
+            frame.set_step(colour, position, data)
+            writer.add(data, colour, position)
+            if self.live_feed is not None:
+                self.live_feed.publish_step(colour, position, data)
+
+        result = self._run("baseline", full_sweep(), writer, process_step, frame)
+        if result["filename"]:
+            # Read back through the index, so scans subtract exactly what was saved
+            self.baseline_file = os.path.join(writer.data_dir, result["filename"])
+            self.baseline_frame = get_baseline_index(self.baseline_dir).load(self.baseline_file)
+        return result
+
+    def load_baseline(self, reload: bool = False) -> ScanFrame:
+        """
+        The session's baseline, loading the newest one from disk the first time (or with reload=True).
+
+        Raises:
+            RuntimeError: if there is no baseline to load
+        """
+        if self.baseline_frame is None or reload:
+            frame = load_latest_baseline(self.baseline_dir, rig=self.rig)
+            if frame is None:
+                raise RuntimeError("No baseline found. Please create a baseline first.")
+            self.baseline_frame = frame
+            self.baseline_file = get_baseline_index(self.baseline_dir).select_path(rig=self.rig)
+        return self.baseline_frame
+
+    def scan(self, scan_type: str, description: str = "", classify: bool = False) -> Dict:
+        """
+        Measure one object and save the baseline-adjusted readings under scans/<scan_type>_scans/.
+
+        Args:
+            scan_type: 'leaf' or 'basil'; picks the folder and the health model
+            description: written to every row and the filename, e.g. 'basil_healthy_plant1'
+            classify: also run the health check and add its result as 'health'
+
+        Returns:
+            dict: mode, scan_type, description, filename, frame (adjusted ScanFrame), timing;
+            steps of the frame outside the scan type's plan are left NaN
+        """
+        if scan_type not in SCAN_TYPES:
+            raise ValueError(f"Unknown scan type '{scan_type}', expected one of {', '.join(SCAN_TYPES)}")
+        baseline = self.load_baseline()
+
+        writer = ScanWriter("scan", description=description, adjusted=True,
+                            extra_subfolder=os.path.join("scans", f"{scan_type}_scans"),
+                            data_root=self.data_root, store=self.store, metrics=self.metrics)
+        frame = ScanFrame(colours=list(COLOURS), positions=BULB_POSITIONS)
+
+        def process_step(colour, position, data):
+            adjusted = subtract_baseline(data, baseline, colour, position, self.metrics)
+            frame.set_step(colour, position, adjusted)
+            writer.add(adjusted, colour, position)
+            if self.live_feed is not None:
+                self.live_feed.publish_step(colour, position, data, adjusted)
+
+        plan = self.plans.get(scan_type)
+        steps = plan["steps"] if plan else full_sweep()
+        result = self._run("scan", steps, writer, process_step, frame, scan_type=scan_type, description=description)
+        if classify and result["filename"]:
+            result["health"] = self.classify(result)
+        return result
+
+    def classify(self, result: Dict) -> str:
+        """
+        Health of a scan() result with its scan type's model: 'Healthy' or 'Unhealthy'.
+
+        Raises:
+            FileNotFoundError: if there is no model for the scan type
+            ValueError: if the scan has no complete readings
+        """
+        scan_type = result["scan_type"]
+        plan = self.plans.get(scan_type)
+        if plan and plan.get("model"):
+            # A reduced plan averages fewer rows, so it needs the model trained on those rows
+            model_path = plan["model"] if os.path.exists(plan["model"]) else None
+        else:
+            model_path = model_path_for(scan_type, self.models_dir)
+        if model_path is None:
+            raise FileNotFoundError(f"No {scan_type} model found in {self.models_dir}")
+        rows = result["frame"].channel_rows()
+        if not len(rows):
+            raise ValueError("Scan has no complete channel rows")
+
+        print(f"[HEALTH CHECK] Using {scan_type} model from {model_path}")
+        with self.metrics.timer("model.inference"):
+            return check_health(model_path, rows)
+
+    def _run(self, mode: str, steps: List[Tuple[str, str, str]], writer: ScanWriter, process_step,
+             frame: ScanFrame, **attrs) -> Dict:
+        if self.scheduler is None:
+            self.open()
+
+        print(f"[INFO] Starting {mode} measurements...")
+        if self.start_delay > 0:
+            time.sleep(self.start_delay)
+
+        first_of_colour = {(colour, position) for i, (colour, _, position) in enumerate(steps)
+                           if i == 0 or steps[i - 1][0] != colour}
+
+        # Runs on the scheduler's worker thread while the next bulb settles
+        def process(colour, position, data):
+            if (colour, position) in first_of_colour:
+                print(f"[{mode.upper()}] Measuring for {colour} light")
+            process_step(colour, position, data)
+
+        if self.live_feed is not None:
+            self.live_feed.begin_run(mode, rig=self.rig, **attrs)
+        filename = None
+        with self.metrics.span(mode, **attrs) as span:
+            try:
+                timing = self.scheduler.run(steps, process)
+                filename = writer.flush()
+            finally:
+                if self.live_feed is not None:
+                    self.live_feed.end_run(filename=filename)
+            span["attrs"]["filename"] = filename
+            span["attrs"]["settled_steps"] = sum(step["settled"] for step in timing["steps"])
+
+        # Sensors the health supervisor skipped for at least one step (their rows are NaN)
+        missing = sorted({sensor for colour, _, position in steps
+                          for sensor, values in zip(frame.sensors, frame.step(colour, position))
+                          if np.isnan(values).all()})
+        if missing:
+            print(f"[WARNING] No readings from {', '.join(missing)} for part of this {mode}; those rows are NaN.")
+        if filename:
+            print(f"[COMPLETE] {mode.capitalize()} data successfully saved to '{filename}'")
+        return {"mode": mode, "filename": filename, "frame": frame, "timing": timing,
+                "missing_sensors": missing, **attrs}
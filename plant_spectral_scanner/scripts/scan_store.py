@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Consolidated columnar store for every scan and baseline row
+
+All channel values live in one raw float32 file (channels.f32, 18 values
+per row) that is appended to and memory-mapped on load. Row metadata
+(file, folder, description, timestamp, colour, position, sensor) sits
+alongside in rows.csv, each row pointing at its channel row, so an
+interrupted append can never shift labels onto the wrong values.
+
+Existing CSVs can be imported with:
+    python -m plant_spectral_scanner.scripts.scan_store --import data/scans data/baseline
+"""
+
+import os
+import csv
+import argparse
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+CHANNEL_COUNT = 18
+ROW_BYTES = CHANNEL_COUNT * 4  # one float32 channel row in channels.f32
+META_COLUMNS = ["row", "file", "folder", "description", "timestamp", "bulb_colour", "bulb_position", "sensor_position"]
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_STORE_DIR = os.path.join(BASE_PROJECT_DIR, "data", "store")
+
+
+class ScanStore:
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self.channels_path = os.path.join(root, "channels.f32")
+        self.meta_path = os.path.join(root, "rows.csv")
+        self._lock = threading.Lock()
+
+    def append(self, filename: str, folder: str, description: str, records: List[Tuple]):
+        """
+        Append rows from one session.
+
+        Args:
+            records: (timestamp, colour, position, sensor, channel values) per row
+        """
+        if not records:
+            return
+
+        values = np.full((len(records), CHANNEL_COUNT), np.nan, dtype=np.float32)
+        for i, record in enumerate(records):
+            channel_values = record[4][:CHANNEL_COUNT]
+            values[i, :len(channel_values)] = channel_values
+
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            # Channels first: if we stop before the metadata is written the
+            # new channel rows are simply never referenced
+            with open(self.channels_path, "ab") as f:
+                size = f.seek(0, os.SEEK_END)
+                partial = size % ROW_BYTES
+                if partial:
+                    # A row cut short by an interrupted write: no metadata points at it,
+                    # and leaving it would misalign every row appended after it
+                    print(f"[WARNING] Dropping {partial} trailing byte(s) of an incomplete row from {self.channels_path}")
+                    size = f.truncate(size - partial)
+                first_row = size // ROW_BYTES
+                f.write(values.tobytes())
+
+            new_meta = not os.path.exists(self.meta_path)
+            with open(self.meta_path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_meta:
+                    writer.writerow(META_COLUMNS)
+                for i, (timestamp, colour, position, sensor, _) in enumerate(records):
+                    writer.writerow([first_row + i, filename, folder, description, timestamp, colour, position, sensor])
+
+    def load(self, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Returns:
+            (metadata column name -> array of strings, channel values of shape (n, 18))
+            The channel array is a read-only memory map unless mmap=False.
+        """
+        if not os.path.exists(self.channels_path) or not os.path.exists(self.meta_path):
+            return {name: np.array([], dtype=object) for name in META_COLUMNS[1:]}, np.empty((0, CHANNEL_COUNT), np.float32)
+
+        with open(self.meta_path, "r", newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            meta_rows = list(reader)
+
+        stored_rows = os.path.getsize(self.channels_path) // ROW_BYTES
+        meta_rows = [row for row in meta_rows if int(row[0]) < stored_rows]
+        index = np.array([int(row[0]) for row in meta_rows], dtype=np.int64)
+
+        if mmap:
+            values = np.memmap(self.channels_path, dtype=np.float32, mode="r", shape=(stored_rows, CHANNEL_COUNT)) \
+                if stored_rows else np.empty((0, CHANNEL_COUNT), np.float32)
+        else:
+            values = np.fromfile(self.channels_path, dtype=np.float32).reshape(-1, CHANNEL_COUNT)[:stored_rows]
+        # Normally every channel row is referenced in order, so the memory map is returned as is
+        if len(index) != stored_rows or not np.array_equal(index, np.arange(stored_rows)):
+            values = values[index]
+
+        columns = list(zip(*meta_rows)) if meta_rows else [()] * len(META_COLUMNS)
+        meta = {name: np.array(column, dtype=object) for name, column in zip(META_COLUMNS, columns)}
+        meta.pop("row")
+        return meta, values
+
+    def files(self) -> set:
+        """
+        Names of the files already in the store.
+        """
+        if not os.path.exists(self.meta_path):
+            return set()
+        with open(self.meta_path, "r", newline="") as f:
+            reader = csv.DictReader(f)
+            return {row["file"] for row in reader}
+
+    def import_csv(self, path: str) -> int:
+        """
+        Add an existing scan/baseline CSV. Returns the number of rows imported.
+        """
+        records = []
+        description = ""
+        with open(path, "r", newline="") as f:
+            reader = csv.DictReader(f)
+            channels = [name for name in reader.fieldnames if name.startswith("channel_")]
+            for row in reader:
+                description = row.get("description", "")
+                values = [float(row[name]) if row[name] not in ("", None) else np.nan for name in channels]
+                records.append((row["timestamp"], row["bulb_colour"], row["bulb_position"], row["sensor_position"], values))
+        folder = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        self.append(os.path.basename(path), folder, description, records)
+        return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import scan/baseline CSVs into the columnar store")
+    parser.add_argument("--import", dest="sources", nargs="+", required=True,
+                        help="CSV files or folders to import (folders are searched recursively)")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+
+    store = ScanStore(args.store)
+    existing = store.files()
+    total = 0
+    for source in args.sources:
+        paths = [source] if os.path.isfile(source) else [
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(source) for name in sorted(names) if name.endswith(".csv")
+        ]
+        for path in paths:
+            if os.path.basename(path) in existing:
+                continue
+            total += store.import_csv(path)
+            existing.add(os.path.basename(path))
+    print(f"[COMPLETE] Imported {total} rows into {args.store}")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary READ_BIN / READ_RAW frame format shared with the firmware
+
+Frame layout (little-endian):
+    0xA5 0x5A | seq uint16 | type uint8 | count uint8 | payload | crc16 uint16
+
+type 1 is float32 calibrated values, type 2 is uint16 raw counts. The
+CRC is CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over everything
+between the sync bytes and the CRC.
+"""
+
+import struct
+from typing import Tuple
+
+import numpy as np
+
+FRAME_SYNC = b"\xa5\x5a"
+FRAME_HEADER = struct.Struct("<HBB")   # seq, type, count
+FRAME_CRC = struct.Struct("<H")
+
+FRAME_FLOAT32 = 1
+FRAME_UINT16 = 2
+FRAME_DTYPES = {
+    FRAME_FLOAT32: np.dtype("<f4"),
+    FRAME_UINT16: np.dtype("<u2"),
+}
+
+PROTOCOL_VERSION = 2          # reported by firmware that understands READ_BIN as "PROTO:2"
+BINARY_BAUDRATE = 115200
+
+
+class FrameError(Exception):
+    """Raised when a binary frame is truncated or fails its CRC."""
+
+
+class FrameTimeout(FrameError):
+    """Raised when no frame started before the serial timeout."""
+
+
+def _crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16_ccitt(data: bytes, crc: int = 0xFFFF) -> int:
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16_TABLE[((crc >> 8) ^ byte) & 0xFF]
+    return crc
+
+
+def encode_frame(seq: int, values, frame_type: int = FRAME_FLOAT32) -> bytes:
+    """
+    Build a frame the way the firmware does (used by the simulator).
+    """
+    payload = np.asarray(values, dtype=FRAME_DTYPES[frame_type]).tobytes()
+    body = FRAME_HEADER.pack(seq & 0xFFFF, frame_type, len(values)) + payload
+    return FRAME_SYNC + body + FRAME_CRC.pack(crc16_ccitt(body))
+
+
+def decode_frame(body: bytes, crc: bytes) -> Tuple[int, np.ndarray]:
+    """
+    Check and decode the part of a frame after the sync bytes.
+
+    Returns:
+        (seq, values) where values is a read-only view on 'body' (no copy)
+    """
+    if len(crc) != FRAME_CRC.size or FRAME_CRC.unpack(crc)[0] != crc16_ccitt(body):
+        raise FrameError("CRC mismatch")
+    seq, frame_type, count = FRAME_HEADER.unpack_from(body)
+    dtype = FRAME_DTYPES.get(frame_type)
+    if dtype is None:
+        raise FrameError(f"Unknown frame type {frame_type}")
+    return seq, np.frombuffer(body, dtype=dtype, count=count, offset=FRAME_HEADER.size)
+
+
+def read_frame(ser) -> Tuple[int, np.ndarray]:
+    """
+    Read one frame from a serial port, skipping any bytes before the sync marker.
+
+    Raises:
+        FrameError: on timeout, truncation or CRC failure
+    """
+    window = b""
+    while window != FRAME_SYNC:
+        byte = ser.read(1)
+        if not byte:
+            raise FrameTimeout("Timed out waiting for frame sync")
+        window = (window + byte)[-2:]
+
+    header = ser.read(FRAME_HEADER.size)
+    if len(header) != FRAME_HEADER.size:
+        raise FrameError("Truncated frame header")
+    _, frame_type, count = FRAME_HEADER.unpack(header)
+    dtype = FRAME_DTYPES.get(frame_type)
+    if dtype is None:
+        raise FrameError(f"Unknown frame type {frame_type}")
+
+    payload = ser.read(count * dtype.itemsize)
+    crc = ser.read(FRAME_CRC.size)
+    if len(payload) != count * dtype.itemsize:
+        raise FrameError("Truncated frame payload")
+    return decode_frame(header + payload, crc)
@@ -1,26 +1,63 @@
 import asyncio
+import time
 import yaml
 from pywizlight import wizlight, PilotBuilder
-from typing import Dict
+from typing import Dict, Optional, Tuple
+from plant_spectral_scanner.utils.metrics import MetricsRecorder, get_metrics
+
+CONFIRM_TIMEOUT = 1.0   # seconds to wait for a bulb to report the commanded state
+CONFIRM_INTERVAL = 0.05 # seconds between getPilot queries while confirming
 
 class BulbController:
-    def __init__(self, config_path="plant_spectral_scanner/config/bulbs.yaml"):
+    def __init__(self, config_path="plant_spectral_scanner/config/bulbs.yaml", confirm: bool = True,
+                 metrics: MetricsRecorder = None):
         self.bulbs = {}  # type: Dict[str, wizlight]
+        # Last state each bulb confirmed: an (r, g, b) tuple when on, None when off.
+        # Bulbs missing from this dict are in an unknown state and always get the command.
+        self.state = {}  # type: Dict[str, Optional[Tuple[int, int, int]]]
+        self.confirm = confirm
+        self.metrics = metrics if metrics is not None else get_metrics()  # bulb.apply / bulb.udp / bulb.confirm times
+        # Private loop, never installed as the thread's current loop, so
+        # controllers for several rigs can each run in their own thread
         self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
         self._load_bulbs(config_path)
+        self.warm_up()
 
     def _load_bulbs(self, config_path):
         with open(config_path, 'r') as f:
             config = yaml.safe_load(f)
         
+        addresses = {}
         for bulb_info in config.get("bulbs", []):
             name = bulb_info.get("name")
             ip = bulb_info.get("ip")
+            port = bulb_info.get("port", 38899)  # only set for non-standard bulbs, e.g. the simulator
             if name and ip:
-                self.bulbs[name] = wizlight(ip)
+                addresses[name] = (ip, port)
             else:
                 print(f"[WARNING] Bulb entry missing name or ip: {bulb_info}")
+        self.bulbs.update(self.loop.run_until_complete(self._async_create(addresses)))
+
+    @staticmethod
+    async def _async_create(addresses: Dict[str, Tuple[str, int]]) -> Dict[str, wizlight]:
+        # wizlight binds to asyncio.get_event_loop() when created, so create them inside our loop
+        return {name: wizlight(ip, port=port) for name, (ip, port) in addresses.items()}
+
+    def warm_up(self):
+        """
+        Open the UDP connection to every bulb and read its current state.
+
+        pywizlight keeps the transport open afterwards, so later commands
+        skip connection setup, and bulbs that are already off are not sent
+        another turn-off.
+        """
+        names = list(self.bulbs)
+        results = self._run_all(self._async_query(self.bulbs[name]) for name in names)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f"[WARNING] Could not reach bulb '{name}': {result}")
+                continue
+            self.state[name] = result
 
     def turn_on_light(self, position: str, hex_color: str):
         """
@@ -28,20 +65,121 @@ class BulbController:
         This method runs the asyncio call internally.
         """
         position_key = f"{position}"
-        bulb = self.bulbs.get(position_key)
-        if not bulb:
+        if position_key not in self.bulbs:
             print(f"[ERROR] No bulb found for position '{position}'")
             return
         
         rgb = self._hex_to_rgb(hex_color)
-        self.loop.run_until_complete(self._async_turn_on(bulb, rgb))
+        self._apply({position_key: rgb})
+
+    def transition(self, position: str, hex_color: str):
+        """
+        Switch to 'position' lit with 'hex_color' and every other bulb off,
+        in a single concurrent batch. Bulbs already in the wanted state are
+        left alone.
+        """
+        if position not in self.bulbs:
+            print(f"[ERROR] No bulb found for position '{position}'")
+            return
+
+        rgb = self._hex_to_rgb(hex_color)
+        targets = {name: None for name in self.bulbs}
+        targets[position] = rgb
+        self._apply(targets)
 
-    def turn_off_all_lights(self):
+    def turn_off_all_lights(self, force: bool = False):
         """
         Turn off all bulbs asynchronously.
+
+        Bulbs known to be off are skipped unless force=True.
+        """
+        if force:
+            self.state.clear()
+        self._apply({name: None for name in self.bulbs})
+
+    def close(self):
+        """
+        Close the bulb connections and the event loop.
         """
-        tasks = [self._async_turn_off(bulb) for bulb in self.bulbs.values()]
-        self.loop.run_until_complete(asyncio.gather(*tasks))
+        self._run_all(bulb.async_close() for bulb in self.bulbs.values())
+        self.loop.close()
+
+    def _apply(self, targets: Dict[str, Optional[Tuple[int, int, int]]]):
+        """
+        Send only the commands needed to reach 'targets' (name -> rgb or None), all at once.
+        """
+        changes = {
+            name: rgb for name, rgb in targets.items()
+            if name not in self.state or self.state[name] != rgb
+        }
+        if not changes:
+            return
+
+        names = list(changes)
+        with self.metrics.timer("bulb.apply"):
+            results = self._run_all(self._async_set(self.bulbs[name], changes[name]) for name in names)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f"[ERROR] Bulb '{name}' failed: {result}")
+                self.state.pop(name, None)
+            elif result is False:
+                print(f"[WARNING] Bulb '{name}' did not confirm its new state.")
+                self.state.pop(name, None)
+            else:
+                self.state[name] = changes[name]
+
+    def _run_all(self, coroutines) -> list:
+        """
+        Run coroutines concurrently on this controller's loop; exceptions are returned, not raised.
+        """
+        return self.loop.run_until_complete(self._async_gather(list(coroutines)))
+
+    @staticmethod
+    async def _async_gather(coroutines):
+        # gather() inside the loop, as outside it would look for the thread's current loop
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    async def _async_set(self, bulb, rgb) -> bool:
+        started = time.perf_counter()
+        if rgb is None:
+            await self._async_turn_off(bulb)
+        else:
+            await self._async_turn_on(bulb, rgb)
+        sent = time.perf_counter()
+        self.metrics.observe("bulb.udp", sent - started)
+        if not self.confirm:
+            return True
+        confirmed = await self._async_confirm(bulb, rgb is not None)
+        self.metrics.observe("bulb.confirm", time.perf_counter() - sent)
+        return confirmed
+
+    async def _async_confirm(self, bulb, on: bool) -> bool:
+        """
+        Query the bulb until it reports the wanted on/off state.
+
+        Only on/off is compared: bulbs report colour in their own channel
+        mix, which does not always round-trip to the commanded RGB.
+        """
+        deadline = time.monotonic() + CONFIRM_TIMEOUT
+        while True:
+            result = await self._async_get_pilot(bulb)
+            if result is not None and bool(result.get("state")) == on:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(CONFIRM_INTERVAL)
+
+    async def _async_query(self, bulb):
+        result = await self._async_get_pilot(bulb)
+        if result is None:
+            raise RuntimeError("no getPilot result")
+        if not result.get("state"):
+            return None
+        return (int(result.get("r", 0)), int(result.get("g", 0)), int(result.get("b", 0)))
+
+    async def _async_get_pilot(self, bulb) -> Optional[dict]:
+        resp = await bulb.send({"method": "getPilot", "params": {}})
+        return resp.get("result") if resp else None
 
     async def _async_turn_on(self, bulb, rgb):
         pilot = PilotBuilder(rgb=rgb, brightness=255)
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulated scanning rig: fake AS7265x serial devices and WiZ bulbs
+
+Each sensor is a pty that speaks the firmware protocol (PING, GET_ID,
+CHECK_SENSOR, READ_DATA, and the binary GET_PROTO / SET_BAUD / READ_BIN /
+READ_RAW / STREAM_ON / STREAM_OFF unless simulating old firmware) with a configurable integration
+time and baud-rate transfer delay. Each bulb is a local UDP socket that answers
+setPilot/getPilot like a WiZ bulb. Readings are synthesized from a
+recorded scan and baseline in data/, so SensorController and
+BulbController can run a full scan with no hardware attached.
+
+Usage (from the project root):
+    python -m plant_spectral_scanner.utils.hardware_simulator --scans 3
+"""
+
+import os
+import csv
+import json
+import math
+import tty
+import time
+import yaml
+import glob
+import random
+import select
+import socket
+import tempfile
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from plant_spectral_scanner.utils.binary_protocol import (
+    FRAME_FLOAT32, FRAME_UINT16, PROTOCOL_VERSION, encode_frame
+)
+
+WAVELENGTH_COUNT = 18
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENSORS = {
+    # config name -> firmware ID
+    "close_sensor": "CloseSensor",
+    "middle_sensor": "MiddleSensor",
+    "far_sensor": "FarSensor",
+}
+BULB_POSITIONS = ["close_bulb", "middle_bulb", "far_bulb"]
+COLOUR_NAMES = {
+    (255, 0, 0): "red",
+    (0, 255, 0): "green",
+    (0, 0, 255): "blue",
+    (255, 255, 255): "white",
+}
+
+INTEGRATION_TIME = 0.15  # seconds, matches setIntegrationCycles(49) in the firmware
+BAUDRATE = 9600
+RISE_TIME = 0.1          # seconds for a bulb to reach full output (exponential time constant)
+NOISE_REL = 0.01
+NOISE_ABS = 0.05
+
+
+def _newest(pattern: str) -> Optional[str]:
+    files = sorted(glob.glob(pattern))
+    return files[-1] if files else None
+
+
+class SpectraLibrary:
+    def __init__(self, scan_csv: str = None, baseline_csv: str = None):
+        """
+        Raw sensor readings per (colour, position, sensor), rebuilt as
+        baseline + baseline-adjusted scan values from recorded CSVs.
+        """
+        data_dir = os.path.join(BASE_PROJECT_DIR, "data")
+        scan_csv = scan_csv or _newest(os.path.join(data_dir, "scans", "basil_scans", "*.csv"))
+        baseline_csv = baseline_csv or _newest(os.path.join(data_dir, "baseline", "baseline_*.csv"))
+
+        baseline = self._load(baseline_csv) if baseline_csv else {}
+        scan = self._load(scan_csv) if scan_csv else {}
+        zeros = [0.0] * WAVELENGTH_COUNT
+        self.spectra = {
+            key: [b + s for b, s in zip(baseline.get(key, zeros), scan.get(key, zeros))]
+            for key in set(baseline) | set(scan)
+        }
+
+    @staticmethod
+    def _load(path: str) -> Dict[Tuple[str, str, str], List[float]]:
+        rows = {}
+        with open(path, "r") as csvfile:
+            for row in csv.DictReader(csvfile):
+                key = (row["bulb_colour"].lower(), row["bulb_position"].lower(), row["sensor_position"])
+                rows[key] = [float(v or 0) for k, v in row.items() if k.startswith("channel_")]
+        return rows
+
+    def spectrum(self, rgb: Tuple[int, int, int], position: str, sensor: str) -> List[float]:
+        colour = COLOUR_NAMES.get(tuple(rgb), "white")
+        return self.spectra.get((colour, position, sensor), [0.0] * WAVELENGTH_COUNT)
+
+
+class SimulatedLight:
+    def __init__(self, library: SpectraLibrary, rise_time: float = RISE_TIME):
+        """
+        Shared illumination state: which bulbs are lit, in what colour and since when.
+        """
+        self.library = library
+        self.rise_time = rise_time
+        self._lock = threading.Lock()
+        self._bulbs = {position: (None, 0.0) for position in BULB_POSITIONS}  # position -> (rgb, changed_at)
+
+    def set_bulb(self, position: str, rgb: Optional[Tuple[int, int, int]]):
+        with self._lock:
+            if self._bulbs.get(position, (None, 0.0))[0] != rgb:
+                self._bulbs[position] = (rgb, time.monotonic())
+
+    def get_bulb(self, position: str) -> Optional[Tuple[int, int, int]]:
+        with self._lock:
+            return self._bulbs.get(position, (None, 0.0))[0]
+
+    def measure(self, sensor: str) -> List[float]:
+        """
+        What 'sensor' sees right now, including bulb warm-up and noise.
+        """
+        now = time.monotonic()
+        total = [0.0] * WAVELENGTH_COUNT
+        with self._lock:
+            bulbs = list(self._bulbs.items())
+        for position, (rgb, changed_at) in bulbs:
+            if rgb is None:
+                continue
+            level = 1.0 - math.exp(-(now - changed_at) / self.rise_time) if self.rise_time > 0 else 1.0
+            for i, value in enumerate(self.library.spectrum(rgb, position, sensor)):
+                total[i] += value * level
+        return [max(v + random.gauss(0, NOISE_REL * v + NOISE_ABS), 0.0) for v in total]
+
+
+class FakeSensorDevice:
+    def __init__(self, sensor: str, sensor_id: str, light: SimulatedLight,
+                 integration_time: float = INTEGRATION_TIME, baudrate: int = BAUDRATE,
+                 binary: bool = True):
+        """
+        A pty that behaves like one Arduino + AS7265x running ardino_upload_code.ino.
+        With binary=False it behaves like firmware from before READ_BIN. Set
+        sensor_found=False for a board whose AS7265x did not answer at boot,
+        or silent=True for a hung board / pulled cable (nothing is answered).
+        """
+        self.sensor = sensor
+        self.sensor_id = sensor_id
+        self.light = light
+        self.integration_time = integration_time
+        self.baudrate = baudrate
+        self.binary = binary
+        self.sensor_found = True
+        self.silent = False
+        self.reads = 0
+        self._seq = 0
+        self._next_frame = None  # monotonic time the next streamed frame is due, None when not streaming
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # no echo, no newline translation
+        self.port = os.ttyname(self._slave)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name=f"fake-{sensor}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _serve(self):
+        buffer = b""
+        while not self._stop.is_set():
+            wait = 0.1 if self._next_frame is None else max(self._next_frame - time.monotonic(), 0)
+            ready, _, _ = select.select([self._master], [], [], wait)
+            if ready:
+                try:
+                    buffer += os.read(self._master, 1024)
+                except OSError:
+                    return
+                if self.silent:
+                    buffer = b""
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    self._handle(line.decode("utf-8", errors="ignore").strip())
+            if self._next_frame is not None and time.monotonic() >= self._next_frame:
+                if not self.silent:
+                    self._send_frame(FRAME_FLOAT32)
+                self._next_frame += self.integration_time
+
+    def _reply(self, text: str):
+        self._send((text + "\r\n").encode("utf-8"))
+
+    def _send(self, payload: bytes):
+        time.sleep(len(payload) * 10 / self.baudrate)  # 8N1: 10 bits per byte on the wire
+        os.write(self._master, payload)
+
+    def _reply_frame(self, frame_type: int):
+        if not self.sensor_found:
+            self._reply("SENSOR_ERROR")
+            return
+        time.sleep(self.integration_time)
+        self._send_frame(frame_type)
+
+    def _send_frame(self, frame_type: int):
+        self.reads += 1
+        values = self.light.measure(self.sensor)
+        if frame_type == FRAME_UINT16:
+            values = [min(int(round(v)), 0xFFFF) for v in values]
+        self._send(encode_frame(self._seq, values, frame_type))
+        self._seq = (self._seq + 1) & 0xFFFF
+
+    def _handle(self, command: str):
+        command_upper = command.upper()
+        if command_upper == "PING":
+            self._reply("PONG")
+        elif command_upper == "CHECK_SENSOR":
+            self._reply("SENSOR_OK" if self.sensor_found else "SENSOR_ERROR")
+        elif command_upper.startswith("SET_ID "):
+            new_id = command_upper[7:].strip()
+            if new_id:
+                self.sensor_id = new_id
+                self._reply(f"ID_SET:{new_id}")
+            else:
+                self._reply("ID_ERROR:Empty_ID")
+        elif command_upper == "GET_ID":
+            self._reply(f"ID:{self.sensor_id}")
+        elif command_upper in ("LED_ON", "LED_OFF", "LED_FLASH"):
+            self._reply(f"{command_upper}_OK")
+        elif command_upper == "READ_DATA":
+            if not self.sensor_found:
+                self._reply("SENSOR_ERROR")
+                return
+            time.sleep(self.integration_time)
+            self.reads += 1
+            self._reply(",".join(f"{v:.4f}" for v in self.light.measure(self.sensor)))
+        elif not self.binary:
+            return  # old firmware silently ignores anything else
+        elif command_upper == "GET_PROTO":
+            self._reply(f"PROTO:{PROTOCOL_VERSION}")
+        elif command_upper.startswith("SET_BAUD "):
+            rate = command_upper[9:].strip()
+            if rate in ("9600", "57600", "115200", "230400"):
+                self._reply(f"BAUD_OK:{rate}")  # sent at the old rate, like Serial.flush() before begin()
+                self.baudrate = int(rate)
+            else:
+                self._reply("BAUD_ERROR:Unsupported")
+        elif command_upper == "READ_BIN":
+            self._reply_frame(FRAME_FLOAT32)
+        elif command_upper == "READ_RAW":
+            self._reply_frame(FRAME_UINT16)
+        elif command_upper == "STREAM_ON":
+            if not self.sensor_found:
+                self._reply("SENSOR_ERROR")
+                return
+            self._reply("STREAM_ON_OK")
+            self._next_frame = time.monotonic() + self.integration_time
+        elif command_upper == "STREAM_OFF":
+            self._next_frame = None
+            self._reply("STREAM_OFF_OK")
+
+
+class FakeBulb:
+    def __init__(self, position: str, light: SimulatedLight, latency: float = 0.0):
+        """
+        A UDP socket on 127.0.0.1 that answers WiZ setPilot/getPilot messages.
+        """
+        self.position = position
+        self.light = light
+        self.latency = latency
+        self.messages = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.settimeout(0.1)
+        self.port = self._sock.getsockname()[1]
+        self._pilot = {"state": False}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name=f"fake-{position}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                payload, address = self._sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            try:
+                message = json.loads(payload)
+            except ValueError:
+                continue
+            self.messages += 1
+            if self.latency:
+                time.sleep(self.latency)
+            self._sock.sendto(json.dumps(self._handle(message)).encode("utf-8"), address)
+
+    def _handle(self, message: dict) -> dict:
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "setPilot":
+            self._pilot.update(params)
+            if params.get("state") is False:
+                self.light.set_bulb(self.position, None)
+            else:
+                rgb = tuple(int(self._pilot.get(c, 255)) for c in ("r", "g", "b"))
+                self.light.set_bulb(self.position, rgb)
+            return {"method": method, "env": "pro", "result": {"success": True}}
+        if method == "getPilot":
+            return {"method": method, "env": "pro", "result": dict(self._pilot)}
+        return {"method": method, "env": "pro", "error": {"code": -32601, "message": "Method not found"}}
+
+
+class SimulatedRig:
+    def __init__(self, scan_csv: str = None, baseline_csv: str = None,
+                 integration_time: float = INTEGRATION_TIME, baudrate: int = BAUDRATE,
+                 rise_time: float = RISE_TIME, bulb_latency: float = 0.0, binary: bool = True):
+        """
+        Three fake sensors and three fake bulbs, with config files that
+        SensorController and BulbController can load directly.
+
+        Use as a context manager:
+            with SimulatedRig() as rig:
+                sensors = SensorController(rig.sensor_config_path)
+                sensors.connect_sensors(discover=False)
+                bulbs = BulbController(rig.bulb_config_path)
+        """
+        self.light = SimulatedLight(SpectraLibrary(scan_csv, baseline_csv), rise_time)
+        self.sensors = {
+            name: FakeSensorDevice(name, sensor_id, self.light, integration_time, baudrate, binary)
+            for name, sensor_id in SENSORS.items()
+        }
+        self.bulbs = {position: FakeBulb(position, self.light, bulb_latency) for position in BULB_POSITIONS}
+        self._config_dir = tempfile.TemporaryDirectory(prefix="simulated_rig_")
+        self.sensor_config_path = os.path.join(self._config_dir.name, "sensor_ports.yaml")
+        self.bulb_config_path = os.path.join(self._config_dir.name, "bulbs.yaml")
+
+    @property
+    def sensor_ports(self) -> List[str]:
+        return [device.port for device in self.sensors.values()]
+
+    def start(self):
+        for device in self.sensors.values():
+            device.start()
+        for bulb in self.bulbs.values():
+            bulb.start()
+
+        with open(self.sensor_config_path, "w") as f:
+            yaml.safe_dump({name: device.port for name, device in self.sensors.items()}, f, sort_keys=False)
+        with open(self.bulb_config_path, "w") as f:
+            yaml.safe_dump({"bulbs": [
+                {"name": position, "ip": "127.0.0.1", "port": bulb.port}
+                for position, bulb in self.bulbs.items()
+            ]}, f)
+        return self
+
+    def stop(self):
+        for device in self.sensors.values():
+            device.stop()
+        for bulb in self.bulbs.values():
+            bulb.stop()
+        self._config_dir.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def run_benchmark(scans: int = 3, stream: bool = False, **rig_kwargs) -> Dict:
+    """
+    Run full 4 colour x 3 position scans against the simulator and time them.
+    With stream=True the sensors stream and each step averages several frames.
+    """
+    from plant_spectral_scanner.utils.sensor_controller import SensorController
+    from plant_spectral_scanner.utils.bulb_controller import BulbController
+    from plant_spectral_scanner.scripts.acquisition_scheduler import AcquisitionScheduler
+
+    colours = {"Red": "#FF0000", "Green": "#00FF00", "Blue": "#0000FF", "White": "#FFFFFF"}
+    steps = [(colour, hex_code, position) for colour, hex_code in colours.items() for position in BULB_POSITIONS]
+
+    with SimulatedRig(**rig_kwargs) as rig:
+        started = time.monotonic()
+        sensor_controller = SensorController(rig.sensor_config_path)
+        sensor_controller.connect_sensors(discover=False)
+        if stream:
+            sensor_controller.start_streaming()
+        bulb_controller = BulbController(rig.bulb_config_path)
+        startup_time = time.monotonic() - started
+
+        scheduler = AcquisitionScheduler(sensor_controller, bulb_controller)
+        rows = []
+        scan_times = []
+        try:
+            for _ in range(scans):
+                timing = scheduler.run(steps, lambda colour, position, data: rows.append(data))
+                scan_times.append(timing["wall_time"])
+        finally:
+            sensor_controller.disconnect_sensors()
+            bulb_controller.close()
+
+    complete = sum(1 for data in rows for channels in data.values() if len(channels) == WAVELENGTH_COUNT)
+    return {
+        "scans": scans,
+        "startup_time": round(startup_time, 4),
+        "scan_times": scan_times,
+        "mean_scan_time": round(sum(scan_times) / len(scan_times), 4) if scan_times else None,
+        "complete_readings": complete,
+        "expected_readings": scans * len(steps) * len(SENSORS),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full scans against the simulated rig")
+    parser.add_argument("--scans", type=int, default=3)
+    parser.add_argument("--integration-time", type=float, default=INTEGRATION_TIME)
+    parser.add_argument("--baudrate", type=int, default=BAUDRATE)
+    parser.add_argument("--rise-time", type=float, default=RISE_TIME)
+    parser.add_argument("--bulb-latency", type=float, default=0.0)
+    parser.add_argument("--ascii-only", action="store_true",
+                        help="simulate firmware without the binary READ_BIN protocol")
+    parser.add_argument("--stream", action="store_true", help="acquire in streaming mode")
+    parser.add_argument("--metrics", action="store_true", help="print the per-stage latency summary")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        scans=args.scans,
+        stream=args.stream,
+        integration_time=args.integration_time,
+        baudrate=args.baudrate,
+        rise_time=args.rise_time,
+        bulb_latency=args.bulb_latency,
+        binary=not args.ascii_only,
+    )
+    print(json.dumps(results, indent=2))
+    if args.metrics:
+        from plant_spectral_scanner.utils.metrics import get_metrics
+        get_metrics().print_summary()
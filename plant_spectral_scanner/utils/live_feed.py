@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Live spectrum feed: publish every reading to local subscribers as it arrives
+
+A LiveFeed listens on a Unix socket (a filesystem path) or on TCP
+('host:port', or ':port' for localhost) and sends one JSON object per
+line to every connected subscriber:
+
+    {"type": "hello", "next": 120, "oldest": 0, "replayed": 36}
+    {"type": "run", "event": "start", "seq": 84, "mode": "scan", "scan_type": "basil", ...}
+    {"type": "frame", "seq": 85, "run": 84, "sensor": "sensor_1", "colour": "red",
+     "position": "close", "raw": [18 values], "adjusted": [18 values or null], ...}
+    {"type": "run", "event": "end", "seq": 121, "run": 84, "filename": "..."}
+    {"type": "dropped", "count": 12}
+
+Channels are in wavelength order (410 ... 940 nm), as in the CSV
+columns; a skipped sensor's channels are null. 'adjusted' is null for
+baseline runs.
+
+A subscriber may send one line when it connects:
+    SUBSCRIBE          live frames only (also the default after HELLO_TIMEOUT)
+    SUBSCRIBE <seq>    replay everything from message <seq> still held, then live
+    SUBSCRIBE -<n>     replay the last n messages, then live
+
+publish() never blocks on a subscriber: each has a bounded queue, and
+when it is full new messages are dropped for that subscriber only (and
+counted in a 'dropped' line once it catches up). Acquisition keeps its
+pace however slow a dashboard is.
+
+Watch a feed from the command line:
+    python -m plant_spectral_scanner.utils.live_feed /tmp/scanner.sock --from -36
+"""
+
+import os
+import json
+import math
+import queue
+import socket
+import argparse
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+from plant_spectral_scanner.utils.metrics import MetricsRecorder, get_metrics
+
+LIVE_HISTORY = 4096      # messages kept for replay (~100 full scans)
+SUBSCRIBER_QUEUE = 512   # messages queued per subscriber before new ones are dropped for it
+HELLO_TIMEOUT = 0.5      # seconds a new subscriber gets to send its SUBSCRIBE line
+SEND_TIMEOUT = 5.0       # seconds one send may block before the subscriber is disconnected
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """
+    Socket family and address for 'host:port', ':port' or a Unix socket path.
+    """
+    host, _, port = address.rpartition(":")
+    if port.isdigit() and os.sep not in host:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+
+def _values(channels: Optional[dict]) -> Optional[list]:
+    if channels is None:
+        return None
+    return [None if math.isnan(value) else round(value, 4) for value in channels.values()] or None
+
+
+class _Subscriber:
+    def __init__(self, conn: socket.socket, queue_size: int):
+        self.conn = conn
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0  # messages dropped since the last 'dropped' line
+        self.total_dropped = 0
+
+
+class LiveFeed:
+    def __init__(self, address: str, history: int = LIVE_HISTORY, queue_size: int = SUBSCRIBER_QUEUE,
+                 metrics: MetricsRecorder = None):
+        """
+        Args:
+            address: Unix socket path, or 'host:port' / ':port' for TCP
+            history: messages kept in memory for SUBSCRIBE <seq> replays
+            queue_size: messages buffered per subscriber before dropping
+        """
+        self.address = address
+        self.queue_size = queue_size
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.history = deque(maxlen=history)  # (seq, encoded line), oldest first
+        self.next_seq = 0
+        self.run_attrs: Dict = {}  # attributes of the current run, added to each of its frames
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # === Server ===
+
+    def start(self) -> "LiveFeed":
+        """
+        Bind the socket and start accepting subscribers. Safe to call twice.
+        """
+        if self._server is not None:
+            return self
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)  # left behind by a session that did not close
+        server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(address)
+        server.listen()
+        self._server = server
+        self._thread = threading.Thread(target=self._accept, name="live-feed", daemon=True)
+        self._thread.start()
+        print(f"[LIVE] Publishing readings on {self.address}")
+        return self
+
+    def close(self):
+        """
+        Stop accepting, disconnect every subscriber and remove the Unix socket.
+        """
+        server, self._server = self._server, None
+        if server is None:
+            return
+        server.close()
+        with self._lock:
+            subscribers, self._subscribers = list(self._subscribers), set()
+        for subscriber in subscribers:
+            self._disconnect(subscriber)
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def _accept(self):
+        server = self._server
+        while self._server is server:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return  # closed
+            threading.Thread(target=self._serve, args=(conn,), name="live-subscriber", daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        try:
+            offset = self._read_subscribe(conn)
+        except (OSError, ValueError) as e:
+            conn.close()
+            print(f"[WARNING] Live subscriber rejected: {e}")
+            return
+
+        subscriber = _Subscriber(conn, self.queue_size)
+        with self._lock:
+            # Snapshot the replay and register under one lock, so nothing is missed or sent twice
+            if offset is not None and offset < 0:
+                offset = max(self.next_seq + offset, 0)
+            backlog = [line for seq, line in self.history if offset is not None and seq >= offset]
+            hello = {"type": "hello", "next": self.next_seq,
+                     "oldest": self.history[0][0] if self.history else self.next_seq, "replayed": len(backlog)}
+            self._subscribers.add(subscriber)
+
+        conn.settimeout(SEND_TIMEOUT)
+        try:
+            conn.sendall(self._encode(hello))
+            for line in backlog:
+                conn.sendall(line)
+            while True:
+                line = subscriber.queue.get()
+                if line is None:
+                    return
+                if subscriber.dropped:
+                    dropped, subscriber.dropped = subscriber.dropped, 0
+                    conn.sendall(self._encode({"type": "dropped", "count": dropped}))
+                conn.sendall(line)
+        except OSError:
+            pass  # subscriber went away or stopped reading
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+            if subscriber.total_dropped:
+                print(f"[LIVE] Subscriber left after {subscriber.total_dropped} message(s) were dropped for it")
+            conn.close()
+
+    @staticmethod
+    def _read_subscribe(conn: socket.socket) -> Optional[int]:
+        # Optional first line: SUBSCRIBE [seq]. Nothing within HELLO_TIMEOUT means live only.
+        conn.settimeout(HELLO_TIMEOUT)
+        data = b""
+        try:
+            while b"\n" not in data and len(data) < 64:
+                chunk = conn.recv(64)
+                if not chunk:
+                    break
+                data += chunk
+        except socket.timeout:
+            pass
+        words = data.decode("ascii", "replace").split()
+        if not words:
+            return None
+        if words[0].upper() != "SUBSCRIBE" or len(words) > 2:
+            raise ValueError(f"expected 'SUBSCRIBE [seq]', got '{data.strip().decode('ascii', 'replace')}'")
+        return int(words[1]) if len(words) == 2 else None
+
+    @staticmethod
+    def _disconnect(subscriber: _Subscriber):
+        try:
+            subscriber.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            subscriber.queue.put_nowait(None)
+        except queue.Full:
+            pass  # the shutdown above already ends its send loop
+
+    # === Publishing ===
+
+    @staticmethod
+    def _encode(message: dict) -> bytes:
+        return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+    def publish(self, message: dict) -> int:
+        """
+        Send 'message' (plus its 'seq' and 'time') to every subscriber without waiting on any.
+
+        Returns:
+            the message's seq, the offset to replay from
+        """
+        with self.metrics.timer("live.publish"), self._lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            line = self._encode({**message, "seq": seq, "time": round(time.time(), 3)})
+            self.history.append((seq, line))
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.queue.put_nowait(line)
+                except queue.Full:
+                    subscriber.dropped += 1
+                    subscriber.total_dropped += 1
+        return seq
+
+    def begin_run(self, mode: str, **attrs) -> int:
+        """
+        Announce a baseline or scan; the frames published until end_run() carry its attributes.
+        """
+        seq = self.publish({"type": "run", "event": "start", "mode": mode, **attrs})
+        self.run_attrs = {"run": seq, "mode": mode, **attrs}
+        return seq
+
+    def end_run(self, **attrs):
+        run_attrs, self.run_attrs = self.run_attrs, {}
+        self.publish({"type": "run", "event": "end", "run": run_attrs.get("run"), "mode": run_attrs.get("mode"),
+                      **attrs})
+
+    def publish_step(self, colour: str, position: str, raw: dict, adjusted: dict = None):
+        """
+        One 'frame' message per sensor of a step.
+
+        Args:
+            raw: sensor -> channel -> value as read
+            adjusted: the same after baseline subtraction (None for baselines)
+        """
+        for sensor, channels in raw.items():
+            self.publish({"type": "frame", **self.run_attrs, "sensor": sensor, "colour": colour,
+                          "position": position, "raw": _values(channels),
+                          "adjusted": _values(adjusted.get(sensor)) if adjusted is not None else None})
+
+
+def subscribe(address: str, offset: int = None, timeout: float = None) -> Iterator[dict]:
+    """
+    Messages of a LiveFeed as dicts, starting with its 'hello'.
+
+    Args:
+        offset: replay from this seq (negative: the last -offset messages); None for live only
+        timeout: seconds to wait for a message before giving up (None: forever)
+    """
+    family, target = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as conn:
+        conn.connect(target)
+        conn.sendall(b"SUBSCRIBE\n" if offset is None else f"SUBSCRIBE {offset}\n".encode())
+        conn.settimeout(timeout)
+        with conn.makefile("r", encoding="utf-8") as lines:
+            for line in lines:
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the readings of a running scanner as they arrive")
+    parser.add_argument("address", help="Unix socket path or host:port the scanner publishes on")
+    parser.add_argument("--from", dest="offset", type=int,
+                        help="replay from this seq first (negative: the last N messages)")
+    parser.add_argument("--json", action="store_true", help="print the raw JSON lines")
+    args = parser.parse_args()
+
+    try:
+        for message in subscribe(args.address, args.offset):
+            if args.json:
+                print(json.dumps(message))
+            elif message["type"] == "frame":
+                values = message["adjusted"] or message["raw"]
+                peak = max((value for value in values or [] if value is not None), default=float("nan"))
+                print(f"{message['seq']:>6} {message.get('mode', '')} {message['colour']}/{message['position']} "
+                      f"{message['sensor']}: max {peak:.1f} over {len(values or [])} channels")
+            else:
+                print(json.dumps(message))
+    except KeyboardInterrupt:
+        pass
+    except (ConnectionError, FileNotFoundError) as e:
+        print(f"[ERROR] Could not reach the live feed at {args.address}: {e}")
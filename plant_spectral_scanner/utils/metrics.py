@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-stage latency metrics for the acquisition pipeline
+
+Controllers and helpers time their stages (bulb UDP, serial write/read,
+parse, settling, baseline subtraction, CSV writes, inference) into a
+MetricsRecorder. Each stage keeps a fixed-bucket histogram, so recording
+is a bisect and a few additions under a lock. A span (one scan or
+baseline run) collects the time every stage spent while it was open.
+
+At the end of a session the recorder writes:
+    metrics_<timestamp>.jsonl  one line per span, then one per stage
+    metrics_<timestamp>.prom   Prometheus text exposition of the histograms
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BASE_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_METRICS_DIR = os.path.join(BASE_PROJECT_DIR, "logs", "metrics")
+
+# Upper bucket bounds in seconds, from sub-millisecond parses to multi-second settles
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_NAME = "scanner_stage_seconds"
+
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS):
+        """
+        Counts of observations per bucket (the last bucket is +Inf), plus count, sum, min and max.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "Histogram"):
+        """
+        Add another histogram's observations to this one (same bounds).
+        """
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate quantile, interpolated linearly inside the bucket it falls in.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+class MetricsRecorder:
+    def __init__(self, enabled: bool = True, labels: Dict[str, str] = None):
+        """
+        Collects stage histograms and spans for one process (or one rig).
+
+        Args:
+            enabled: when False every hook is a no-op
+            labels: constant labels written with every metric, e.g. {"rig": "bench_a"}
+        """
+        self.enabled = enabled
+        self.labels = dict(labels or {})
+        self.stages: Dict[str, Histogram] = {}
+        self.spans: List[dict] = []  # finished spans, oldest first
+        self._open_spans: List[dict] = []
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        """
+        Record one duration for 'stage', and add it to every open span.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+            for span in self._open_spans:
+                totals = span["stages"]
+                totals[stage] = totals.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Time the enclosed block as one observation of 'stage'.
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Group the stages observed inside the block, from any thread, into one span.
+
+        The span's own duration is observed as stage 'name'. Yields the
+        span dict, so attributes can be added while it is open.
+        """
+        span = {"span": name, "start": time.time(), "attrs": dict(attrs), "stages": {}}
+        if not self.enabled:
+            yield span
+            return
+        started = time.perf_counter()
+        with self._lock:
+            self._open_spans.append(span)
+        try:
+            yield span
+        finally:
+            duration = time.perf_counter() - started
+            with self._lock:
+                self._open_spans.remove(span)
+                span["duration"] = duration
+                span["stages"] = {stage: round(total, 6) for stage, total in span["stages"].items()}
+                self.spans.append(span)
+            self.observe(name, duration)
+
+    @classmethod
+    def combine(cls, recorders: List["MetricsRecorder"], labels: Dict[str, str] = None) -> "MetricsRecorder":
+        """
+        One recorder holding every stage of 'recorders' merged, e.g. all rigs of a station.
+
+        Each span keeps the labels of the recorder it came from, so the
+        combined JSONL still says which rig measured it.
+        """
+        combined = cls(labels=labels)
+        combined.started = min((recorder.started for recorder in recorders), default=combined.started)
+        for recorder in recorders:
+            with recorder._lock:
+                for stage, histogram in recorder.stages.items():
+                    combined.stages.setdefault(stage, Histogram(histogram.bounds)).merge(histogram)
+                combined.spans.extend({**recorder.labels, **span} for span in recorder.spans)
+        combined.spans.sort(key=lambda span: span["start"])
+        return combined
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        stage -> count, total, mean, p50, p95 and max (seconds)
+        """
+        with self._lock:
+            return {
+                stage: {
+                    "count": h.count,
+                    "total": h.sum,
+                    "mean": h.sum / h.count,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "max": h.max,
+                }
+                for stage, h in sorted(self.stages.items()) if h.count
+            }
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print(f"[METRICS] {'stage':<20} {'count':>6} {'total s':>9} {'mean ms':>9} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for stage, s in summary.items():
+            print(f"[METRICS] {stage:<20} {s['count']:>6} {s['total']:>9.2f} {s['mean'] * 1000:>9.1f} "
+                  f"{s['p50'] * 1000:>9.1f} {s['p95'] * 1000:>9.1f} {s['max'] * 1000:>9.1f}")
+
+    def write_jsonl(self, path: str) -> str:
+        """
+        One JSON object per finished span, followed by one per stage summary.
+        """
+        summary = self.summary()
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, "w") as f:
+            for span in spans:
+                f.write(json.dumps({"type": "span", **self.labels, **span}) + "\n")
+            for stage, s in summary.items():
+                f.write(json.dumps({"type": "stage", **self.labels, "stage": stage, **s}) + "\n")
+        return path
+
+    def write_prometheus(self, path: str) -> str:
+        """
+        Stage histograms in the Prometheus text exposition format.
+        """
+        lines = [f"# HELP {PROMETHEUS_NAME} Latency of each acquisition stage in seconds",
+                 f"# TYPE {PROMETHEUS_NAME} histogram"]
+        with self._lock:
+            stages = sorted(self.stages.items())
+            for stage, h in stages:
+                labels = "".join(f'{key}="{value}",' for key, value in self.labels.items()) + f'stage="{stage}"'
+                cumulative = 0
+                for bound, n in zip(list(h.bounds) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f'{PROMETHEUS_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{PROMETHEUS_NAME}_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"{PROMETHEUS_NAME}_count{{{labels}}} {h.count}")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def dump(self, folder: str = DEFAULT_METRICS_DIR, prefix: str = "metrics") -> Optional[str]:
+        """
+        Write the .jsonl and .prom files for this session into 'folder'.
+
+        Returns:
+            path of the .jsonl file, or None if nothing was recorded
+        """
+        if not self.enabled or not self.stages:
+            return None
+        os.makedirs(folder, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started).strftime('%Y%m%d_%H%M%S')
+        base = os.path.join(folder, f"{prefix}_{stamp}")
+        self.write_prometheus(base + ".prom")
+        return self.write_jsonl(base + ".jsonl")
+
+
+_metrics = None
+
+
+def get_metrics() -> MetricsRecorder:
+    """
+    The process-wide recorder that controllers use unless given their own.
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRecorder()
+    return _metrics
@@ -10,17 +10,58 @@ Author: Daniel L.
 import serial
 import yaml
 import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Dict
+from plant_spectral_scanner.utils.serial_utils import (
+    BAUDRATE, READ_TIMEOUT, discover_sensors, negotiate_binary, request_reply, wait_for_pong
+)
+from plant_spectral_scanner.utils.binary_protocol import BINARY_BAUDRATE, read_frame
+from plant_spectral_scanner.utils.sensor_stream import (
+    RING_CAPACITY, STREAM_TIMEOUT, SensorStream, robust_mean
+)
+from plant_spectral_scanner.utils.metrics import MetricsRecorder, get_metrics
+from plant_spectral_scanner.utils.sensor_health import (
+    FAILED, OK, SENSOR_ERROR, SensorSupervisor, check_sensor
+)
 
 wavelengths = [410, 435, 460, 485, 510, 535, 560, 585, 610, 645, 680, 705, 730, 760, 810, 890, 900, 940]
 
+READ_DEADLINE = 2.0  # seconds each port gets to answer a concurrent READ_DATA
+CHANNEL_NAMES = [f"channel_{i+1}_{wl}" for i, wl in enumerate(wavelengths)]
+STREAM_FRAMES = 4    # frames averaged per reading in streaming mode
+STREAM_STALL = 1.0   # seconds without a frame before a streaming sensor counts as failed
+
 class SensorController:
-    def __init__(self, config_path: str = 'plant_spectral_scanner/config/sensor_ports.yaml'):
+    def __init__(self, config_path: str = 'plant_spectral_scanner/config/sensor_ports.yaml', raw: bool = False,
+                 metrics: MetricsRecorder = None):
         """
         Initializes sensor controller and loads sensor-port mapping
+
+        With raw=True sensors on the binary protocol report uncalibrated
+        uint16 counts (READ_RAW) instead of calibrated values (READ_BIN).
+        Serial write, read and parse times go to 'metrics' (defaults to
+        the process-wide recorder).
+
+        self.health tracks every port: a sensor whose read fails is skipped
+        (its readings come back empty) while it is reconnected in the
+        background, see sensor_health.py.
         """
+        self.metrics = metrics if metrics is not None else get_metrics()
         self.sensors: Dict[str, serial.Serial] = {}
         self.ports = self.load_ports(config_path)
+        self.raw = raw
+        self.protocols: Dict[str, str] = {}  # name -> "binary" or "ascii"
+        self.last_frame_seq: Dict[str, int] = {}  # sequence number of the last binary frame per sensor
+        self.last_trigger_times: Dict[str, float] = {}  # perf_counter() at each READ_DATA write
+        self.last_trigger_skew = 0.0  # seconds between first and last trigger of the last read
+        self._executor = None
+        self._pending = {}  # name -> Future of a concurrent read still in flight
+        self.streams: Dict[str, SensorStream] = {}  # sensors currently in STREAM_ON mode
+        self.health = SensorSupervisor(self)
+        self._discover = True
+        self._binary = True
+        self._stream_capacity = RING_CAPACITY
 
     def load_ports(self, config_path: str) -> Dict[str, str]:
         """
@@ -30,55 +71,428 @@ class SensorController:
             ports = yaml.safe_load(f)
         return ports
 
-    def connect_sensors(self):
+    def connect_sensors(self, discover: bool = True, binary: bool = True):
         """
         Connect to all sensors via serial
+
+        With discover=True every available port is probed in parallel and
+        sensors are matched by their GET_ID reply, so replugging the hub does
+        not need a YAML edit. Sensors that discovery cannot find fall back to
+        the ports in the YAML config, which are opened in parallel too.
+        Either way a port counts as ready as soon as it answers PING.
+
+        With binary=True each sensor is then asked to switch to framed
+        binary readings at a higher baud rate; firmware that does not know
+        the command keeps using ASCII READ_DATA.
+
+        Finally every board is asked CHECK_SENSOR; one that reports no
+        AS7265x is skipped until the supervisor sees it recover.
         """
-        for name, port in self.ports.items():
+        self._discover = discover
+        self._binary = binary
+        self._connect(discover)
+        if binary:
+            self.negotiate_protocols()
+        self.health.track(self.sensors)
+        self.health.check(self.sensors)
+
+    def _connect(self, discover: bool):
+        if discover:
             try:
-                self.sensors[name] = serial.Serial(port, baudrate=9600, timeout=2)
-                print(f"[CONNECTED] {name} on {port}")
-                time.sleep(2)  # Allow time for serial to stabilize
+                self.sensors.update(discover_sensors(known_names=self.ports.keys()))
             except Exception as e:
-                print(f"[ERROR] Could not connect to {name} on {port}: {e}")
+                print(f"[ERROR] Sensor discovery failed: {e}")
+            for name, ser in self.sensors.items():
+                print(f"[CONNECTED] {name} on {ser.port} (discovered)")
+
+        claimed = {ser.port for ser in self.sensors.values()}
+        missing = {name: port for name, port in self.ports.items()
+                   if name not in self.sensors and port not in claimed}
+        if not missing:
+            return
+
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            results = pool.map(lambda item: self._open_port(*item), missing.items())
+            for (name, port), ser in zip(missing.items(), results):
+                if ser is not None:
+                    self.sensors[name] = ser
+                    print(f"[CONNECTED] {name} on {port}")
+
+    def negotiate_protocols(self, baudrate: int = BINARY_BAUDRATE):
+        """
+        Pick the binary or ASCII protocol for every connected sensor, in parallel
+        """
+        pending = {name: ser for name, ser in self.sensors.items() if name not in self.protocols}
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            results = pool.map(lambda ser: self._negotiate(ser, baudrate), pending.values())
+            for (name, ser), binary in zip(pending.items(), results):
+                self.protocols[name] = "binary" if binary else "ascii"
+                if binary:
+                    print(f"[PROTOCOL] {name}: binary frames at {ser.baudrate} baud")
+                else:
+                    print(f"[PROTOCOL] {name}: ASCII at {ser.baudrate} baud")
+
+    @staticmethod
+    def _negotiate(ser: serial.Serial, baudrate: int) -> bool:
+        try:
+            return negotiate_binary(ser, baudrate)
+        except Exception as e:
+            print(f"[WARNING] Protocol negotiation on {ser.port} failed: {e}")
+            return False
+
+    def _open_port(self, name: str, port: str):
+        try:
+            ser = serial.Serial(port, baudrate=BAUDRATE, timeout=READ_TIMEOUT)
+        except Exception as e:
+            print(f"[ERROR] Could not connect to {name} on {port}: {e}")
+            return None
+        if not wait_for_pong(ser):
+            # Old firmware may not answer PING; keep the port but say so
+            print(f"[WARNING] {name} on {port} did not answer PING.")
+        return ser
 
     def disconnect_sensors(self):
         """
         Close all serial connections
         """
+        self.health.stop()
+        self.stop_streaming()
         for name, ser in self.sensors.items():
             ser.close()
             print(f"[DISCONNECTED] {name}")
+        self.protocols.clear()
+        self.last_frame_seq.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
     def read_sensor(self, name: str) -> Dict[str, float]:
         """
-        Simulate reading data from a sensor. Replace this with real logic.
+        Request one reading from a sensor and wait for its reply
         """
         ser = self.sensors.get(name)
         if ser is None:
             print(f"[ERROR] Sensor {name} not connected.")
             return {}
+        if not self.health.available(name):
+            return {}
+        if name in self.streams:
+            return self._next_stream_reading(name, time.monotonic(), READ_DEADLINE)
 
         try:
-            # Simulated read request
-            ser.write(b'READ_DATA\n')  # This depends on your actual sensor protocol
-            line = ser.readline().decode('utf-8').strip()
-            # Example: Parse comma-separated values like "123,456,..."
-            values = list(map(float, line.split(',')))
-            return {f"channel_{i+1}_{wavelengths[i]}": val for i, val in enumerate(values)}
+            self._trigger_sensor(name, ser)
+        except Exception as e:
+            print(f"[ERROR] Failed to trigger {name}: {e}")
+            self.health.record_failure(name, str(e), fatal=True)
+            return {}
+        try:
+            reading = self._collect_sensor(name, ser)
         except Exception as e:
             print(f"[ERROR] Failed to read from {name}: {e}")
+            self.health.record_failure(name, str(e))
             return {}
+        self.health.record_success(name)
+        return reading
 
-    def read_all_sensors(self) -> Dict[str, Dict[str, float]]:
+    def read_all_sensors(self, concurrent: bool = True,
+                         deadline: float = READ_DEADLINE) -> Dict[str, Dict[str, float]]:
         """
         Read spectral data from all connected sensors
+
+        With concurrent=True every port is triggered back to back and the
+        replies are gathered in parallel, so one call costs a single sensor
+        latency rather than one per sensor. Ports that have not answered
+        within 'deadline' seconds come back as an empty dict, the same as a
+        failed sequential read, and so do ports the health supervisor is
+        skipping (without waiting for them). The spread between the first and last
+        trigger is kept in self.last_trigger_skew.
+
+        Streaming sensors are not triggered; they return the first frame
+        that arrives after the call.
         """
         if not self.sensors:
             print("[WARNING] No sensors are connected.")
             return {}
 
+        with self.metrics.timer("sensor.read_all"):
+            return self._read_all(concurrent, deadline)
+
+    def _read_all(self, concurrent: bool, deadline: float) -> Dict[str, Dict[str, float]]:
+        if not concurrent:
+            data = {}
+            previous = dict(self.last_trigger_times)
+            for name in self.sensors:
+                data[name] = self.read_sensor(name)
+            # Only the ports written in this call: skipped, streaming and failed ones keep an older time
+            triggered = [name for name, at in self.last_trigger_times.items() if previous.get(name) != at]
+            self._update_trigger_skew(triggered)
+            return data
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.sensors),
+                                                thread_name_prefix="sensor-read")
+
+        # Trigger every port first (writes return immediately), then wait on all replies together
+        called_at = time.monotonic()
+        triggered = {}
         data = {}
+        for name, ser in self.sensors.items():
+            if not self.health.available(name):
+                data[name] = {}
+                continue
+            if name in self.streams:
+                continue
+            pending = self._pending.get(name)
+            if pending is not None and not pending.done():
+                # The previous reply is still being read; triggering again would misalign lines
+                print(f"[WARNING] {name} is still busy with its previous reading, skipping.")
+                data[name] = {}
+                continue
+            try:
+                ser.reset_input_buffer()  # drop any late reply from a previous deadline miss
+                self._trigger_sensor(name, ser)
+                triggered[name] = ser
+            except Exception as e:
+                print(f"[ERROR] Failed to trigger {name}: {e}")
+                self.health.record_failure(name, str(e), fatal=True)
+                data[name] = {}
+        self._update_trigger_skew(triggered)
+
+        futures = {name: self._executor.submit(self._collect_sensor, name, ser)
+                   for name, ser in triggered.items()}
+        self._pending.update(futures)
+        wait(futures.values(), timeout=deadline)
+
+        for name in list(self.streams):
+            if self.health.available(name):
+                data[name] = self._next_stream_reading(name, called_at, deadline - (time.monotonic() - called_at))
+
         for name in self.sensors:
-            data[name] = self.read_sensor(name)
-        return data
+            future = futures.get(name)
+            if future is None:
+                continue
+            if not future.done():
+                print(f"[ERROR] {name} did not answer within {deadline:.2f}s")
+                self.health.record_failure(name, f"no answer within {deadline:.2f}s")
+                data[name] = {}
+                continue
+            try:
+                data[name] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Failed to read from {name}: {e}")
+                self.health.record_failure(name, str(e))
+                data[name] = {}
+                continue
+            self.health.record_success(name)
+
+        # Keep the configured sensor order so CSV rows line up with sequential reads
+        return {name: data[name] for name in self.sensors}
+
+    def _trigger_sensor(self, name: str, ser: serial.Serial):
+        """
+        Send the read command for the sensor's protocol and note when it went out
+        """
+        started = time.perf_counter()
+        if self.protocols.get(name) == "binary":
+            ser.write(b'READ_RAW\n' if self.raw else b'READ_BIN\n')
+        else:
+            ser.write(b'READ_DATA\n')
+        self.last_trigger_times[name] = now = time.perf_counter()
+        self.metrics.observe("sensor.write", now - started)
+
+    def _collect_sensor(self, name: str, ser: serial.Serial) -> Dict[str, float]:
+        """
+        Block on one reply and parse it into channel values
+        """
+        metrics = self.metrics
+        if self.protocols.get(name) == "binary":
+            # CRC-checked frame; the values are a view on the received bytes
+            with metrics.timer("sensor.read"):
+                seq, values = read_frame(ser)
+            last_seq = self.last_frame_seq.get(name)
+            if last_seq is not None and seq != (last_seq + 1) & 0xFFFF:
+                print(f"[WARNING] {name} skipped {(seq - last_seq - 1) & 0xFFFF} frame(s)")
+            self.last_frame_seq[name] = seq
+            with metrics.timer("sensor.parse"):
+                return dict(zip(CHANNEL_NAMES, values.tolist()))
+
+        with metrics.timer("sensor.read"):
+            line = ser.readline()
+        with metrics.timer("sensor.parse"):
+            # Firmware replies with 18 comma-separated values, e.g. "12.3456,0.0000,..."
+            values = list(map(float, line.decode('utf-8').strip().split(',')))
+            return dict(zip(CHANNEL_NAMES, values))
+
+    # === Streaming mode ===
+
+    @property
+    def streaming(self) -> bool:
+        """
+        True when every connected sensor that is not being skipped is streaming.
+        """
+        available = [name for name in self.sensors if self.health.available(name)]
+        return bool(available) and all(name in self.streams for name in available)
+
+    def start_streaming(self, capacity: int = RING_CAPACITY) -> bool:
+        """
+        Put every binary-protocol sensor into continuous measurement
+
+        Each streaming port gets a reader thread filling a ring buffer, and
+        reads no longer send a command. Sensors on ASCII firmware, or that
+        do not acknowledge STREAM_ON, keep being polled.
+
+        Returns:
+            bool: True if all connected sensors are now streaming
+        """
+        self._stream_capacity = capacity
+        for name, ser in self.sensors.items():
+            if name in self.streams or self.protocols.get(name) != "binary" or not self.health.available(name):
+                continue
+            if self._start_stream(name, ser, capacity):
+                print(f"[STREAMING] {name}")
+        return self.streaming
+
+    def _start_stream(self, name: str, ser: serial.Serial, capacity: int) -> bool:
+        try:
+            ser.reset_input_buffer()
+            if request_reply(ser, b'STREAM_ON\n', "STREAM_ON_OK", READ_TIMEOUT) is None:
+                print(f"[WARNING] {name} did not start streaming, polling it instead.")
+                return False
+            ser.timeout = STREAM_TIMEOUT
+            self.streams[name] = SensorStream(name, ser, capacity).start()
+            return True
+        except Exception as e:
+            print(f"[ERROR] Failed to start streaming on {name}: {e}")
+            return False
+
+    def stop_streaming(self):
+        """
+        Send STREAM_OFF, stop the reader threads and resynchronise the ports for polling
+        """
+        streams, self.streams = self.streams, {}
+        for name, stream in streams.items():
+            try:
+                stream.ser.write(b'STREAM_OFF\n')
+            except Exception as e:
+                print(f"[ERROR] Failed to stop streaming on {name}: {e}")
+        for name, stream in streams.items():
+            stream.stop()
+            if stream.errors or stream.dropped:
+                print(f"[WARNING] {name} stream: {stream.errors} bad frame(s), {stream.dropped} dropped")
+            try:
+                stream.ser.timeout = READ_TIMEOUT
+                # A frame may still be in flight after STREAM_OFF; PING skips past it
+                wait_for_pong(stream.ser)
+                self.last_frame_seq.pop(name, None)
+            except Exception:
+                pass
+
+    def stream_frames(self, since: float, limit: int = None) -> Dict[str, np.ndarray]:
+        """
+        Frames each streaming sensor produced since time.monotonic() value 'since', oldest first.
+        Sensors being skipped are left out.
+        """
+        return {name: stream.ring.since(since, limit)[0] for name, stream in list(self.streams.items())
+                if self.health.available(name)}
+
+    def wait_for_frames(self, since: float, frames: int, timeout: float) -> bool:
+        """
+        Wait until every streaming sensor has 'frames' frames since 'since'.
+        A stream that has gone quiet for STREAM_STALL seconds is reported to the supervisor.
+        """
+        deadline = time.monotonic() + timeout
+        ready = True
+        for name, stream in list(self.streams.items()):
+            if not self.health.available(name):
+                continue
+            if not stream.ring.wait_for(since, frames, max(deadline - time.monotonic(), 0)):
+                ready = False
+                self._check_stall(name, stream)
+        return ready
+
+    def _check_stall(self, name: str, stream: SensorStream):
+        quiet = time.monotonic() - max(stream.ring.last_arrival, stream.started)
+        if not stream.alive or quiet > STREAM_STALL:
+            self.health.record_failure(name, f"no frame for {quiet:.1f}s")
+
+    def read_stream_mean(self, since: float, frames: int = STREAM_FRAMES,
+                         timeout: float = READ_DEADLINE) -> Dict[str, Dict[str, float]]:
+        """
+        Mean of the last 'frames' frames since 'since' (e.g. when the light changed),
+        with outlier frames rejected, per streaming sensor
+
+        Waits up to 'timeout' seconds for enough frames, then averages what
+        there is. A sensor with no frames since 'since' returns an empty dict.
+        """
+        self.wait_for_frames(since, frames, timeout)
+        return {name: self.frames_to_reading(window)
+                for name, window in self.stream_frames(since, frames).items()}
+
+    @staticmethod
+    def frames_to_reading(frames) -> Dict[str, float]:
+        if not len(frames):
+            return {}
+        mean, _ = robust_mean(frames)
+        return dict(zip(CHANNEL_NAMES, mean.tolist()))
+
+    def _next_stream_reading(self, name: str, since: float, timeout: float) -> Dict[str, float]:
+        stream = self.streams[name]
+        with self.metrics.timer("sensor.stream_wait"):
+            arrived = stream.ring.wait_for(since, 1, max(timeout, 0))
+        if not arrived:
+            print(f"[ERROR] {name} streamed no frame within {timeout:.2f}s")
+            self._check_stall(name, stream)
+            return {}
+        return dict(zip(CHANNEL_NAMES, stream.ring.since(since)[0][0].tolist()))
+
+    # === Recovery (called from the supervisor's thread) ===
+
+    def _reconnect_sensor(self, name: str) -> str:
+        """
+        Try to bring a skipped sensor back: reuse or reopen its port,
+        re-identify it, renegotiate the protocol if the board was reset and
+        resume streaming if it was streaming.
+
+        Returns:
+            its new health state (OK, FAILED or SENSOR_ERROR)
+        """
+        pending = self._pending.get(name)
+        if pending is not None and not pending.done():
+            return FAILED  # a timed-out read is still blocking on the port
+
+        stream = self.streams.get(name)
+        old = self.sensors[name]
+        if stream is not None:
+            stream.stop()
+            try:
+                old.write(b'STREAM_OFF\n')
+            except Exception:
+                pass
+
+        claimed = [ser.port for other, ser in self.sensors.items() if other != name]
+        ser = self.health.reconnect(name, old, claimed, rediscover=self._discover)
+        if ser is None:
+            return FAILED
+
+        if ser is not old:
+            # A reopened port talks to a freshly reset board at the default rate
+            self.sensors[name] = ser
+            self.last_frame_seq.pop(name, None)
+            self.protocols[name] = "binary" if self._binary and self._negotiate(ser, BINARY_BAUDRATE) else "ascii"
+        ser.timeout = READ_TIMEOUT
+        ser.reset_input_buffer()
+        if check_sensor(ser) is False:
+            return SENSOR_ERROR
+
+        if stream is not None and self.protocols.get(name) == "binary":
+            if not self._start_stream(name, ser, self._stream_capacity):
+                self.streams.pop(name, None)
+        else:
+            self.streams.pop(name, None)
+        return OK
+
+    def _update_trigger_skew(self, names):
+        times = [self.last_trigger_times[name] for name in names if name in self.last_trigger_times]
+        self.last_trigger_skew = max(times) - min(times) if times else 0.0
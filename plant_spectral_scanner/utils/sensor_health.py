@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sensor health supervisor: per-port state, circuit breaker and background reconnect
+
+Every connected sensor has a state:
+    ok            reads go to the port
+    failed        reads failed; the breaker is open and reads skip the port
+    sensor_error  the board answers PING but CHECK_SENSOR reports no AS7265x
+    reconnecting  the background thread is re-opening the port
+After FAILURE_THRESHOLD failed reads in a row the breaker opens, so a
+sensor that stopped answering costs a couple of read deadlines instead
+of one per step, while a single missed reply (a USB glitch) only loses
+that reading. A port that cannot even be written to is gone, and its
+breaker opens on the first failure.
+While it is open a background thread retries the port every
+PROBE_INTERVAL seconds, first with PING and CHECK_SENSOR on the open
+handle (a glitch clears without resetting the board), then by opening
+the port again and checking with GET_ID that the same sensor is on the
+other end. The other sensors keep reading meanwhile; the skipped
+sensor's rows are written with NaN channel values.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import serial
+
+from plant_spectral_scanner.utils.serial_utils import (
+    POLL_INTERVAL, list_available_ports, probe_port, request_reply, sensor_name_from_id, wait_for_pong
+)
+
+OK = "ok"
+FAILED = "failed"
+SENSOR_ERROR = "sensor_error"
+RECONNECTING = "reconnecting"
+
+FAILURE_THRESHOLD = 2    # failed reads in a row before a port is skipped (one miss may be a glitch)
+PROBE_INTERVAL = 2.0     # seconds between reconnect attempts on a skipped port
+PROBE_TIMEOUT = 0.5      # seconds PING / CHECK_SENSOR get on a suspect port
+
+
+def check_sensor(ser: serial.Serial, timeout: float = PROBE_TIMEOUT) -> Optional[bool]:
+    """
+    Ask the firmware whether its AS7265x answered at boot.
+
+    Returns:
+        True for SENSOR_OK, False for SENSOR_ERROR, None if there was no reply
+    """
+    original_timeout = ser.timeout
+    ser.timeout = POLL_INTERVAL
+    try:
+        reply = request_reply(ser, b"CHECK_SENSOR\n", "SENSOR_", timeout)
+    finally:
+        ser.timeout = original_timeout
+    if reply is None:
+        return None
+    return reply == "OK"
+
+
+class SensorSupervisor:
+    def __init__(self, controller, failure_threshold: int = FAILURE_THRESHOLD,
+                 probe_interval: float = PROBE_INTERVAL):
+        """
+        Tracks the ports of one SensorController and reconnects skipped ones
+        in the background.
+        """
+        self.controller = controller
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.ports: Dict[str, dict] = {}  # name -> state, failures, last_error, since, trips, recoveries
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # === State ===
+
+    def track(self, names: Iterable[str]):
+        with self._lock:
+            for name in names:
+                self.ports.setdefault(name, {"state": OK, "failures": 0, "last_error": None,
+                                             "since": time.monotonic(), "trips": 0, "recoveries": 0})
+
+    def available(self, name: str) -> bool:
+        """
+        True unless the port's breaker is open.
+        """
+        port = self.ports.get(name)
+        return port is None or port["state"] == OK
+
+    def down(self) -> List[str]:
+        with self._lock:
+            return [name for name, port in self.ports.items() if port["state"] != OK]
+
+    def status(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: dict(port) for name, port in self.ports.items()}
+
+    def record_success(self, name: str):
+        port = self.ports.get(name)
+        if port is not None and port["failures"]:
+            with self._lock:
+                port["failures"] = 0
+
+    def record_failure(self, name: str, error: str, fatal: bool = False):
+        """
+        Count a failed read; open the breaker once the threshold is reached.
+
+        Args:
+            fatal: the port itself failed (e.g. a write raised), so the breaker opens at once
+        """
+        with self._lock:
+            port = self.ports.get(name)
+            if port is None or port["state"] != OK:
+                return
+            port["failures"] += 1
+            port["last_error"] = error
+            if port["failures"] < self.failure_threshold and not fatal:
+                return
+            self._open(port, FAILED)
+        print(f"[WARNING] {name} is skipped until it recovers ({error}); its readings will be NaN.")
+        self._start()
+
+    def check(self, sensors: Dict[str, serial.Serial]):
+        """
+        CHECK_SENSOR every port in parallel; boards without a working AS7265x are skipped from the start.
+        """
+        if not sensors:
+            return
+        with ThreadPoolExecutor(max_workers=len(sensors)) as pool:
+            results = dict(zip(sensors, pool.map(self._safe_check, sensors.values())))
+        for name, found in results.items():
+            if found is False:
+                with self._lock:
+                    self._open(self.ports[name], SENSOR_ERROR, "CHECK_SENSOR reported no sensor")
+                print(f"[ERROR] {name}: the board answers but reports no AS7265x; skipping it.")
+                self._start()
+
+    @staticmethod
+    def _safe_check(ser: serial.Serial) -> Optional[bool]:
+        try:
+            ser.reset_input_buffer()
+            return check_sensor(ser)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _open(port: dict, state: str, error: str = None):
+        port["state"] = state
+        port["since"] = time.monotonic()
+        port["trips"] += 1
+        if error:
+            port["last_error"] = error
+
+    # === Background reconnect ===
+
+    def _start(self):
+        self._wake.set()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sensor-supervisor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2 * PROBE_TIMEOUT + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.probe_interval)
+            self._wake.clear()
+            for name in self.down():
+                if self._stop.is_set():
+                    return
+                self._recover(name)
+
+    def _recover(self, name: str):
+        with self._lock:
+            port = self.ports[name]
+            previous = port["state"]
+            # Give a fresh failure a moment before touching the port (the read may still be unwinding)
+            if time.monotonic() - port["since"] < min(self.probe_interval, PROBE_TIMEOUT):
+                return
+            port["state"] = RECONNECTING
+
+        try:
+            state = self.controller._reconnect_sensor(name)
+        except Exception as e:
+            state = previous
+            with self._lock:
+                port["last_error"] = str(e)
+
+        with self._lock:
+            port["state"] = state or previous
+            if state == OK:
+                port["failures"] = 0
+                port["recoveries"] += 1
+                port["since"] = time.monotonic()
+        if state == OK:
+            print(f"[RECOVERED] {name} is answering again.")
+
+    def reconnect(self, name: str, ser: serial.Serial, claimed: Iterable[str],
+                  rediscover: bool = False) -> Optional[serial.Serial]:
+        """
+        Bring back a skipped port: the open handle if it still answers, else
+        the same port opened again, else (with rediscover) any unclaimed port
+        whose GET_ID matches 'name'.
+
+        Returns:
+            an open, answering serial port (possibly 'ser' itself), or None
+        """
+        try:
+            ser.reset_input_buffer()
+            if wait_for_pong(ser, PROBE_TIMEOUT):
+                return ser
+        except Exception:
+            pass
+
+        port = ser.port
+        try:
+            ser.close()
+        except Exception:
+            pass
+        candidates = [port]
+        if rediscover:
+            claimed = set(claimed)
+            candidates += [p for p in list_available_ports() if p != port and p not in claimed]
+        for candidate in candidates:
+            found = probe_port(candidate, timeout=PROBE_TIMEOUT * 2)
+            if found is None:
+                continue
+            sensor_id, new_ser = found
+            if sensor_name_from_id(sensor_id, self.ports) == name:
+                if candidate != port:
+                    print(f"[INFO] {name} moved from {port} to {candidate}.")
+                return new_ser
+            new_ser.close()
+        return None
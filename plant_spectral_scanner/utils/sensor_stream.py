@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Continuous sensor streaming: per-port reader threads and ring buffers
+
+With STREAM_ON the firmware keeps the AS7265x in continuous measurement
+and pushes a binary frame for every integration. A SensorStream thread
+per port decodes those frames into a fixed-size FrameRing, so the
+acquisition loop can ask for "the mean of the last N frames since the
+light changed" without sending a command per sample.
+"""
+
+import time
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from plant_spectral_scanner.utils.binary_protocol import FrameError, FrameTimeout, read_frame
+
+RING_CAPACITY = 256      # frames kept per sensor (~40 s at 150 ms integration)
+OUTLIER_Z = 3.5          # frames further than this many robust SDs from the median are dropped
+STREAM_TIMEOUT = 0.5     # serial timeout while streaming, so the reader notices stop() quickly
+
+
+class FrameRing:
+    def __init__(self, capacity: int = RING_CAPACITY, channels: int = 18):
+        """
+        Fixed-size buffer of the newest frames and their arrival times.
+        """
+        self.capacity = capacity
+        self.values = np.zeros((capacity, channels), dtype=np.float32)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.count = 0  # frames written in total; the newest is at (count - 1) % capacity
+        self._lock = threading.Lock()
+        self._added = threading.Condition(self._lock)
+
+    def append(self, values: np.ndarray, arrived: float = None):
+        with self._added:
+            i = self.count % self.capacity
+            self.values[i] = values
+            self.times[i] = time.monotonic() if arrived is None else arrived
+            self.count += 1
+            self._added.notify_all()
+
+    def since(self, started: float, limit: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Frames that arrived at or after 'started', oldest first (copies).
+
+        Args:
+            limit: keep only the newest 'limit' of them
+        """
+        with self._lock:
+            n = min(self.count, self.capacity)
+            order = (np.arange(self.count - n, self.count)) % self.capacity
+            times = self.times[order]
+            keep = order[times >= started]
+            if limit is not None:
+                keep = keep[-limit:]
+            return self.values[keep], self.times[keep]
+
+    @property
+    def last_arrival(self) -> float:
+        """
+        time.monotonic() of the newest frame, or 0.0 before the first one.
+        """
+        with self._lock:
+            return float(self.times[(self.count - 1) % self.capacity]) if self.count else 0.0
+
+    def wait_for(self, started: float, frames: int, timeout: float) -> bool:
+        """
+        Block until 'frames' frames have arrived since 'started' or the timeout runs out.
+        """
+        deadline = time.monotonic() + timeout
+        with self._added:
+            while True:
+                n = min(self.count, self.capacity)
+                order = (np.arange(self.count - n, self.count)) % self.capacity
+                if np.count_nonzero(self.times[order] >= started) >= frames:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._added.wait(remaining)
+
+
+def robust_mean(frames: np.ndarray, z: float = OUTLIER_Z) -> Tuple[np.ndarray, int]:
+    """
+    Per-channel mean of 'frames' after dropping outliers.
+
+    A value is an outlier if it lies more than 'z' robust standard
+    deviations (1.4826 * MAD) from its channel's median; it is left out of
+    that channel's mean only, so one glitched channel does not cost the
+    whole frame. Channels with zero MAD never reject.
+
+    Returns:
+        (mean of shape (channels,), number of values rejected)
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    if len(frames) < 3:
+        return frames.mean(axis=0), 0
+    median = np.median(frames, axis=0)
+    deviation = np.abs(frames - median)
+    spread = 1.4826 * np.median(deviation, axis=0)
+    outlier = (spread > 0) & (deviation > z * spread)
+    # At least half of each channel is within one MAD of the median, so no channel is emptied
+    kept = np.where(outlier, 0.0, frames).sum(axis=0) / (~outlier).sum(axis=0)
+    return kept, int(outlier.sum())
+
+
+class SensorStream:
+    def __init__(self, name: str, ser, capacity: int = RING_CAPACITY):
+        """
+        Reader thread that fills a FrameRing from one streaming port.
+        """
+        self.name = name
+        self.ser = ser
+        self.ring = FrameRing(capacity)
+        self.errors = 0
+        self.last_seq: Optional[int] = None
+        self.dropped = 0
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"stream-{name}", daemon=True)
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2 * STREAM_TIMEOUT + 0.5)
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                seq, values = read_frame(self.ser)
+            except FrameTimeout:
+                continue
+            except FrameError:
+                self.errors += 1  # CRC or truncation; the next frame resynchronises on the sync bytes
+                continue
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"[ERROR] Stream from {self.name} stopped: {e}")
+                return
+            arrived = time.monotonic()
+            if self.last_seq is not None:
+                self.dropped += (seq - self.last_seq - 1) & 0xFFFF
+            self.last_seq = seq
+            self.ring.append(values, arrived)
@@ -7,16 +7,48 @@ Author: Daniel L.
 """
 
 import os
+import re
+import time
 import yaml
+import serial
 import serial.tools.list_ports
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+from plant_spectral_scanner.utils.binary_protocol import BINARY_BAUDRATE, PROTOCOL_VERSION
+
+DEFAULT_CONFIG_PATH = "plant_spectral_scanner/config/sensor_ports.yaml"
+DEFAULT_CACHE_PATH = "plant_spectral_scanner/config/sensor_port_cache.yaml"
+
+BAUDRATE = 9600
+READ_TIMEOUT = 2          # seconds, serial timeout used once a sensor is connected
+HANDSHAKE_TIMEOUT = 3.0   # seconds a port gets to answer PING after being opened
+POLL_INTERVAL = 0.05      # seconds between PING attempts while a board is booting
+NEGOTIATE_TIMEOUT = 0.5   # seconds old firmware gets to stay silent before we fall back to ASCII
 
 # Load YAML config
-def load_sensor_config(config_path="plant_spectral_scanner/config/sensor_ports.yaml"):
+def load_sensor_config(config_path=DEFAULT_CONFIG_PATH):
     with open(config_path, "r") as file:
-        return yaml.safe_load(file)
+        return yaml.safe_load(file) or {}
+
+# Loaded on first use, not at import, so importing this module never touches the filesystem
+_sensor_port_maps = {}
+
+def get_sensor_port_map(config_path=DEFAULT_CONFIG_PATH):
+    """
+    Get the sensor -> port mapping from the YAML config, loading it once.
 
-# Load once at module level
-SENSOR_PORT_MAP = load_sensor_config()
+    Returns:
+        dict: {sensor_name: port}
+    """
+    if config_path not in _sensor_port_maps:
+        _sensor_port_maps[config_path] = load_sensor_config(config_path)
+    return _sensor_port_maps[config_path]
+
+def reload_sensor_config(config_path=DEFAULT_CONFIG_PATH):
+    """
+    Drop the cached mapping so the next lookup re-reads the YAML file.
+    """
+    _sensor_port_maps.pop(config_path, None)
 
 def get_sensor_port(sensor_name):
     """
@@ -28,7 +60,7 @@ def get_sensor_port(sensor_name):
     Returns:
         str: Serial port path, or None if not found
     """
-    return SENSOR_PORT_MAP.get(sensor_name)
+    return get_sensor_port_map().get(sensor_name)
 
 def list_available_ports():
     """
@@ -50,5 +82,205 @@ def check_all_ports_connected():
     available_ports = list_available_ports()
     return {
         name: port in available_ports
-        for name, port in SENSOR_PORT_MAP.items()
+        for name, port in get_sensor_port_map().items()
     }
+
+def sensor_name_from_id(sensor_id, known_names: Iterable[str] = ()):
+    """
+    Map a firmware ID (e.g. 'MiddleSensor', or 'MIDDLESENSOR' after SET_ID)
+    onto a config sensor name (e.g. 'middle_sensor').
+    """
+    squashed = re.sub(r"[^a-z0-9]", "", sensor_id.lower())
+    for name in known_names:
+        if re.sub(r"[^a-z0-9]", "", name.lower()) == squashed:
+            return name
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", sensor_id).lower()
+
+def wait_for_pong(ser, timeout=HANDSHAKE_TIMEOUT):
+    """
+    Send PING until the board answers PONG or the timeout runs out.
+
+    Returns as soon as the firmware is ready instead of sleeping a fixed time.
+
+    Returns:
+        bool: True if PONG was received
+    """
+    deadline = time.monotonic() + timeout
+    original_timeout = ser.timeout
+    ser.timeout = POLL_INTERVAL
+    try:
+        while time.monotonic() < deadline:
+            ser.write(b"PING\n")
+            # A booting board may echo junk first, so read a few lines per attempt
+            for _ in range(3):
+                line = ser.readline().decode("utf-8", errors="ignore").strip()
+                if line == "PONG":
+                    ser.reset_input_buffer()
+                    return True
+                if not line:
+                    break
+        return False
+    finally:
+        ser.timeout = original_timeout
+
+def request_sensor_id(ser, timeout=1.0):
+    """
+    Ask the firmware for its ID.
+
+    Returns:
+        str: ID reported by GET_ID (e.g. 'MiddleSensor'), or None
+    """
+    deadline = time.monotonic() + timeout
+    ser.write(b"GET_ID\n")
+    while time.monotonic() < deadline:
+        line = ser.readline().decode("utf-8", errors="ignore").strip()
+        if line.startswith("ID:"):
+            return line[3:].strip()
+    return None
+
+def request_reply(ser, command: bytes, prefix: str, timeout: float) -> Optional[str]:
+    """
+    Send a command and return the rest of the first reply line starting with 'prefix', or None.
+    """
+    deadline = time.monotonic() + timeout
+    ser.write(command)
+    while time.monotonic() < deadline:
+        line = ser.readline().decode("utf-8", errors="ignore").strip()
+        if line.startswith(prefix):
+            return line[len(prefix):].strip()
+    return None
+
+def negotiate_binary(ser, baudrate=BINARY_BAUDRATE, timeout=NEGOTIATE_TIMEOUT) -> bool:
+    """
+    Switch a sensor to the binary READ_BIN protocol at 'baudrate' if its firmware supports it.
+
+    Old firmware ignores GET_PROTO, so no reply within 'timeout' leaves the
+    port untouched on ASCII READ_DATA. If the board accepts the new rate the
+    port follows it and is checked with a PING; should that fail the port
+    goes back to the old rate.
+
+    Returns:
+        bool: True if READ_BIN can be used on this port
+    """
+    original_timeout = ser.timeout
+    ser.timeout = POLL_INTERVAL
+    try:
+        ser.reset_input_buffer()
+        version = request_reply(ser, b"GET_PROTO\n", "PROTO:", timeout)
+        if not version or not version.isdigit() or int(version) < PROTOCOL_VERSION:
+            return False
+        if not baudrate or baudrate == ser.baudrate:
+            return True
+
+        old_baudrate = ser.baudrate
+        if request_reply(ser, f"SET_BAUD {baudrate}\n".encode("utf-8"), "BAUD_OK:", timeout) != str(baudrate):
+            return True  # binary frames still work at the old rate
+        ser.baudrate = baudrate
+        if wait_for_pong(ser, timeout):
+            return True
+        print(f"[WARNING] {ser.port} stopped answering at {baudrate} baud, going back to {old_baudrate}.")
+        ser.baudrate = old_baudrate
+        return wait_for_pong(ser, timeout)
+    finally:
+        ser.timeout = original_timeout
+
+def probe_port(port, baudrate=BAUDRATE, timeout=HANDSHAKE_TIMEOUT) -> Optional[Tuple[str, serial.Serial]]:
+    """
+    Open a port, wait for PONG and read the sensor ID.
+
+    The port is left open on success so callers can keep using it without
+    another open (which would reset the board on some Arduinos).
+
+    Returns:
+        (sensor_id, serial.Serial) or None if the port is not one of our sensors
+    """
+    try:
+        ser = serial.Serial(port, baudrate=baudrate, timeout=POLL_INTERVAL)
+    except Exception:
+        return None
+
+    try:
+        if wait_for_pong(ser, timeout):
+            sensor_id = request_sensor_id(ser)
+            if sensor_id:
+                ser.timeout = READ_TIMEOUT
+                return sensor_id, ser
+    except Exception:
+        pass
+    ser.close()
+    return None
+
+def load_port_cache(cache_path=DEFAULT_CACHE_PATH) -> Dict[str, str]:
+    """
+    Load the last resolved sensor -> port map, or {} if there is none.
+    """
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r") as file:
+            return yaml.safe_load(file) or {}
+    except Exception:
+        return {}
+
+def save_port_cache(port_map: Dict[str, str], cache_path=DEFAULT_CACHE_PATH):
+    with open(cache_path, "w") as file:
+        yaml.safe_dump(dict(port_map), file)
+
+def invalidate_port_cache(cache_path=DEFAULT_CACHE_PATH):
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+def discover_sensors(known_names: Iterable[str] = (), ports: Iterable[str] = None,
+                     cache_path=DEFAULT_CACHE_PATH, timeout=HANDSHAKE_TIMEOUT) -> Dict[str, serial.Serial]:
+    """
+    Find the sensors by asking every serial port who it is, in parallel.
+
+    The cached sensor -> port map is tried first; if any cached port has
+    disappeared or now reports a different ID the cache is invalidated and
+    every available port is probed.
+
+    Args:
+        known_names: sensor names from the config, used to match firmware IDs
+        ports: ports to probe (defaults to list_available_ports())
+        cache_path: where the resolved map is stored between runs
+
+    Returns:
+        dict: {sensor_name: open serial.Serial}
+    """
+    known_names = list(known_names)
+    available = list(ports) if ports is not None else list_available_ports()
+
+    cached = load_port_cache(cache_path) if cache_path else {}
+    if cached and all(port in available for port in cached.values()):
+        found = _probe_ports(cached.values(), known_names, timeout)
+        if all(found.get(name) is not None and found[name].port == port for name, port in cached.items()):
+            return found
+        for ser in found.values():
+            ser.close()
+        print("[INFO] Sensor port cache is stale, rediscovering.")
+        invalidate_port_cache(cache_path)
+
+    found = _probe_ports(available, known_names, timeout)
+    if cache_path and found:
+        save_port_cache({name: ser.port for name, ser in found.items()}, cache_path)
+    return found
+
+def _probe_ports(ports, known_names, timeout) -> Dict[str, serial.Serial]:
+    ports = list(ports)
+    if not ports:
+        return {}
+
+    found = {}
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        results = pool.map(lambda port: probe_port(port, timeout=timeout), ports)
+        for port, result in zip(ports, results):
+            if result is None:
+                continue
+            sensor_id, ser = result
+            name = sensor_name_from_id(sensor_id, known_names)
+            if name in found:
+                print(f"[WARNING] {name} answered on both {found[name].port} and {port}, keeping the first.")
+                ser.close()
+                continue
+            found[name] = ser
+    return found
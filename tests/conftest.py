@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from anywhere: the packages are imported from the project root, as with python -m
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
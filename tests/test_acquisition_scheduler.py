@@ -0,0 +1,44 @@
+import pytest
+
+from plant_spectral_scanner.scripts.acquisition_scheduler import AcquisitionScheduler
+from plant_spectral_scanner.utils.metrics import MetricsRecorder
+
+
+class FakeBulbs:
+    def __init__(self):
+        self.on = None
+        self.turned_off = 0
+
+    def transition(self, position, hex_code):
+        self.on = position
+
+    def turn_off_all_lights(self, force=False):
+        self.on = None
+        self.turned_off += 1
+
+
+class FailingSensors:
+    def read_all_sensors(self):
+        raise OSError("sensor unplugged")
+
+
+class SteadySensors:
+    def read_all_sensors(self):
+        return {"sensor_1": {"channel_1_410": 1.0}}
+
+
+def test_lights_off_after_scan():
+    bulbs = FakeBulbs()
+    scheduler = AcquisitionScheduler(SteadySensors(), bulbs, min_settle=0, settle_timeout=0.05,
+                                     metrics=MetricsRecorder())
+    scheduler.run([("red", "#ff0000", "close_bulb"), ("red", "#ff0000", "far_bulb")], lambda *step: None)
+    assert bulbs.on is None and bulbs.turned_off == 1
+
+
+def test_lights_off_when_a_step_fails():
+    bulbs = FakeBulbs()
+    scheduler = AcquisitionScheduler(FailingSensors(), bulbs, min_settle=0, settle_timeout=0.05,
+                                     metrics=MetricsRecorder())
+    with pytest.raises(OSError):
+        scheduler.run([("red", "#ff0000", "close_bulb")], lambda *step: None)
+    assert bulbs.on is None and bulbs.turned_off == 1
@@ -0,0 +1,50 @@
+import io
+
+import numpy as np
+import pytest
+
+from plant_spectral_scanner.utils.binary_protocol import (FRAME_FLOAT32, FRAME_SYNC, FRAME_UINT16, FrameError,
+                                                          FrameTimeout, encode_frame, read_frame)
+
+
+def test_float32_round_trip():
+    values = np.linspace(0.5, 900.0, 18, dtype=np.float32)
+    seq, decoded = read_frame(io.BytesIO(encode_frame(7, values)))
+    assert seq == 7
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, values)
+
+
+def test_uint16_round_trip_and_seq_wraps():
+    values = np.arange(0, 65535, 3641, dtype=np.uint16)
+    seq, decoded = read_frame(io.BytesIO(encode_frame(0x1_0005, values, FRAME_UINT16)))
+    assert seq == 5
+    np.testing.assert_array_equal(decoded, values)
+
+
+def test_bytes_before_sync_are_skipped():
+    frames = io.BytesIO(b"OK\r\n\xa5" + encode_frame(1, [1.0, 2.0]) + encode_frame(2, [3.0]))
+    assert read_frame(frames)[0] == 1
+    seq, decoded = read_frame(frames)
+    assert seq == 2
+    np.testing.assert_array_equal(decoded, [3.0])
+
+
+@pytest.mark.parametrize("offset", range(len(FRAME_SYNC), len(encode_frame(3, np.ones(18)))))
+def test_flipped_byte_is_rejected(offset):
+    # Any corrupted byte after the sync marker (header, payload or CRC) must not decode
+    frame = bytearray(encode_frame(3, np.arange(18, dtype=np.float32)))
+    frame[offset] ^= 0x01
+    with pytest.raises(FrameError):
+        read_frame(io.BytesIO(bytes(frame)))
+
+
+def test_truncated_frame():
+    frame = encode_frame(4, np.ones(18), FRAME_FLOAT32)
+    with pytest.raises(FrameError):
+        read_frame(io.BytesIO(frame[:-5]))
+
+
+def test_timeout_without_sync():
+    with pytest.raises(FrameTimeout):
+        read_frame(io.BytesIO(b"no frame here"))
@@ -0,0 +1,99 @@
+import csv
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+from data_processing import classifier
+from data_processing.compiled_model import CompiledModel, export_compiled
+from data_processing.feature_pipeline import CHANNELS
+from data_processing.model_registry import check_health
+
+MODELS = {
+    "svc_rbf": lambda: SVC(kernel="rbf", C=1.0, gamma="scale"),
+    "svc_linear": lambda: SVC(kernel="linear", C=0.5),
+    "knn": lambda: KNeighborsClassifier(n_neighbors=5),
+    "knn_distance": lambda: KNeighborsClassifier(n_neighbors=3, weights="distance"),
+    "rf": lambda: RandomForestClassifier(n_estimators=15, max_depth=4, random_state=0),
+    "sgd": lambda: SGDClassifier(loss="log_loss", random_state=0),
+    "logistic": lambda: LogisticRegression(max_iter=500),
+}
+
+
+@pytest.fixture(scope="module")
+def fixture_data():
+    X, y = make_classification(n_samples=80, n_features=21, n_informative=6, random_state=3)
+    return X[:60], y[:60], X[60:]
+
+
+@pytest.mark.parametrize("name", sorted(MODELS))
+def test_compiled_matches_pickled(name, fixture_data, tmp_path):
+    X_train, y_train, X_test = fixture_data
+    scaler = StandardScaler().fit(X_train)
+    model = MODELS[name]().fit(scaler.transform(X_train), y_train)
+    pickled = pickle.loads(pickle.dumps(model))
+    compiled = CompiledModel.load(export_compiled(model, str(tmp_path / f"{name}.npz"), scaler=scaler))
+
+    X_scaled = scaler.transform(X_test)
+    np.testing.assert_array_equal(compiled.predict(X_test), pickled.predict(X_scaled))
+    if name in ("knn", "knn_distance", "rf"):  # the compiled forms with predict_proba
+        np.testing.assert_allclose(compiled.predict_proba(X_test), pickled.predict_proba(X_scaled), atol=1e-9)
+
+
+def test_compiled_pipeline_matches_pickled(fixture_data, tmp_path):
+    X_train, y_train, X_test = fixture_data
+    model = make_pipeline(StandardScaler(), SVC(kernel="rbf")).fit(X_train, y_train)
+    compiled = CompiledModel.load(export_compiled(model, str(tmp_path / "pipeline.npz")))
+    np.testing.assert_array_equal(compiled.predict(X_test), pickle.loads(pickle.dumps(model)).predict(X_test))
+
+
+def test_export_creates_missing_folder(fixture_data, tmp_path):
+    X_train, y_train, _ = fixture_data
+    path = tmp_path / "new" / "models" / "knn.npz"
+    export_compiled(KNeighborsClassifier().fit(X_train, y_train), str(path))
+    assert path.exists()
+
+
+def _write_scan(path, description, spectrum, rng):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["description"] + CHANNELS)
+        writer.writeheader()
+        for _ in range(36):
+            readings = spectrum * rng.uniform(0.9, 1.1) + rng.normal(0, 2, len(CHANNELS))
+            writer.writerow({"description": description, **dict(zip(CHANNELS, np.round(readings, 3)))})
+
+
+def test_check_health_reports_training_labels(tmp_path):
+    # Healthy leaves reflect far more near-infrared than red; dry ones are flatter
+    wavelengths = np.array([int(ch.rsplit("_", 1)[1]) for ch in CHANNELS])
+    healthy = np.where(wavelengths >= 730, 400.0, 60.0)
+    dry = np.full(len(CHANNELS), 150.0)
+    rng = np.random.default_rng(0)
+    folder = tmp_path / "scans"
+    folder.mkdir()
+    for i in range(4):
+        _write_scan(folder / f"basil_healthy_plant{i}_scan_2025080{i}_120000.csv", "basil_healthy", healthy, rng)
+        _write_scan(folder / f"basil_dry_plant{i}_scan_2025080{i}_130000.csv", "basil_dry", dry, rng)
+    _write_scan(folder / "test_scan_20250809_120000.csv", "test", healthy, rng)
+
+    data = classifier.load_data(str(folder), use_cache=False)
+    assert len(data.target) == 8  # the unlabelled test scan is skipped
+    assert list(data.target_names) == ["Unhealthy", "Healthy"]
+
+    model_path = str(tmp_path / "basil_model.npz")
+    model = KNeighborsClassifier(n_neighbors=3).fit(data.data, data.target)
+    export_compiled(model, model_path, scaler=data.scaler, features=data.pipeline)
+
+    probe = tmp_path / "probe"
+    probe.mkdir()
+    _write_scan(probe / "healthy.csv", "basil_healthy", healthy, rng)
+    _write_scan(probe / "dry.csv", "basil_dry", dry, rng)
+    assert check_health(model_path, str(probe / "healthy.csv")) == "Healthy"
+    assert check_health(model_path, str(probe / "dry.csv")) == "Unhealthy"
@@ -0,0 +1,36 @@
+import numpy as np
+
+from plant_spectral_scanner.scripts.csv_utils import save_to_csv
+from plant_spectral_scanner.scripts.scan_index import ScanIndex
+
+
+def _step(value):
+    channels = [f"channel_{i + 1}_{wl}" for i, wl in enumerate([410, 435, 460, 485, 510, 535, 560, 585, 610, 645,
+                                                                  680, 705, 730, 760, 810, 890, 900, 940])]
+    return {sensor: {ch: value for ch in channels} for sensor in ("close_sensor", "far_sensor")}
+
+
+def test_rows_are_indexed_as_they_are_saved(tmp_path):
+    for i, (colour, position) in enumerate([("Red", "close_bulb"), ("Red", "far_bulb"), ("Blue", "close_bulb")]):
+        save_to_csv(data=_step(float(i)), mode="scan", description="basil_healthy", adjusted=True,
+                    colour=colour, position=position, filename="basil_healthy_scan.csv", data_root=str(tmp_path))
+
+    index = ScanIndex(str(tmp_path))
+    rows = index.query(scan_type="scans")
+    assert list(rows["row"]) == list(range(6))
+    np.testing.assert_array_equal(rows["values"][:, 0], [0, 0, 1, 1, 2, 2])
+    assert list(index.query(colour="blue")["row"]) == [4, 5]
+    assert index.index_csv(str(tmp_path / "scans" / "basil_healthy_scan.csv")) == 0  # already up to date
+    index.close()
+
+
+def test_new_file_replaces_old_rows(tmp_path):
+    path = tmp_path / "scans" / "basil_dry_scan.csv"
+    for _ in range(2):
+        if path.exists():
+            path.unlink()
+        save_to_csv(data=_step(1.0), mode="scan", description="basil_dry", adjusted=True,
+                    colour="Red", position="close_bulb", filename=path.name, data_root=str(tmp_path))
+    index = ScanIndex(str(tmp_path))
+    assert list(index.query()["row"]) == [0, 1]
+    index.close()
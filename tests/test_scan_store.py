@@ -0,0 +1,31 @@
+import numpy as np
+
+from plant_spectral_scanner.scripts.scan_store import CHANNEL_COUNT, ROW_BYTES, ScanStore
+
+
+def _records(value, n=3):
+    return [("2025-08-08 12:00:00", "Red", "close_bulb", "close_sensor", [value + i] * CHANNEL_COUNT)
+            for i in range(n)]
+
+
+def test_append_and_load(tmp_path):
+    store = ScanStore(str(tmp_path))
+    store.append("a.csv", "basil_scans", "basil_healthy", _records(1.0))
+    store.append("b.csv", "basil_scans", "basil_dry", _records(10.0, n=2))
+    meta, values = store.load()
+    assert list(meta["file"]) == ["a.csv"] * 3 + ["b.csv"] * 2
+    np.testing.assert_array_equal(values[:, 0], [1, 2, 3, 10, 11])
+
+
+def test_append_after_partial_row(tmp_path):
+    store = ScanStore(str(tmp_path))
+    store.append("a.csv", "basil_scans", "basil_healthy", _records(1.0))
+    with open(store.channels_path, "ab") as f:
+        f.write(b"\x00" * 10)  # a write interrupted mid-row
+    store.append("b.csv", "basil_scans", "basil_dry", _records(10.0))
+
+    meta, values = store.load(mmap=False)
+    assert (tmp_path / "channels.f32").stat().st_size == 6 * ROW_BYTES
+    assert list(meta["file"]) == ["a.csv"] * 3 + ["b.csv"] * 3
+    np.testing.assert_array_equal(values[:, 0], [1, 2, 3, 10, 11, 12])
+    np.testing.assert_array_equal(values[:, -1], [1, 2, 3, 10, 11, 12])
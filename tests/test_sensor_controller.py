@@ -0,0 +1,34 @@
+from plant_spectral_scanner.utils.metrics import MetricsRecorder
+from plant_spectral_scanner.utils.sensor_controller import SensorController
+
+
+class FakePort:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def write(self, data):
+        if self.fail:
+            raise OSError("write failed")
+
+
+def _controller(monkeypatch, ports):
+    controller = SensorController(metrics=MetricsRecorder())
+    controller.sensors = ports
+    monkeypatch.setattr(controller, "_collect_sensor", lambda name, ser: {"channel_1_410": 1.0})
+    monkeypatch.setattr(controller.health, "record_failure", lambda name, error, fatal=False: None)
+    return controller
+
+
+def test_sequential_skew_ignores_ports_not_triggered(monkeypatch):
+    controller = _controller(monkeypatch, {"sensor_1": FakePort(), "sensor_2": FakePort(fail=True)})
+    controller.last_trigger_times = {"sensor_2": 0.0}  # from a read long ago
+    data = controller.read_all_sensors(concurrent=False)
+    assert data["sensor_2"] == {}
+    assert controller.last_trigger_skew == 0.0
+
+
+def test_sequential_skew_spans_triggered_ports(monkeypatch):
+    controller = _controller(monkeypatch, {"sensor_1": FakePort(), "sensor_2": FakePort()})
+    controller.read_all_sensors(concurrent=False)
+    times = controller.last_trigger_times
+    assert controller.last_trigger_skew == times["sensor_2"] - times["sensor_1"]
@@ -0,0 +1,32 @@
+from plant_spectral_scanner.utils.sensor_health import FAILED, OK, SensorSupervisor
+
+
+def _supervisor(monkeypatch):
+    supervisor = SensorSupervisor(controller=None)
+    monkeypatch.setattr(supervisor, "_start", lambda: None)  # no background reconnects
+    supervisor.track(["sensor_1"])
+    return supervisor
+
+
+def test_single_missed_reply_keeps_the_port(monkeypatch):
+    supervisor = _supervisor(monkeypatch)
+    supervisor.record_failure("sensor_1", "no answer within 2.00s")
+    assert supervisor.available("sensor_1")
+    supervisor.record_success("sensor_1")
+    supervisor.record_failure("sensor_1", "no answer within 2.00s")
+    assert supervisor.available("sensor_1")  # not consecutive
+
+
+def test_consecutive_misses_open_the_breaker(monkeypatch):
+    supervisor = _supervisor(monkeypatch)
+    supervisor.record_failure("sensor_1", "no answer within 2.00s")
+    supervisor.record_failure("sensor_1", "no answer within 2.00s")
+    assert not supervisor.available("sensor_1")
+    assert supervisor.status()["sensor_1"]["state"] == FAILED
+
+
+def test_fatal_failure_opens_the_breaker_at_once(monkeypatch):
+    supervisor = _supervisor(monkeypatch)
+    supervisor.record_failure("sensor_1", "write failed", fatal=True)
+    assert supervisor.down() == ["sensor_1"]
+    assert supervisor.status()["sensor_1"]["state"] != OK
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from data_processing.training_engine import N_SPLITS, cv_folds, shared_splits
+
+
+@pytest.mark.parametrize("counts, folds", [((5, 5), 5), ((3, 6), 3), ((1, 8), 2), ((40, 60), N_SPLITS)])
+def test_cv_folds_fit_the_minority_class(counts, folds):
+    y = np.repeat([0, 1], counts)
+    assert cv_folds(y) == folds
+
+
+@pytest.mark.parametrize("counts", [(5, 5), (3, 6), (4, 6)])
+def test_every_split_holds_both_classes(counts):
+    y = np.repeat([0, 1], counts)
+    splits = shared_splits(y, cv_folds(y))
+    for train, test in splits:
+        assert set(y[train]) == {0, 1} and set(y[test]) == {0, 1}
+    assert sorted(np.concatenate([test for _, test in splits])) == list(range(len(y)))